@@ -0,0 +1,55 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from data_loader import DataLoader
+from feature_extractor import FeatureEngineer
+from price_predictor import NumberPricePredictor
+from trainer import db_config_from_env
+
+
+def train_on(db_config: dict, days_back: int, dedup_days, thread_count: int) -> dict:
+    """Загрузка (COPY), признаки и обучение на полной или схлопнутой выборке"""
+    started = time.perf_counter()
+    df = DataLoader(db_config).load_data_copy(days_back=days_back, dedup_days=dedup_days)
+    load_sec = time.perf_counter() - started
+
+    features = FeatureEngineer().prepare_dataframe(df, compact=True)
+    predictor = NumberPricePredictor(model_path=f'models/{"dedup" if dedup_days is not None else "all"}.cbm')
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor.train(features, thread_count=thread_count)
+    return {
+        'rows': len(df),
+        'train_rows': len(features),
+        'load_sec': load_sec,
+        'train_sec': time.perf_counter() - started,
+        'iterations': predictor.model.tree_count_,
+        'mape': predictor.metrics['mape'],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обучение на всех объявлениях против схлопнутых повторов")
+    parser.add_argument('--days-back', type=int, default=365)
+    parser.add_argument('--dedup-days', type=int, default=30)
+    parser.add_argument('--thread-count', type=int, default=-1)
+    args = parser.parse_args()
+
+    db_config = db_config_from_env()
+    # Обучение пишет служебные файлы в models/ - работаем во временном каталоге
+    os.chdir(tempfile.mkdtemp())
+
+    results = {name: train_on(db_config, args.days_back, dedup, args.thread_count)
+               for name, dedup in [('all', None), ('dedup', args.dedup_days)]}
+    for name, result in results.items():
+        print(f"{name:>6}: {result['rows']:>9,} строк из БД, {result['train_rows']:>9,} в обучении, "
+              f"загрузка {result['load_sec']:5.1f} с, обучение {result['train_sec']:6.1f} с "
+              f"({result['iterations']} деревьев), MAPE {result['mape']:.1f}% (своя тестовая выборка)")
+
+    full, dedup = results['all'], results['dedup']
+    print(f"\nСтрок: -{1 - dedup['rows'] / full['rows']:.1%}, "
+          f"время обучения: {dedup['train_sec'] / full['train_sec'] - 1:+.1%}")
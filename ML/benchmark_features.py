@@ -0,0 +1,113 @@
+import argparse
+import time
+
+import pandas as pd
+
+from feature_extractor import FeatureEngineer
+from synthetic import generate_listings, generate_plates
+
+
+def compare_extract_features(n: int, seed: int = 42) -> dict:
+    """Сверка табличного extract_features с прямым расчетом"""
+    feature_engineer = FeatureEngineer()
+    plates = generate_plates(n, seed=seed, invalid_share=0.01)
+
+    started = time.perf_counter()
+    for plate in plates:
+        features = {}
+        if feature_engineer._validate_and_parse(plate, features):
+            feature_engineer._extract_features_direct(features)
+    direct_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    table_features = [feature_engineer.extract_features(plate) for plate in plates]
+    table_time = time.perf_counter() - started
+
+    for plate, features in zip(plates, table_features):
+        expected = {}
+        if not feature_engineer._validate_and_parse(plate, expected):
+            assert features is None, plate
+            continue
+        feature_engineer._extract_features_direct(expected)
+        assert list(features.items()) == list(expected.items()), plate
+
+    return {
+        'rows': n,
+        'direct_rows_per_sec': n / direct_time,
+        'tables_rows_per_sec': n / table_time,
+    }
+
+
+def compare_prepare_dataframe(n: int, seed: int = 42) -> dict:
+    """Сверка колоночного и построчного prepare_dataframe и замер скорости"""
+    feature_engineer = FeatureEngineer()
+    df = generate_listings(n, seed=seed, invalid_share=0.01)
+
+    started = time.perf_counter()
+    rowwise = feature_engineer.prepare_dataframe(df, columnar=False)
+    rowwise_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    columnar = feature_engineer.prepare_dataframe(df, columnar=True)
+    columnar_time = time.perf_counter() - started
+
+    # Те же колонки, типы и значения
+    pd.testing.assert_frame_equal(rowwise, columnar, check_exact=True)
+
+    return {
+        'rows': n,
+        'rowwise_rows_per_sec': n / rowwise_time,
+        'columnar_rows_per_sec': n / columnar_time,
+        'speedup': rowwise_time / columnar_time,
+    }
+
+
+def compare_memory(n: int, seed: int = 42) -> dict:
+    """Память обучающего DataFrame на строку: полный формат против компактного"""
+    feature_engineer = FeatureEngineer()
+    df = generate_listings(n, seed=seed, invalid_share=0.01)
+
+    full = feature_engineer.prepare_dataframe(df)
+    compact = feature_engineer.prepare_dataframe(df, compact=True)
+
+    # Признаки модели в компактном формате те же, что и в полном
+    for col in compact.columns:
+        if isinstance(compact[col].dtype, pd.CategoricalDtype):
+            assert compact[col].isna().sum() == 0, col
+            assert (compact[col].astype(str) == full[col]).all(), col
+        else:
+            assert (compact[col].to_numpy() == full[col].to_numpy()).all(), col
+
+    return {
+        'rows': len(full),
+        'full_columns': full.shape[1],
+        'compact_columns': compact.shape[1],
+        'full_bytes_per_row': feature_engineer.bytes_per_row(full),
+        'compact_bytes_per_row': feature_engineer.bytes_per_row(compact),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сверка и замер prepare_dataframe")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 500_000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--memory', action='store_true', help="Только отчет о памяти на строку")
+    args = parser.parse_args()
+
+    if args.memory:
+        for size in args.sizes:
+            result = compare_memory(size, seed=args.seed)
+            print(f"✅ {result['rows']:>9,} строк: полный формат {result['full_bytes_per_row']:,.0f} байт/строка "
+                  f"({result['full_columns']} колонок), компактный {result['compact_bytes_per_row']:,.0f} байт/строка "
+                  f"({result['compact_columns']} колонок), "
+                  f"x{result['full_bytes_per_row'] / result['compact_bytes_per_row']:.1f}")
+        raise SystemExit(0)
+
+    for size in args.sizes:
+        result = compare_extract_features(size, seed=args.seed)
+        print(f"✅ {result['rows']:>9,} номеров: extract_features напрямую {result['direct_rows_per_sec']:>10,.0f} строк/с, "
+              f"по таблицам {result['tables_rows_per_sec']:>10,.0f} строк/с")
+
+        result = compare_prepare_dataframe(size, seed=args.seed)
+        print(f"✅ {result['rows']:>9,} строк: построчно {result['rowwise_rows_per_sec']:>10,.0f} строк/с, "
+              f"колоночно {result['columnar_rows_per_sec']:>10,.0f} строк/с (x{result['speedup']:.1f})")
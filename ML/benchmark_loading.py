@@ -0,0 +1,148 @@
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from decimal import Decimal
+from itertools import islice
+
+from data_loader import DataLoader
+from feature_extractor import FeatureEngineer
+from synthetic import generate_listings
+from trainer import db_config_from_env
+
+
+class SyntheticCursor:
+    """Заменитель курсора psycopg2: строки-кортежи (str, Decimal, datetime), как отдает база"""
+
+    description = [('number',), ('price',), ('posted_at',)]
+
+    def __init__(self, rows: int, block: int = 10000):
+        self.itersize = 2000
+        self._rows = self._generate(rows, block)
+
+    @staticmethod
+    def _generate(rows: int, block: int):
+        for start in range(0, rows, block):
+            listings = generate_listings(min(block, rows - start), seed=start)
+            for number, price, posted_at in listings.itertuples(index=False):
+                yield number, Decimal(f'{price:.2f}'), posted_at.to_pydatetime()
+
+    def execute(self, query, params=None):
+        pass
+
+    def mogrify(self, query, params=None):
+        # Параметры обучающего запроса - целые числа
+        return (query % {key: int(value) for key, value in (params or {}).items()}).encode()
+
+    def copy_expert(self, sql, file):
+        for number, price, posted_at in self._rows:
+            file.write(f'{number},{price},{posted_at.timestamp()}\n'.encode())
+
+    def fetchmany(self, size):
+        return list(islice(self._rows, size))
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SyntheticConnection:
+    def __init__(self, rows: int):
+        self.rows = rows
+
+    def cursor(self, name=None):
+        return SyntheticCursor(self.rows)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SyntheticDataLoader(DataLoader):
+    """DataLoader поверх синтетического соединения - те же пути загрузки, без Postgres"""
+
+    def __init__(self, rows: int):
+        super().__init__({})
+        self.rows = rows
+
+    def connect(self):
+        self.conn = SyntheticConnection(self.rows)
+
+
+def run_pipeline(source: str, mode: str, rows: int, days_back: int, chunk_size: int) -> dict:
+    """Загрузка + признаки в текущем процессе; пиковый RSS из getrusage"""
+    feature_engineer = FeatureEngineer()
+    loader = DataLoader(db_config_from_env()) if source == 'db' else SyntheticDataLoader(rows)
+    started = time.perf_counter()
+
+    if mode == 'stream':
+        features = feature_engineer.prepare_dataframe_stream(
+            loader.iter_chunks(chunk_size=chunk_size, days_back=days_back))
+    else:
+        features = feature_engineer.prepare_dataframe(loader.load_data(days_back=days_back))
+
+    return {
+        'source': source,
+        'mode': mode,
+        'rows': len(features),
+        'seconds': time.perf_counter() - started,
+        # ru_maxrss в Linux - в килобайтах
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def compare_load(source: str, rows: int, days_back: int) -> dict:
+    """Пропускная способность загрузки: read_sql_query vs COPY"""
+    results = {}
+    for name in ['load_data', 'load_data_copy']:
+        loader = DataLoader(db_config_from_env()) if source == 'db' else SyntheticDataLoader(rows)
+        started = time.perf_counter()
+        df = getattr(loader, name)(days_back=days_back)
+        elapsed = time.perf_counter() - started
+        results[name] = {'rows': len(df), 'seconds': elapsed, 'rows_per_sec': len(df) / elapsed}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пиковая память загрузки: целиком vs порциями")
+    parser.add_argument('--source', choices=['synthetic', 'db'], default='synthetic')
+    parser.add_argument('--rows', type=int, default=1_000_000, help="объем синтетики")
+    parser.add_argument('--days-back', type=int, default=365)
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--mode', choices=['full', 'stream'], help="запустить один режим (внутренний)")
+    parser.add_argument('--compare-load', action='store_true', help="сравнить read_sql_query и COPY")
+    args = parser.parse_args()
+
+    if args.compare_load:
+        for name, result in compare_load(args.source, args.rows, args.days_back).items():
+            print(f"{name:>15}: {result['rows']:>9,} строк, {result['seconds']:6.2f} с, "
+                  f"{result['rows_per_sec']:>10,.0f} строк/с")
+        sys.exit(0)
+
+    if args.mode:
+        result = run_pipeline(args.source, args.mode, args.rows, args.days_back, args.chunk_size)
+        print(json.dumps(result))
+        sys.exit(0)
+
+    # Каждый режим - в отдельном процессе, иначе пиковый RSS общий
+    for mode in ['full', 'stream']:
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--source', args.source, '--rows', str(args.rows),
+             '--days-back', str(args.days_back), '--chunk-size', str(args.chunk_size)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:>6}: {result['rows']:>9,} строк, {result['seconds']:6.1f} с, "
+              f"пиковый RSS {result['peak_rss_mb']:8.1f} МБ")
@@ -0,0 +1,102 @@
+import argparse
+import time
+
+import numpy as np
+
+from price_predictor import NumberPricePredictor
+from synthetic import generate_plates, train_synthetic_model
+from tree_engine import ObliviousTreeEngine
+
+
+def measure_latency(func, plates) -> dict:
+    """Латентность вызова func на каждом номере, мкс"""
+    timings = []
+    for plate in plates:
+        started = time.perf_counter()
+        func(plate)
+        timings.append((time.perf_counter() - started) * 1e6)
+
+    timings = np.array(timings)
+    return {'p50_us': float(np.percentile(timings, 50)), 'p99_us': float(np.percentile(timings, 99)),
+            'mean_us': float(timings.mean())}
+
+
+def compare_predict_single(predictor: NumberPricePredictor, n: int, seed: int = 42) -> dict:
+    """Сверка быстрого пути predict_single с DataFrame-путем и замер латентности"""
+    plates = generate_plates(n, seed=seed)
+    engineer = predictor.feature_engineer
+
+    for plate in plates:
+        features = engineer.extract_features(plate)
+        assert predictor._predict_log(features) == predictor._predict_log_dataframe(features), plate
+
+    # Прогрев
+    predictor.predict_single(plates[0])
+
+    return {
+        'dataframe': measure_latency(lambda p: predictor._predict_log_dataframe(engineer.extract_features(p)), plates),
+        'numpy': measure_latency(lambda p: predictor._predict_log(engineer.extract_features(p)), plates),
+        'predict_single': measure_latency(predictor.predict_single, plates),
+    }
+
+
+def compare_engines(predictor: NumberPricePredictor, batch_sizes=(1, 10, 100, 300, 1000, 10000),
+                    seed: int = 42, budget: float = 1.0) -> dict:
+    """Сверка ObliviousTreeEngine с CatBoostRegressor.predict и время вызова по размерам пачки, мкс"""
+    engine = ObliviousTreeEngine.from_catboost(predictor.model, predictor.categories)
+    plates = generate_plates(max(batch_sizes), seed=seed)
+    features_df = predictor.feature_engineer.extract_features_batch(plates)
+    rows = predictor._encode_features(features_df).to_numpy(np.int64)
+
+    max_diff = float(np.abs(engine.predict(rows) - predictor.model.predict(rows)).max())
+    results = {'max_abs_diff': max_diff, 'batches': {}}
+    for size in batch_sizes:
+        # Каждому - его лучшая раскладка: CatBoost заметно быстрее на массивах по колонкам (F-order)
+        by_columns = np.asfortranarray(rows[:size])
+        by_rows = np.ascontiguousarray(rows[:size])
+        results['batches'][size] = {
+            'catboost_us': _time_call(lambda: predictor.model.predict(by_columns), budget),
+            'numpy_us': _time_call(lambda: engine.predict(by_rows), budget),
+        }
+    return results
+
+
+def _time_call(func, budget: float) -> float:
+    """Лучшее из повторов время вызова за ~budget секунд, мкс"""
+    func()
+    timings = []
+    deadline = time.perf_counter() + budget
+    while time.perf_counter() < deadline or len(timings) < 3:
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1e6)
+    return float(min(timings))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Латентность predict_single до/после")
+    parser.add_argument('--n', type=int, default=2000)
+    parser.add_argument('--model-path', default='models/price_catboost_model.cbm')
+    parser.add_argument('--train', action='store_true', help="обучить модель на синтетике, если ее нет")
+    parser.add_argument('--engines', action='store_true', help="сравнить numpy-движок деревьев с CatBoost")
+    args = parser.parse_args()
+
+    predictor = NumberPricePredictor(model_path=args.model_path)
+    try:
+        predictor.load_model()
+    except FileNotFoundError:
+        if not args.train:
+            raise
+        predictor = train_synthetic_model(model_path=args.model_path)
+
+    if args.engines:
+        comparison = compare_engines(predictor)
+        print(f"Максимальное расхождение log-цены: {comparison['max_abs_diff']:.2e}")
+        for size, stats in comparison['batches'].items():
+            print(f"пачка {size:>6}: CatBoost {stats['catboost_us']:10.1f} мкс, "
+                  f"numpy {stats['numpy_us']:10.1f} мкс, x{stats['catboost_us'] / stats['numpy_us']:.1f}")
+        raise SystemExit
+
+    for name, stats in compare_predict_single(predictor, args.n).items():
+        print(f"{name:>15}: p50 {stats['p50_us']:8.1f} мкс, p99 {stats['p99_us']:8.1f} мкс, "
+              f"среднее {stats['mean_us']:8.1f} мкс")
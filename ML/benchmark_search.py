@@ -0,0 +1,56 @@
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from plate_search import PlateSearch
+from price_predictor import NumberPricePredictor
+from synthetic import train_synthetic_model
+
+# Ограничения поиска: регион, серия, цифры
+CASES = [
+    {'region': '77', 'series': 'А??', 'digits': '???'},
+    {'region': '199', 'series': '???', 'digits': '?7?'},
+    {'region': '77', 'series': '???', 'digits': '???'},
+]
+
+
+def brute_force(search: PlateSearch, region: str, series: str, digits: str, top_n: int) -> np.ndarray:
+    """log-цены top-N полным перебором всех кандидатов (тот же путь признаков и модели)"""
+    tables = search.tables
+    digit_idx = search._match(digits, tables.digit_keys, r'[0-9?]{3}', 'цифр')
+    series_idx = search._match(series, tables.series_keys, r'[АВЕКМНОРСТУХ?]{3}', 'серии')
+    region_idx = search._match(region, tables.region_keys, r'[0-9?]{2,3}', 'региона')
+    keys = np.stack(np.meshgrid(digit_idx, series_idx, region_idx, indexing='ij'), axis=-1).reshape(-1, 3)
+    log_price = np.concatenate([search._predict_log(chunk) for chunk in np.array_split(keys, max(1, len(keys) // 50000))])
+    return np.sort(log_price)[-top_n:]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Поиск top-N номеров против полного перебора")
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--time-budget', type=float, default=10.0)
+    parser.add_argument('--model-path', default='models/price_catboost_model.cbm')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor = NumberPricePredictor(model_path=args.model_path)
+        try:
+            predictor.load_model()
+        except FileNotFoundError:
+            predictor = train_synthetic_model(model_path=args.model_path)
+    search = PlateSearch(predictor)
+
+    for case in CASES:
+        result = search.search(**case, top_n=args.top_n, time_budget=args.time_budget)
+        started = time.perf_counter()
+        expected = brute_force(search, **case, top_n=args.top_n)
+        brute_sec = time.perf_counter() - started
+
+        found = np.sort(np.log1p([item['predicted_price'] for item in result['results']]))
+        exact = np.allclose(found, np.log1p(np.round(np.expm1(expected), -2)))
+        print(f"{case}: {result['candidates']:>9,} кандидатов, проверено {result['evaluated']:>9,} "
+              f"за {result['elapsed_sec']:.2f} с (перебор {brute_sec:.2f} с), "
+              f"{'точный' if result['exhaustive'] else 'неполный'} top-{args.top_n}, совпадает: {exact}")
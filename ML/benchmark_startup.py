@@ -0,0 +1,86 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from synthetic import train_synthetic_model
+
+# Модули, которых не должно быть в процессе, который только предсказывает
+HEAVY_MODULES = ['matplotlib', 'seaborn', 'sklearn', 'scipy', 'psycopg2', 'CarNumberFeatureExtractor']
+
+IMPORT_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+print(json.dumps({{'import_sec': imported - started,
+                   'modules': len(sys.modules),
+                   'heavy_modules': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def measure_import(workdir: str) -> dict:
+    """Время import main и тяжелые модули, попавшие в процесс"""
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_PROBE.format(heavy=HEAVY_MODULES)],
+        cwd=workdir, env=_env(), capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_first_prediction(workdir: str, port: int, plate: str = 'А777АА77', timeout: float = 120) -> dict:
+    """Время от запуска uvicorn до первого успешного ответа /api/predict и RSS сервиса"""
+    url = f'http://127.0.0.1:{port}/api/predict?' + urllib.parse.urlencode({'number': plate})
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(port),
+         '--log-level', 'warning'],
+        cwd=workdir, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    if response.status == 200:
+                        first_prediction = time.perf_counter() - started
+                        break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.02)
+        else:
+            raise RuntimeError("Сервис не ответил на /api/predict")
+
+        with open(f'/proc/{process.pid}/status') as f:
+            rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS'))
+        return {'first_prediction_sec': first_prediction, 'rss_mb': rss_kb / 1024}
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def _env() -> dict:
+    return {**os.environ, 'PYTHONPATH': os.path.dirname(os.path.abspath(__file__))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Холодный старт сервиса: импорт и время до первого предсказания")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='startup-')
+    with contextlib.redirect_stdout(io.StringIO()):
+        train_synthetic_model(model_path=os.path.join(workdir, 'models', 'price_catboost_model.cbm'))
+
+    for run in range(args.runs):
+        result = {**measure_import(workdir), **measure_first_prediction(workdir, args.port)}
+        print(f"Запуск {run + 1}: import main {result['import_sec']:.2f} с ({result['modules']} модулей), "
+              f"первое предсказание через {result['first_prediction_sec']:.2f} с, RSS {result['rss_mb']:.0f} МБ, "
+              f"тяжелые модули: {', '.join(result['heavy_modules']) or 'нет'}")
@@ -0,0 +1,188 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from feature_extractor import FeatureEngineer
+from price_predictor import NumberPricePredictor
+from synthetic import generate_listings, generate_plates, train_synthetic_model
+
+# Метрики, по которым ищем регрессию: имя -> True, если больше - лучше.
+# Хвост латентности шумнее пропускной способности, для него свой порог
+COMPARED_METRICS = {'ops_per_sec': True, 'p99_us': False, 'peak_memory_mb': False}
+
+# Рост p99 меньше этого (мкс) - джиттер планировщика, а не регрессия
+P99_MIN_DELTA_US = 50
+
+
+def time_per_item(func: Callable, items, repeat: int) -> Dict[str, float]:
+    """Вызов func на каждом элементе repeat раз: лучшие ops/s и латентность p50/p99 по всем вызовам, мкс"""
+    timings = np.empty((repeat, len(items)))
+    totals = []
+    for r in range(repeat):
+        started = time.perf_counter()
+        for i, item in enumerate(items):
+            t0 = time.perf_counter()
+            func(item)
+            timings[r, i] = time.perf_counter() - t0
+        totals.append(time.perf_counter() - started)
+
+    return {'ops_per_sec': len(items) / min(totals),
+            'p50_us': float(np.percentile(timings, 50) * 1e6),
+            'p99_us': float(np.percentile(timings, 99) * 1e6)}
+
+
+def time_per_call(func: Callable, rows: int, repeat: int) -> Dict[str, float]:
+    """Вызов func над всем набором repeat раз: строк/с по лучшему вызову и латентность вызова p50/p99, мкс"""
+    timings = np.empty(repeat)
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        timings[i] = time.perf_counter() - t0
+
+    return {'ops_per_sec': rows / float(timings.min()),
+            'p50_us': float(np.percentile(timings, 50) * 1e6),
+            'p99_us': float(np.percentile(timings, 99) * 1e6)}
+
+
+def peak_memory_mb(func: Callable) -> float:
+    """Пик памяти (tracemalloc: python-объекты и буферы numpy) за один вызов func"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2 ** 20
+    finally:
+        tracemalloc.stop()
+
+
+def run_suite(sizes: List[int], predictor: NumberPricePredictor, seed: int = 42, repeat: int = 5) -> Dict[str, dict]:
+    """Замеры всех этапов на каждом размере набора"""
+    feature_engineer = FeatureEngineer()
+    results: Dict[str, dict] = {}
+
+    for size in sizes:
+        plates = generate_plates(size, seed=seed)
+        listings = generate_listings(size, seed=seed)
+        features_df = feature_engineer.prepare_dataframe(listings)
+        # prepare_features переобучает кодировщики - берем отдельный предиктор
+        encoder = NumberPricePredictor()
+
+        def parse_all():
+            for plate in plates:
+                feature_engineer._validate_and_parse(plate, {})
+
+        benchmarks = {
+            '_validate_and_parse': (
+                lambda: time_per_item(lambda p: feature_engineer._validate_and_parse(p, {}), plates, repeat),
+                parse_all
+            ),
+            'extract_features': (
+                lambda: time_per_item(feature_engineer.extract_features, plates, repeat),
+                lambda: [feature_engineer.extract_features(p) for p in plates]
+            ),
+            'prepare_dataframe': (
+                lambda: time_per_call(lambda: feature_engineer.prepare_dataframe(listings), size, repeat),
+                lambda: feature_engineer.prepare_dataframe(listings)
+            ),
+            'prepare_features': (
+                lambda: time_per_call(lambda: encoder.prepare_features(features_df), size, repeat),
+                lambda: encoder.prepare_features(features_df)
+            ),
+            'predict_single': (
+                lambda: time_per_item(predictor.predict_single, plates, repeat),
+                lambda: [predictor.predict_single(p) for p in plates]
+            ),
+        }
+
+        for name, (timed, traced) in benchmarks.items():
+            # Отчеты prepare_dataframe/prepare_features в stdout не входят в замер
+            with contextlib.redirect_stdout(io.StringIO()):
+                traced()  # прогрев
+                stats = timed()
+                stats['peak_memory_mb'] = peak_memory_mb(traced)
+            results.setdefault(name, {})[str(size)] = stats
+            print(f"{name:>20} {size:>8}: {stats['ops_per_sec']:>12,.0f} оп/с, "
+                  f"p50 {stats['p50_us']:>12,.1f} мкс, p99 {stats['p99_us']:>12,.1f} мкс, "
+                  f"память {stats['peak_memory_mb']:>8.1f} МБ")
+
+    return results
+
+
+def environment() -> Dict[str, str]:
+    """Окружение запуска - чтобы сравнивать результаты одной машины"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'cpu_count': str(os.cpu_count()),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def find_regressions(baseline: dict, current: dict, threshold: float, p99_threshold: float) -> List[str]:
+    """Метрики, ухудшившиеся относительно baseline больше чем на threshold (для p99 - p99_threshold), доля"""
+    regressions = []
+    for name, by_size in current['results'].items():
+        for size, stats in by_size.items():
+            base = baseline['results'].get(name, {}).get(size)
+            if base is None:
+                continue
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                old, new = base.get(metric), stats.get(metric)
+                if not old or new is None:
+                    continue
+                if metric == 'p99_us' and new - old < P99_MIN_DELTA_US:
+                    continue
+                change = (old - new) / old if higher_is_better else (new - old) / old
+                if change > (p99_threshold if metric == 'p99_us' else threshold):
+                    regressions.append(f"{name} [{size}] {metric}: {old:,.1f} -> {new:,.1f} (хуже на {change:.0%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Микробенчмарки ML-сервиса с сохранением в JSON")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5, help="повторов каждого замера")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help="JSON прошлого запуска для проверки регрессий")
+    parser.add_argument('--threshold', type=float, default=0.3,
+                        help="допустимое ухудшение метрики (доля), больше - регрессия")
+    parser.add_argument('--p99-threshold', type=float, default=1.0, help="допустимое ухудшение p99 (доля)")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    # Небольшая модель на синтетике с фиксированным seed; служебные файлы - во временном каталоге
+    os.chdir(tempfile.mkdtemp())
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor = train_synthetic_model(seed=args.seed, model_path='models/price_catboost_model.cbm')
+
+    report = {'environment': environment(), 'sizes': args.sizes, 'seed': args.seed,
+              'results': run_suite(args.sizes, predictor, seed=args.seed, repeat=args.repeat)}
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nРезультаты сохранены в {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(baseline, report, args.threshold, args.p99_threshold)
+        if regressions:
+            print(f"\n❌ Регрессии относительно {baseline['environment'].get('commit') or baseline_path}:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"\n✅ Регрессий нет (порог {args.threshold:.0%})")
@@ -0,0 +1,81 @@
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from price_predictor import NumberPricePredictor
+from synthetic import generate_plates, train_synthetic_model
+from trainer import TrainerProcess
+
+
+def _train(n: int, model_path: str, thread_count: int = -1) -> str:
+    train_synthetic_model(n, model_path=model_path, thread_count=thread_count)
+    return model_path
+
+
+def latency_while(predictor: NumberPricePredictor, plates, running, rps: float) -> dict:
+    """Латентность predict_single (мкс) под нагрузкой rps запросов/с, пока running() истинно"""
+    timings = []
+    interval = 1.0 / rps
+    next_request = time.perf_counter()
+    i = 0
+    while running() or len(timings) < len(plates):
+        # Запросы идут с постоянной частотой; задержка очереди входит в латентность
+        delay = next_request - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        plate = plates[i % len(plates)]
+        predictor.predict_single(plate)
+        timings.append((time.perf_counter() - next_request) * 1e6)
+        next_request += interval
+        i += 1
+
+    timings = np.array(timings)
+    return {'requests': len(timings), 'p50_us': float(np.percentile(timings, 50)),
+            'p99_us': float(np.percentile(timings, 99)), 'max_us': float(timings.max())}
+
+
+def compare_training_modes(predictor: NumberPricePredictor, train_rows: int, model_dir: str,
+                           n: int = 2000, rps: float = 500, seed: int = 42) -> dict:
+    """Латентность предсказаний без обучения, при обучении в потоке сервиса и в отдельном процессе"""
+    plates = generate_plates(n, seed=seed)
+    predictor.predict_single(plates[0])
+    results = {'idle': latency_while(predictor, plates, lambda: False, rps)}
+
+    # Как раньше: run_in_executor(None, ...) - поток в том же процессе, все ядра
+    thread = threading.Thread(target=_train, args=(train_rows, os.path.join(model_dir, 'thread.cbm')))
+    started = time.perf_counter()
+    thread.start()
+    results['thread'] = latency_while(predictor, plates, thread.is_alive, rps)
+    results['thread']['train_sec'] = time.perf_counter() - started
+
+    trainer = TrainerProcess()
+    executor = trainer.executor()
+    started = time.perf_counter()
+    future = trainer.submit(executor, _train, train_rows, os.path.join(model_dir, 'process.cbm'))
+    results['process'] = latency_while(predictor, plates, lambda: not future.done(), rps)
+    future.result()
+    results['process']['train_sec'] = time.perf_counter() - started
+    executor.shutdown()
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Латентность predict во время обучения: поток против процесса")
+    parser.add_argument('--n', type=int, default=2000, help="номеров в цикле запросов")
+    parser.add_argument('--rps', type=float, default=500, help="частота запросов")
+    parser.add_argument('--train-rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    # Обучение пишет служебные файлы в models/ - работаем во временном каталоге
+    os.chdir(tempfile.mkdtemp())
+    predictor = train_synthetic_model(model_path='models/serving.cbm')
+
+    for name, stats in compare_training_modes(predictor, args.train_rows, 'models', n=args.n, rps=args.rps).items():
+        train_sec = f", обучение {stats['train_sec']:.1f} с" if 'train_sec' in stats else ''
+        print(f"{name:>8}: {stats['requests']:>7} запросов, p50 {stats['p50_us']:8.1f} мкс, "
+              f"p99 {stats['p99_us']:9.1f} мкс, max {stats['max_us']:10.1f} мкс{train_sec}")
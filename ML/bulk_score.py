@@ -0,0 +1,175 @@
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+from feature_extractor import normalize_number
+from price_predictor import NumberPricePredictor
+
+# Номеров в одной порции, отправляемой в процесс-обработчик
+BULK_CHUNK_ROWS = 20000
+# Порций в работе на один процесс: обработчики не простаивают,
+# а в памяти одновременно лежит ограниченное число порций
+BULK_INFLIGHT_PER_WORKER = 2
+
+OUTPUT_COLUMNS = ['number', 'predicted_price', 'confidence', 'price_low', 'price_high', 'error']
+
+# Предиктор процесса-обработчика (загружается один раз в _init_worker)
+_worker_predictor: Optional[NumberPricePredictor] = None
+
+
+def read_numbers(path: str, column: str = 'number', chunk_size: int = BULK_CHUNK_ROWS) -> Iterator[List]:
+    """Номера из CSV или Parquet порциями по chunk_size, без чтения файла целиком"""
+    if _is_parquet(path):
+        parquet = _import_parquet()
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=[column]):
+            yield batch.column(0).to_pylist()
+    else:
+        # keep_default_na=False: пустая ячейка - пустая строка (некорректный номер), а не NaN
+        reader = pd.read_csv(path, usecols=[column], dtype={column: str}, keep_default_na=False,
+                             chunksize=chunk_size)
+        for chunk in reader:
+            yield chunk[column].tolist()
+
+
+def score_numbers(predictor: NumberPricePredictor, numbers: List, thread_count: int = -1) -> pd.DataFrame:
+    """Проверка, признаки и цены для порции номеров; строки в порядке входа"""
+    normalized = [normalize_number(number) if isinstance(number, str) else number for number in numbers]
+    results = predictor.predict_batch(normalized, thread_count=thread_count)
+
+    frame = pd.DataFrame({
+        'number': numbers,
+        'predicted_price': pd.array([r.get('predicted_price') for r in results], dtype='Int64'),
+        'confidence': [r.get('confidence') for r in results],
+        'price_low': pd.array([r['price_range']['low'] if 'price_range' in r else None for r in results], dtype='Int64'),
+        'price_high': pd.array([r['price_range']['high'] if 'price_range' in r else None for r in results], dtype='Int64'),
+        'error': [r.get('error') for r in results],
+    })
+    frame['confidence'] = frame['confidence'].astype(float)
+    return frame
+
+
+def _init_worker(model_path: str, version: Optional[str]) -> None:
+    global _worker_predictor
+    _worker_predictor = NumberPricePredictor(model_path=model_path)
+    _worker_predictor.load_model(version)
+
+
+def _score_chunk(numbers: List) -> pd.DataFrame:
+    # Один поток CatBoost на процесс: параллелизм дают сами процессы
+    return score_numbers(_worker_predictor, numbers, thread_count=1)
+
+
+class ResultWriter:
+    """Запись результатов порциями в CSV или Parquet (по расширению файла)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parquet = _is_parquet(path)
+        self._writer = None
+        self._header = True
+
+    def write(self, frame: pd.DataFrame) -> None:
+        if self.parquet:
+            parquet = _import_parquet()
+            import pyarrow as pa
+
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = parquet.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            frame.to_csv(self.path, mode='w' if self._header else 'a', header=self._header, index=False)
+            self._header = False
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        elif self._header and not self.parquet:
+            # Пустой вход - файл только с заголовком
+            pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(self.path, index=False)
+
+
+def bulk_score(input_path: str, output_path: str, column: str = 'number',
+               chunk_size: int = BULK_CHUNK_ROWS, workers: Optional[int] = None,
+               model_path: str = 'models/price_catboost_model.cbm',
+               version: Optional[str] = None) -> dict:
+    """Оценка всех номеров файла пулом процессов с записью результата в output_path.
+
+    Каждый процесс один раз загружает модель, порции раздаются по мере
+    готовности, а пишутся строго в порядке входного файла.
+    """
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    rows = invalid = 0
+    writer = ResultWriter(output_path)
+    chunks = read_numbers(input_path, column, chunk_size)
+
+    def written(frame: pd.DataFrame) -> None:
+        nonlocal rows, invalid
+        writer.write(frame)
+        rows += len(frame)
+        invalid += int(frame['error'].notna().sum())
+        print(f"📦 Оценено {rows} номеров ({rows / (time.perf_counter() - started):.0f}/с)")
+
+    try:
+        if workers == 1:
+            # Без пула: тот же путь в текущем процессе
+            predictor = NumberPricePredictor(model_path=model_path)
+            predictor.load_model(version)
+            for numbers in chunks:
+                written(score_numbers(predictor, numbers))
+        else:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(model_path, version),
+            )
+            with executor:
+                pending = deque()
+                for numbers in chunks:
+                    pending.append(executor.submit(_score_chunk, numbers))
+                    if len(pending) >= workers * BULK_INFLIGHT_PER_WORKER:
+                        written(pending.popleft().result())
+                while pending:
+                    written(pending.popleft().result())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ {rows} номеров за {elapsed:.1f} с, некорректных: {invalid}")
+    return {'rows': rows, 'invalid': invalid, 'workers': workers, 'elapsed_sec': round(elapsed, 3)}
+
+
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith(('.parquet', '.pq'))
+
+
+def _import_parquet():
+    """pyarrow.parquet; нужен только для Parquet-файлов"""
+    try:
+        import pyarrow.parquet as parquet
+    except ImportError as e:
+        raise RuntimeError(f"Для Parquet нужен пакет pyarrow: {e}") from e
+    return parquet
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетная оценка номеров из CSV/Parquet")
+    parser.add_argument('input', help="входной файл .csv или .parquet")
+    parser.add_argument('output', help="файл результата .csv или .parquet")
+    parser.add_argument('--column', default='number', help="колонка с номерами")
+    parser.add_argument('--chunk-size', type=int, default=BULK_CHUNK_ROWS)
+    parser.add_argument('--workers', type=int, default=None, help="процессов (по умолчанию - число ядер)")
+    parser.add_argument('--model-path', default='models/price_catboost_model.cbm')
+    parser.add_argument('--version', default=None, help="версия модели из реестра (по умолчанию текущая)")
+    args = parser.parse_args()
+
+    bulk_score(args.input, args.output, column=args.column, chunk_size=args.chunk_size,
+               workers=args.workers, model_path=args.model_path, version=args.version)
@@ -0,0 +1,152 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from feature_extractor import FeatureEngineer, HISTORY_FEATURES, MODEL_NUMERICAL_FEATURES
+
+# Ключ корзины; порядок важен: каждый префикс ключа - непрерывный диапазон строк
+BUCKET_COLUMNS = ['digit_type', 'region_group', 'series_pattern']
+
+
+def series_pattern(letter1: np.ndarray, letter2: np.ndarray, letter3: np.ndarray) -> np.ndarray:
+    """Шаблон повторов букв серии: AAA, AAB, ABA, ABB или ABC"""
+    return np.select(
+        [(letter1 == letter2) & (letter2 == letter3), letter1 == letter2, letter1 == letter3, letter2 == letter3],
+        ['AAA', 'AAB', 'ABA', 'ABB'],
+        'ABC'
+    )
+
+
+class ComparablesIndex:
+    """Индекс похожих объявлений из обучающей выборки.
+
+    Строки отсортированы по корзинам (digit_type, region_group, шаблон серии)
+    и лежат матрицей числовых признаков, масштабированных на важность
+    признака в модели. Поиск - полный перебор внутри корзины; если в ней
+    меньше k объявлений, ключ укорачивается (без серии, затем без региона).
+    Файлы индекса читаются через mmap.
+    """
+
+    def __init__(self, columns: List[str], scale: np.ndarray, vectors: np.ndarray, sq_norms: np.ndarray,
+                 numbers: np.ndarray, prices: np.ndarray, buckets: List[list]):
+        self.columns = columns
+        self.scale = scale
+        self.vectors = vectors
+        self.sq_norms = sq_norms
+        self.numbers = numbers
+        self.prices = prices
+        self.buckets = buckets
+        # Диапазоны строк для ключа и всех его префиксов
+        self.ranges: Dict[tuple, tuple] = {(): (0, len(prices))}
+        for *key, start, end in buckets:
+            for level in range(1, len(key) + 1):
+                prefix = tuple(key[:level])
+                low, high = self.ranges.get(prefix, (start, end))
+                self.ranges[prefix] = (min(low, start), max(high, end))
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, feature_engineer: FeatureEngineer,
+              importance: Optional[Dict[str, float]] = None) -> 'ComparablesIndex':
+        """Индекс по обучающему DataFrame (полному или compact_dataframe)"""
+        # История цен описывает объявление, а не сам номер - в похожесть не входит
+        columns = [col for col in MODEL_NUMERICAL_FEATURES if col in df.columns and col not in HISTORY_FEATURES]
+        values = df[columns].to_numpy(dtype=np.float64)
+
+        # Стандартизация и вес признака: sqrt доли важности в модели
+        std = values.std(axis=0)
+        std[std == 0] = 1.0
+        weights = np.array([(importance or {}).get(col, 1.0) for col in columns], dtype=np.float64)
+        if weights.sum() <= 0:
+            weights = np.ones(len(columns))
+        scale = np.sqrt(weights / weights.sum()) / std
+
+        keys = pd.DataFrame({
+            'digit_type': df['digit_type'].astype(str).to_numpy(),
+            'region_group': df['region_group'].astype(str).to_numpy(),
+            'series_pattern': series_pattern(df['letter1_num'].to_numpy(), df['letter2_num'].to_numpy(),
+                                             df['letter3_num'].to_numpy()),
+        })
+        order = np.lexsort([keys[col].to_numpy() for col in reversed(BUCKET_COLUMNS)])
+        keys = keys.iloc[order].reset_index(drop=True)
+
+        vectors = (values[order] * scale).astype(np.float32)
+        numbers = cls._numbers(df, feature_engineer)[order]
+        prices = df['price'].to_numpy(dtype=np.float64)[order]
+
+        starts = np.flatnonzero(keys.ne(keys.shift()).any(axis=1).to_numpy())
+        ends = np.append(starts[1:], len(keys))
+        buckets = [[*keys.iloc[start].tolist(), int(start), int(end)] for start, end in zip(starts, ends)]
+
+        return cls(columns, scale, vectors, np.einsum('ij,ij->i', vectors, vectors), numbers, prices, buckets)
+
+    def query(self, features: Dict[str, Any], k: int = 10) -> Dict[str, Any]:
+        """k ближайших объявлений к номеру с признаками features (FeatureEngineer.extract_features)"""
+        key = [str(features[col]) if col != 'series_pattern' else
+               str(series_pattern(features['letter1_num'], features['letter2_num'], features['letter3_num']))
+               for col in BUCKET_COLUMNS]
+
+        # Самая узкая корзина, в которой набирается k объявлений
+        level = len(key)
+        start, end = self.ranges.get(tuple(key), (0, 0))
+        while end - start < k and level > 0:
+            level -= 1
+            start, end = self.ranges.get(tuple(key[:level]), (0, 0))
+
+        point = (np.array([features.get(col, 0) for col in self.columns], dtype=np.float64) * self.scale)
+        point = point.astype(np.float32)
+        # |x - p|^2 = |x|^2 - 2 x.p + |p|^2; |p|^2 одинаков для всех строк и добавляется в конце
+        distances = self.sq_norms[start:end] - 2 * (self.vectors[start:end] @ point)
+        k = min(k, end - start)
+        nearest = np.argpartition(distances, k - 1)[:k] if k < end - start else np.arange(end - start)
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+        distances = np.sqrt(np.maximum(distances[nearest] + float(point @ point), 0))
+
+        rows = nearest + start
+        return {
+            'bucket': dict(zip(BUCKET_COLUMNS[:level], key[:level])),
+            'bucket_size': int(end - start),
+            'median_price': float(np.median(self.prices[rows])) if len(rows) else None,
+            'comparables': [
+                {'number': str(self.numbers[row]), 'price': float(self.prices[row]), 'distance': round(float(d), 4)}
+                for row, d in zip(rows, distances)
+            ],
+        }
+
+    def save(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'vectors.npy'), self.vectors)
+        np.save(os.path.join(path, 'sq_norms.npy'), self.sq_norms)
+        np.save(os.path.join(path, 'numbers.npy'), np.asarray(self.numbers, dtype=str))
+        np.save(os.path.join(path, 'prices.npy'), self.prices)
+        with open(os.path.join(path, 'index.json'), 'w') as f:
+            json.dump({'columns': self.columns, 'scale': self.scale.tolist(), 'buckets': self.buckets},
+                      f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> 'ComparablesIndex':
+        with open(os.path.join(path, 'index.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                  for name in ['vectors', 'sq_norms', 'numbers', 'prices']}
+        return cls(meta['columns'], np.array(meta['scale']), arrays['vectors'], arrays['sq_norms'],
+                   arrays['numbers'], arrays['prices'], meta['buckets'])
+
+    @staticmethod
+    def _numbers(df: pd.DataFrame, feature_engineer: FeatureEngineer) -> np.ndarray:
+        """Номера объявлений; в компактном DataFrame колонки number нет - собираем по признакам"""
+        if 'number' in df.columns:
+            return df['number'].to_numpy(dtype=str)
+
+        letters = np.array([''] + sorted(feature_engineer.letter_to_num, key=feature_engineer.letter_to_num.get))
+        digits = df['digits'].to_numpy()
+        regions = df['region'].to_numpy()
+        lengths = df['region_length'].to_numpy()
+        l1, l2, l3 = (letters[df[col].to_numpy(dtype=np.intp)] for col in ['letter1_num', 'letter2_num', 'letter3_num'])
+        return np.array([f'{a}{d:03d}{b}{c}{str(r).zfill(n)}'
+                         for a, d, b, c, r, n in zip(l1, digits, l2, l3, regions, lengths)])
@@ -1,13 +1,99 @@
 import pandas as pd
 import numpy as np
 import psycopg2
+import io
+import time
 from datetime import datetime, timedelta
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 import joblib
+from feature_extractor import HISTORY_DEFAULTS, HISTORY_FEATURES
 import warnings
 warnings.filterwarnings('ignore')
 
+# Агрегаты price_history по номерам: одна оконная выборка по номерам, у которых
+# появились записи истории, и upsert в number_price_stats
+PRICE_HISTORY_STATS_QUERY = """
+WITH changed AS (
+    SELECT DISTINCT number_id FROM price_history
+    {where}
+),
+steps AS (
+    SELECT
+        ph.number_id,
+        ph.offer_id,
+        ph.price,
+        ph.created_at,
+        LAG(ph.price) OVER (PARTITION BY ph.offer_id ORDER BY ph.created_at, ph.id) AS prev_price,
+        FIRST_VALUE(ph.price) OVER by_number AS first_price,
+        LAST_VALUE(ph.price) OVER by_number AS last_price
+    FROM price_history ph
+    JOIN changed USING (number_id)
+    WINDOW by_number AS (
+        PARTITION BY ph.number_id ORDER BY ph.created_at, ph.id
+        ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+    )
+)
+INSERT INTO number_price_stats (number_id, listing_count, price_drops, first_price, last_price,
+                                first_seen_at, last_change_at)
+SELECT
+    number_id,
+    COUNT(DISTINCT offer_id),
+    COUNT(*) FILTER (WHERE price < prev_price),
+    MIN(first_price),
+    MIN(last_price),
+    MIN(created_at),
+    MAX(created_at)
+FROM steps
+GROUP BY number_id
+ON CONFLICT (number_id) DO UPDATE SET
+    listing_count  = EXCLUDED.listing_count,
+    price_drops    = EXCLUDED.price_drops,
+    first_price    = EXCLUDED.first_price,
+    last_price     = EXCLUDED.last_price,
+    first_seen_at  = EXCLUDED.first_seen_at,
+    last_change_at = EXCLUDED.last_change_at,
+    updated_at     = CURRENT_TIMESTAMP
+"""
+
+# Схлопывание повторных объявлений: строки одного нормализованного номера, между
+# соседними публикациями которых не больше dedup_days дней, - одно объявление
+# с медианной ценой, датой последней публикации и весом 1 + ln(число строк)
+DEDUP_QUERY = """
+WITH base AS ({base}),
+marked AS (
+    SELECT
+        number,
+        price,
+        posted_at,
+        CASE WHEN posted_at - LAG(posted_at) OVER by_number <= %(dedup_days)s * INTERVAL '1 day'
+             THEN 0 ELSE 1 END AS new_listing
+    FROM (
+        SELECT
+            translate(upper(regexp_replace(number, '\\s', '', 'g')), 'ABEKMHOPCTYX', 'АВЕКМНОРСТУХ') AS number,
+            price,
+            posted_at
+        FROM base
+    ) b
+    WINDOW by_number AS (PARTITION BY number ORDER BY posted_at)
+),
+listings AS (
+    SELECT
+        number,
+        price,
+        posted_at,
+        SUM(new_listing) OVER (PARTITION BY number ORDER BY posted_at ROWS UNBOUNDED PRECEDING) AS listing
+    FROM marked
+)
+SELECT
+    number,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY price) AS price,
+    MAX(posted_at) AS posted_at,
+    1 + LN(COUNT(*)) AS weight
+FROM listings
+GROUP BY number, listing
+"""
+
 class DataLoader:
     def __init__(self, db_config):
         self.db_config = db_config
@@ -23,31 +109,251 @@ class DataLoader:
             port=self.db_config['port']
         )
 
-    def load_data(self, limit=None, days_back=365):
-        """Загрузка данных из базы"""
-        self.connect()
+    def _training_query(self, limit=None, days_back=365, dedup_days=None):
+        """Запрос обучающих данных и его параметры.
 
+        С dedup_days повторные объявления схлопываются в Postgres (DEDUP_QUERY),
+        и в выборке появляется колонка weight - вес строки для обучения.
+        """
         # Загружаем данные за последний год (или все)
-        query = f"""
+        query = """
         SELECT
             number,
             price,
             posted_at
         FROM car_numbers
-        WHERE posted_at >= NOW() - INTERVAL '{days_back} days'
+        WHERE posted_at >= NOW() - %(days_back)s * INTERVAL '1 day'
         AND price > 1000 AND price < 10000000  -- фильтр выбросов
-        {'LIMIT ' + str(limit) if limit else ''}
         """
+        params = {'days_back': int(days_back)}
+        if limit:
+            query += "LIMIT %(limit)s\n"
+            params['limit'] = int(limit)
+        if dedup_days is not None:
+            query = DEDUP_QUERY.format(base=query)
+            params['dedup_days'] = int(dedup_days)
+        return query, params
 
-        df = pd.read_sql_query(query, self.conn)
+    @staticmethod
+    def _training_columns(dedup_days=None):
+        return ['number', 'price', 'posted_at'] + (['weight'] if dedup_days is not None else [])
+
+    def load_data(self, limit=None, days_back=365, dedup_days=None):
+        """Загрузка данных из базы"""
+        self.connect()
+
+        query, params = self._training_query(limit=limit, days_back=days_back, dedup_days=dedup_days)
+        df = pd.read_sql_query(query, self.conn, params=params)
         self.conn.close()
 
-        print(f"Загружено {len(df)} записей")
-        print(f"Диапазон цен: {df['price'].min():,.0f} - {df['price'].max():,.0f} руб.")
-        print(f"Средняя цена: {df['price'].mean():,.0f} руб.")
+        self._print_summary(df)
+        return df
+
+    def load_data_copy(self, limit=None, days_back=365, dedup_days=None):
+        """Быстрая загрузка через COPY (SELECT ...) TO STDOUT в буфер в памяти.
 
+        Строки не превращаются в python-объекты на курсоре: CSV от сервера
+        сразу разбирается в типизированные колонки.
+        """
+        self.connect()
+
+        query, params = self._training_query(limit=limit, days_back=days_back, dedup_days=dedup_days)
+        columns = self._training_columns(dedup_days)
+        buffer = io.BytesIO()
+        try:
+            with self.conn.cursor() as cursor:
+                # COPY не принимает серверные параметры - подставляем их с экранированием
+                select = cursor.mogrify(query, params).decode()
+                # Дату отдаем числом (epoch): разбор строк с таймзоной в pandas медленный
+                extra = ''.join(f', {col}' for col in columns[3:])
+                cursor.copy_expert(
+                    f"COPY (SELECT number, price, EXTRACT(EPOCH FROM posted_at){extra} FROM ({select}) q) "
+                    f"TO STDOUT WITH (FORMAT csv)",
+                    buffer
+                )
+        finally:
+            self.conn.close()
+
+        buffer.seek(0)
+        df = pd.read_csv(
+            buffer,
+            names=columns,
+            dtype={'number': object, 'price': np.float64, 'posted_at': np.float64, 'weight': np.float64},
+            keep_default_na=False,
+            engine='c'
+        )
+        df['posted_at'] = pd.to_datetime(df['posted_at'], unit='s', utc=True).dt.round('us')
+
+        self._print_summary(df)
         return df
 
+    def _print_summary(self, df):
+        print(f"Загружено {len(df)} записей")
+        if len(df):
+            print(f"Диапазон цен: {df['price'].min():,.0f} - {df['price'].max():,.0f} руб.")
+            print(f"Средняя цена: {df['price'].mean():,.0f} руб.")
+
+    def iter_chunks(self, chunk_size=50000, limit=None, days_back=365, dedup_days=None):
+        """Потоковая загрузка: серверный (именованный) курсор, DataFrame по chunk_size строк"""
+        query, params = self._training_query(limit=limit, days_back=days_back, dedup_days=dedup_days)
+        return self._iter_query_chunks(query, params, self._training_columns(dedup_days), chunk_size)
+
+    def iter_offer_chunks(self, since=None, chunk_size=50000):
+        """Потоковая загрузка предложений, измененных с момента since (updated_at).
+
+        Используется хранилищем признаков: id предложения - ключ строки,
+        updated_at - отметка, до которой данные уже обработаны. Фильтр цен
+        здесь не применяется - цена могла выйти из диапазона, и старую
+        строку тоже нужно заменить. Агрегаты истории цен сюда не входят:
+        они меняются без изменения предложения и подставляются по number_id
+        при чтении хранилища (load_price_history_features).
+        """
+        query = """
+        SELECT
+            o.id::text AS offer_id,
+            o.number_id::text AS number_id,
+            n.number,
+            o.price,
+            o.posted_at,
+            o.updated_at
+        FROM offers o
+        JOIN numbers n ON n.id = o.number_id
+        """
+        params = {}
+        if since is not None:
+            # Запас в час, как в refresh_price_history_stats: транзакция, закоммиченная
+            # позже прошлой выгрузки, может нести более ранний updated_at.
+            # Повторно выгруженные строки просто заменяют свои же в хранилище
+            query += "WHERE o.updated_at >= %(since)s - INTERVAL '1 hour'\n"
+            params['since'] = since
+        query += "ORDER BY o.updated_at\n"
+
+        return self._iter_query_chunks(
+            query, params, ['offer_id', 'number_id', 'number', 'price', 'posted_at', 'updated_at'], chunk_size
+        )
+
+    def load_offer_ids(self):
+        """id всех текущих предложений - по ним хранилище признаков удаляет исчезнувшие (FeatureStore.retain)"""
+        self.connect()
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute("SELECT id::text FROM offers")
+                offer_ids = np.array([row[0] for row in cursor.fetchall()], dtype=object)
+        finally:
+            self.conn.close()
+        return offer_ids
+
+    def load_price_history_features(self):
+        """Признаки истории цен (HISTORY_FEATURES) по number_id из number_price_stats.
+
+        Дни на рынке считаются от первой записи истории до момента обучения.
+        Номеров без истории в выборке нет - для них при соединении
+        подставляется HISTORY_DEFAULTS, как и при предсказании.
+        """
+        self.connect()
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute("""
+                SELECT
+                    number_id::text,
+                    listing_count,
+                    price_drops,
+                    COALESCE(ROUND(100 * (last_price / NULLIF(first_price, 0) - 1)), %(price_change)s)::int,
+                    GREATEST(EXTRACT(DAY FROM NOW() - first_seen_at), 0)::int
+                FROM number_price_stats
+                """, {'price_change': HISTORY_DEFAULTS['history_price_change']})
+                rows = cursor.fetchall()
+        finally:
+            self.conn.close()
+
+        history = pd.DataFrame(rows, columns=['number_id'] + HISTORY_FEATURES)
+        print(f"Агрегаты истории цен: {len(history)} номеров")
+        return history
+
+    def refresh_price_history_stats(self):
+        """Инкрементальный пересчет агрегатов истории цен (number_price_stats).
+
+        Отметка - самый поздний last_change_at в таблице агрегатов: пересчитываются
+        только номера с записями истории не старше нее, каждый - по всей своей
+        истории (индекс price_history по number_id, created_at).
+        """
+        started = time.perf_counter()
+        self.connect()
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute("SELECT MAX(last_change_at) FROM number_price_stats")
+                since = cursor.fetchone()[0]
+                if since is None:
+                    cursor.execute(PRICE_HISTORY_STATS_QUERY.format(where=''))
+                else:
+                    # Запас в час: записи истории из транзакций, закоммиченных позже
+                    # более новых записей, иначе остались бы за отметкой
+                    cursor.execute(
+                        PRICE_HISTORY_STATS_QUERY.format(where="WHERE created_at >= %(since)s - INTERVAL '1 hour'"),
+                        {'since': since}
+                    )
+                updated = cursor.rowcount
+            self.conn.commit()
+        finally:
+            self.conn.close()
+
+        print(f"Агрегаты истории цен: пересчитано {updated} номеров за {time.perf_counter() - started:.1f} с"
+              f" (отметка {since})")
+        return updated
+
+    def iter_reprice_chunks(self, model_version, since=None, chunk_size=50000):
+        """Активные предложения для пересчета справедливой цены (offer_fair_prices).
+
+        Берутся предложения, измененные с момента since (updated_at), кроме
+        тех, у которых уже есть цена этой же версии модели при той же цене
+        предложения: импорт обновляет updated_at и без изменений.
+        """
+        query = """
+        SELECT
+            o.id::text AS offer_id,
+            n.number,
+            o.price,
+            o.updated_at
+        FROM offers o
+        JOIN numbers n ON n.id = o.number_id
+        LEFT JOIN offer_fair_prices fp ON fp.offer_id = o.id
+        WHERE o.status = 'active'
+        AND (fp.offer_id IS NULL
+             OR fp.model_version <> %(model_version)s
+             OR fp.offer_price IS DISTINCT FROM o.price)
+        """
+        params = {'model_version': model_version}
+        if since is not None:
+            query += "AND o.updated_at >= %(since)s\n"
+            params['since'] = since
+        query += "ORDER BY o.updated_at\n"
+
+        return self._iter_query_chunks(query, params, ['offer_id', 'number', 'price', 'updated_at'], chunk_size)
+
+    def _iter_query_chunks(self, query, params, columns, chunk_size):
+        self.connect()
+
+        total = 0
+        try:
+            # Именованный курсор держит результат на сервере и отдает его порциями
+            with self.conn.cursor(name='ml_load_data') as cursor:
+                cursor.itersize = chunk_size
+                cursor.execute(query, params)
+
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+
+                    chunk = pd.DataFrame(rows, columns=columns)
+                    chunk['price'] = chunk['price'].astype(float)
+                    total += len(chunk)
+                    yield chunk
+        finally:
+            self.conn.close()
+
+        print(f"Загружено {total} записей (порциями по {chunk_size})")
+
     def close(self):
         if self.conn:
             self.conn.close()
@@ -1,7 +1,58 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Iterable, Optional, List, Tuple
 import re
+import time
+
+# Латинские буквы, которые вводят вместо кириллических двойников
+LATIN_TO_CYRILLIC = str.maketrans('ABEKMHOPCTYX', 'АВЕКМНОРСТУХ')
+
+
+# Признаки, на которых обучается модель (NumberPricePredictor.prepare_features)
+MODEL_CATEGORICAL_FEATURES = ['digit_category', 'digit_type', 'region_group']
+MODEL_NUMERICAL_FEATURES = [
+    'digits', 'digit_1', 'digit_2', 'digit_3', 'digit_sum',
+    'is_single_digit', 'is_triple', 'is_mirror', 'is_sequence',
+    'is_round', 'has_7', 'has_0', 'has_0_middle',
+    'letter1_num', 'letter2_num', 'letter3_num',
+    'letter_diff_1_2', 'letter_diff_2_3',
+    'is_triple_letters', 'is_vip_series', 'is_mirror_series',
+    'is_beautiful_word', 'is_prestige_first_letter',
+    'is_same_last_two_letters', 'is_hot_series',
+    'region', 'is_moscow', 'is_spb', 'is_million_city', 'is_early_region',
+    'region_length', 'region_last_two', 'region_last_digit', 'region_first_digit',
+    'digit_region_exact_match', 'digit_region_last_two_match', 'digit_region_first_two_match',
+    'visual_match_score', 'semantic_match', 'full_pattern_match',
+    'golden_number', 'digit_letter_position_match',
+    'prestige_score_raw', 'prestige_score'
+]
+
+# Признаки истории цен номера (DataLoader.refresh_price_history_stats): приходят
+# из БД вместе с объявлением, а не из строки номера. При предсказании их нет -
+# подставляется HISTORY_DEFAULTS, то есть цена оценивается как для свежего
+# объявления: у каждого сохраненного объявления уже есть одна запись price_history.
+# Те же значения получают при обучении номера без агрегатов (FeatureStore.load)
+HISTORY_FEATURES = ['history_listings', 'history_price_drops', 'history_price_change', 'history_days_on_market']
+HISTORY_DEFAULTS = {'history_listings': 1, 'history_price_drops': 0, 'history_price_change': 0,
+                    'history_days_on_market': 0}
+MODEL_NUMERICAL_FEATURES += HISTORY_FEATURES
+
+# Узкие типы для компактного обучающего DataFrame (флаги и мелкие счетчики - int8)
+COMPACT_DTYPES = {
+    'digits': np.uint16,
+    'region': np.uint16,
+    'prestige_score_raw': np.int16,
+    'history_listings': np.int16,
+    'history_price_drops': np.int16,
+    'history_price_change': np.int16,
+    'history_days_on_market': np.int16,
+}
+
+
+def normalize_number(number_str: str) -> str:
+    """Приведение номера к каноническому виду: без пробелов, заглавная кириллица"""
+    return ''.join(number_str.split()).upper().translate(LATIN_TO_CYRILLIC)
+
 
 class FeatureEngineer:
     def __init__(self):
@@ -181,7 +232,44 @@ class FeatureEngineer:
         # 1. РАЗБИЕНИЕ НОМЕРА
         if not self._validate_and_parse(number_str, features):
             return None
-            
+
+        tables = self._get_component_tables()
+        digit_idx = tables.digit_index.get(features['digits_str'])
+        series_idx = tables.series_index.get(features['full_series'])
+        region_idx = tables.region_index.get(features['region_str'])
+        if digit_idx is None or series_idx is None or region_idx is None:
+            # Экзотический формат (не-ASCII цифры и т.п.) - считаем напрямую
+            return self._extract_features_direct(features)
+
+        # 2-4. ЦИФРЫ, БУКВЫ, РЕГИОН - готовые строки таблиц
+        features.update(tables.digit_rows[digit_idx])
+        features.update(tables.series_rows[series_idx])
+        features.update(tables.region_rows[region_idx])
+
+        # 5. ВЗАИМОДЕЙСТВИЯ
+        digit_visual, digit_semantic, digit_score = tables.digit_extra[digit_idx]
+        series_visual, series_semantic, series_score = tables.series_extra[series_idx]
+        features['digit_region_exact_match'] = 1 if features['digits'] == features['region'] else 0
+        features['digit_region_last_two_match'] = 0
+        features['digit_region_first_two_match'] = 0
+        features['visual_match_score'] = bin(digit_visual & series_visual).count('1')
+        features['semantic_match'] = 1 if digit_semantic & series_semantic else 0
+        self._extract_pattern_features(features)
+        features['digit_letter_position_match'] = (
+            (features['letter1_num'] == features['digit_1'])
+            + (features['letter2_num'] == features['digit_2'])
+            + (features['letter3_num'] == features['digit_3'])
+        )
+
+        # 6. РАСЧЕТ ПРЕСТИЖНОСТИ
+        score = (digit_score + series_score + tables.region_score[region_idx]
+                 + self._interaction_score(features))
+        self._set_prestige_score(features, score)
+
+        return features
+
+    def _extract_features_direct(self, features: Dict[str, Any]) -> Dict[str, Any]:
+        """Извлечение признаков без таблиц компонентов (эталонная реализация)"""
         # 2. ЦИФРОВАЯ ЧАСТЬ
         self._extract_digit_features(features)
         
@@ -198,6 +286,21 @@ class FeatureEngineer:
         self._calculate_prestige_score(features)
         
         return features
+
+    def _get_component_tables(self) -> '_ComponentTables':
+        """Таблицы компонентов номера, строятся один раз при первом обращении"""
+        # getattr: у движков, сохраненных до появления таблиц, атрибута нет
+        tables = getattr(self, '_component_tables', None)
+        if tables is None:
+            tables = _ComponentTables(self)
+            self._component_tables = tables
+        return tables
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Таблицы не сохраняем в pickle - они пересобираются из справочников
+        state = self.__dict__.copy()
+        state.pop('_component_tables', None)
+        return state
     
     def _validate_and_parse(self, number_str: str, features: Dict[str, Any]) -> bool:
         """Проверка формата и разбор номера"""
@@ -350,6 +453,20 @@ class FeatureEngineer:
                         break
         features['semantic_match'] = semantic_match
         
+        # 4-5. Полные паттерны и "золотые" номера
+        self._extract_pattern_features(features)
+        
+        # 6. Совпадение цифр и позиций букв
+        features['digit_letter_position_match'] = 0
+        # Проверяем, совпадает ли цифра с номером буквы в алфавите
+        for i, digit_char in enumerate(digits_str):
+            if i < 3:  # только для 3 букв
+                letter_num = self.letter_to_num.get(full_series[i], 0)
+                if letter_num == int(digit_char):
+                    features['digit_letter_position_match'] += 1
+    
+    def _extract_pattern_features(self, features: Dict[str, Any]) -> None:
+        """Полные паттерны и "золотые" номера"""
         # 4. Полные паттерны (зеркальные цифры + зеркальные буквы)
         features['full_pattern_match'] = 0
         if features['is_mirror'] and features['is_mirror_series']:
@@ -367,18 +484,15 @@ class FeatureEngineer:
         # Правило 2: Три одинаковые цифры + три одинаковые буквы
         elif features['is_triple'] and features['is_triple_letters']:
             features['golden_number'] = 1
-        
-        # 6. Совпадение цифр и позиций букв
-        features['digit_letter_position_match'] = 0
-        # Проверяем, совпадает ли цифра с номером буквы в алфавите
-        for i, digit_char in enumerate(digits_str):
-            if i < 3:  # только для 3 букв
-                letter_num = self.letter_to_num.get(full_series[i], 0)
-                if letter_num == int(digit_char):
-                    features['digit_letter_position_match'] += 1
-    
+
     def _calculate_prestige_score(self, features: Dict[str, Any]) -> None:
         """Эвристический расчет престижности номера"""
+        score = (self._digit_score(features) + self._letter_score(features)
+                 + self._region_score(features) + self._interaction_score(features))
+        self._set_prestige_score(features, score)
+
+    def _digit_score(self, features: Dict[str, Any]) -> int:
+        """Баллы престижности за цифры"""
         score = 0
         
         # --- ЦИФРЫ (40%) ---
@@ -403,6 +517,12 @@ class FeatureEngineer:
             score += self.weights['has_7']
         if features['has_0_middle']:
             score += self.weights['has_0']
+
+        return score
+
+    def _letter_score(self, features: Dict[str, Any]) -> int:
+        """Баллы престижности за буквы"""
+        score = 0
         
         # --- БУКВЫ (30%) ---
         if features['is_triple_letters']:
@@ -417,6 +537,12 @@ class FeatureEngineer:
             score += self.weights['prestige_first_letter']
         if features['is_same_last_two_letters']:
             score += self.weights['same_last_two_letters']
+
+        return score
+
+    def _region_score(self, features: Dict[str, Any]) -> int:
+        """Баллы престижности за регион"""
+        score = 0
         
         # --- РЕГИОН (20%) ---
         if features['is_moscow']:
@@ -428,6 +554,12 @@ class FeatureEngineer:
             score += self.weights['million_city']
         elif features['is_early_region']:
             score += self.weights['early_region']
+
+        return score
+
+    def _interaction_score(self, features: Dict[str, Any]) -> int:
+        """Баллы престижности за взаимодействия частей номера"""
+        score = 0
         
         # --- ВЗАИМОДЕЙСТВИЯ (10%) ---
         if features['full_pattern_match'] > 0:
@@ -446,7 +578,11 @@ class FeatureEngineer:
         
         if features['golden_number'] > 0:
             score += self.weights['golden_number'] * features['golden_number']
-        
+
+        return score
+
+    def _set_prestige_score(self, features: Dict[str, Any], score: int) -> None:
+        """Нормализация баллов и категория престижности"""
         # Нормализация к 100 баллам
         features['prestige_score_raw'] = score
         features['prestige_score'] = min(int((float(score) / 250) * 100), 100)
@@ -463,36 +599,316 @@ class FeatureEngineer:
         else:
             features['prestige_category'] = 'economy'
     
-    def prepare_dataframe(self, df: pd.DataFrame, number_col: str = 'number', 
-                         price_col: str = 'price') -> pd.DataFrame:
-        """Подготовка DataFrame с признаками для обучения"""
-        features_list = []
+    def extract_features_batch(self, numbers) -> pd.DataFrame:
+        """Колоночное извлечение признаков для массива номеров.
+
+        Возвращает DataFrame только по валидным номерам - те же колонки, типы
+        и значения, что дал бы extract_features для каждого номера по очереди.
+        Колонка '_row' хранит позицию номера во входном массиве.
+        """
+        numbers = pd.Series(numbers, dtype=object).reset_index(drop=True)
+        pattern = r'^[АВЕКМНОРСТУХ]\d{3}[АВЕКМНОРСТУХ]{2}\d{2,3}$'
+        strict_pattern = r'^[АВЕКМНОРСТУХ][0-9]{3}[АВЕКМНОРСТУХ]{2}[0-9]{2,3}\Z'
+
+        is_str = numbers.map(lambda x: isinstance(x, str)).to_numpy(dtype=bool)
+        strings = numbers[is_str]
+        valid = np.zeros(len(numbers), dtype=bool)
+        strict = np.zeros(len(numbers), dtype=bool)
+        valid[is_str] = strings.str.match(pattern).to_numpy(dtype=bool)
+        strict[is_str] = strings.str.match(strict_pattern).to_numpy(dtype=bool)
+
+        # Строгий формат (ASCII-цифры, без хвостового перевода строки) считаем
+        # колонками, редкие экзотические номера - построчно через extract_features
+        strict_rows = np.flatnonzero(strict)
+        columns = self._extract_columns(numbers.iloc[strict_rows].to_numpy(dtype=object))
+        columns['_row'] = strict_rows
+        # copy=False: колонки остаются отдельными массивами, без склейки в блоки
+        frame = pd.DataFrame(columns, copy=False)
+
+        fallback_rows = np.flatnonzero(valid & ~strict)
+        if len(fallback_rows):
+            fallback = pd.DataFrame([self.extract_features(numbers.iloc[i]) for i in fallback_rows])
+            fallback['_row'] = fallback_rows
+            frame = pd.concat([frame, fallback], ignore_index=True)
+            frame = frame.sort_values('_row', kind='stable').reset_index(drop=True)
+
+        return frame
+
+    def _extract_columns(self, numbers: np.ndarray) -> Dict[str, np.ndarray]:
+        """Признаки для номеров строгого формата: три выборки из таблиц и взаимодействия"""
+        n = len(numbers)
+        tables = self._get_component_tables()
+
+        # Кодовые точки символов: (n, 9), у двузначного региона последняя - 0
+        codes = np.asarray(numbers, dtype='<U9').view(np.uint32).reshape(n, 9).astype(np.int64)
+
+        d1, d2, d3 = codes[:, 1] - 48, codes[:, 2] - 48, codes[:, 3] - 48
+        i1, i2, i3 = (tables.letter_index[codes[:, 0]], tables.letter_index[codes[:, 4]],
+                      tables.letter_index[codes[:, 5]])
+        region_length = np.where(codes[:, 8] > 0, 3, 2)
+        region = np.where(region_length == 3,
+                          (codes[:, 6] - 48) * 100 + (codes[:, 7] - 48) * 10 + (codes[:, 8] - 48),
+                          (codes[:, 6] - 48) * 10 + (codes[:, 7] - 48))
+
+        digit_idx = d1 * 100 + d2 * 10 + d3
+        series_idx = i1 * 144 + i2 * 12 + i3
+        region_idx = np.where(region_length == 3, 100 + region, region)
+
+        # 1. РАЗБИЕНИЕ НОМЕРА
+        cols: Dict[str, np.ndarray] = {}
+        cols['original_number'] = np.asarray(numbers, dtype=object)
+        cols['first_letter'] = tables.letters[i1]
+        cols['digits_str'] = tables.digit_keys[digit_idx]
+        cols['series'] = tables.pair_keys[i2 * 12 + i3]
+        cols['region_str'] = tables.region_keys[region_idx]
+        cols['digits'] = digit_idx
+        cols['region'] = region
+        cols['full_series'] = tables.series_keys[series_idx]
+        cols['digit_1'] = d1
+        cols['digit_2'] = d2
+        cols['digit_3'] = d3
+
+        # 2-4. ЦИФРЫ, БУКВЫ, РЕГИОН
+        for name, values in tables.digit_cols.items():
+            cols[name] = values[digit_idx]
+        for name, values in tables.series_cols.items():
+            cols[name] = values[series_idx]
+        for name, values in tables.region_cols.items():
+            cols[name] = values[region_idx]
+
+        # 5-6. ВЗАИМОДЕЙСТВИЯ И ПРЕСТИЖНОСТЬ
+        cols.update(self._interaction_columns(digit_idx, series_idx, region_idx))
+        prestige_score = cols['prestige_score']
+        cols['prestige_category'] = np.select(
+            [prestige_score >= 85, prestige_score >= 70, prestige_score >= 50, prestige_score >= 30],
+            ['luxury', 'premium', 'prestige', 'standard'], default='economy'
+        ).astype(object)
+
+        return cols
+
+    def _interaction_columns(self, digit_idx: np.ndarray, series_idx: np.ndarray,
+                             region_idx: np.ndarray) -> Dict[str, np.ndarray]:
+        """Признаки взаимодействий и престижность по индексам компонентов.
+
+        Индексы - как в таблицах компонентов и могут broadcast'иться друг с другом
+        (например, цифры (D, 1) x серии (1, S) дают колонки (D, S)).
+        """
+        tables = self._get_component_tables()
+        digit_cols, series_cols, region_cols = tables.digit_cols, tables.series_cols, tables.region_cols
+        region = np.where(region_idx >= 100, region_idx - 100, region_idx)
+
+        exact_match = digit_idx == region
+        visual_bits = tables.digit_visual[digit_idx] & tables.series_visual[series_idx]
+        visual_matches = np.zeros(visual_bits.shape, dtype=np.int64)
+        for bit in range(tables.visual_pairs):
+            visual_matches += (visual_bits >> bit) & 1
+        semantic_match = (tables.digit_semantic[digit_idx] & tables.series_semantic[series_idx]) != 0
+
+        is_mirror_pattern = (digit_cols['is_mirror'][digit_idx] > 0) & (series_cols['is_mirror_series'][series_idx] > 0)
+        is_triple_pattern = (digit_cols['is_triple'][digit_idx] > 0) & (series_cols['is_triple_letters'][series_idx] > 0)
+        full_pattern_match = np.select([is_mirror_pattern, is_triple_pattern], [1, 2], default=0).astype(np.int64)
+        golden_number = ((tables.digit_premium[digit_idx] & (series_cols['is_vip_series'][series_idx] > 0)
+                          & (region_cols['is_moscow'][region_idx] > 0)) | is_triple_pattern).astype(np.int64)
+
+        d1, d2, d3 = digit_idx // 100, digit_idx // 10 % 10, digit_idx % 10
+        w = self.weights
+        score = (
+            tables.digit_score[digit_idx] + tables.series_score[series_idx] + tables.region_score_array[region_idx]
+            + full_pattern_match * w['full_pattern_match']
+            + semantic_match * w['semantic_match']
+            + visual_matches * w['visual_match']
+            + np.where(exact_match, w['digit_region_exact_match'], 0)
+            + golden_number * w['golden_number']
+        ).astype(np.int64)
+
+        shape = np.broadcast_shapes(np.shape(digit_idx), np.shape(series_idx), np.shape(region_idx))
+        cols = {
+            'digit_region_exact_match': exact_match.astype(np.int64),
+            'digit_region_last_two_match': np.zeros(shape, dtype=np.int64),
+            'digit_region_first_two_match': np.zeros(shape, dtype=np.int64),
+            'visual_match_score': visual_matches,
+            'semantic_match': semantic_match.astype(np.int64),
+            'full_pattern_match': full_pattern_match,
+            'golden_number': golden_number,
+            'digit_letter_position_match': (
+                (series_cols['letter1_num'][series_idx] == d1).astype(np.int64)
+                + (series_cols['letter2_num'][series_idx] == d2) + (series_cols['letter3_num'][series_idx] == d3)
+            ),
+            'prestige_score_raw': score,
+            'prestige_score': np.minimum((score.astype(np.float64) / 250 * 100).astype(np.int64), 100),
+        }
+        return {name: np.broadcast_to(values, shape) for name, values in cols.items()}
+
+    def prepare_dataframe(self, df: pd.DataFrame, number_col: str = 'number',
+                         price_col: str = 'price', columnar: bool = True,
+                         compact: bool = False) -> pd.DataFrame:
+        """Подготовка DataFrame с признаками для обучения.
+
+        columnar=True разбирает всю колонку номеров массивами (extract_features_batch),
+        columnar=False - исходный построчный режим через extract_features.
+        compact=True возвращает компактное представление (compact_dataframe).
+        """
+        started = time.perf_counter()
+
+        if columnar:
+            features_df = self._prepare_columnar(df, number_col, price_col)
+        else:
+            features_df = self._prepare_rowwise(df, number_col, price_col)
+
+        if features_df.empty:
+            return pd.DataFrame()
+
+        if compact:
+            features_df = self.compact_dataframe(features_df)
+        else:
+            features_df = self._add_dummies(features_df)
         
+        elapsed = time.perf_counter() - started
+        rate = len(df) / elapsed if elapsed > 0 else float('inf')
+        print(f"Успешно обработано {len(features_df)} из {len(df)} номеров ({rate:,.0f} строк/с)")
+        return features_df
+
+    def prepare_dataframe_stream(self, chunks: Iterable[pd.DataFrame], number_col: str = 'number',
+                                 price_col: str = 'price', compact: bool = False) -> pd.DataFrame:
+        """Подготовка признаков из потока порций (DataLoader.iter_chunks).
+
+        Каждая сырая порция сразу превращается в признаки и отпускается, так что
+        полная копия сырых данных в памяти не собирается. One-hot колонки
+        добавляются один раз в конце - набор категорий у порций может различаться.
+        С compact=True каждая порция сразу сжимается (compact_dataframe).
+        """
+        started = time.perf_counter()
+        parts: Dict[str, List[np.ndarray]] = {}
+        compact_parts = []
+        total = 0
+
+        for chunk in chunks:
+            total += len(chunk)
+            part = self._prepare_columnar(chunk, number_col, price_col)
+            if compact:
+                if not part.empty:
+                    compact_parts.append(self.compact_dataframe(part))
+            else:
+                for col in part.columns:
+                    parts.setdefault(col, []).append(part[col].to_numpy())
+            del part
+
+        if compact_parts:
+            features_df = pd.concat(compact_parts, ignore_index=True)
+            print(f"Успешно обработано {len(features_df)} из {total} номеров "
+                  f"({self.bytes_per_row(features_df):.0f} байт/строка)")
+            return features_df
+
+        if not parts:
+            return pd.DataFrame()
+
+        # Склеиваем по колонке, сразу отпуская порции: пик - итог плюс одна колонка
+        columns = {}
+        for col in list(parts):
+            columns[col] = np.concatenate(parts.pop(col))
+        features_df = self._add_dummies(pd.DataFrame(columns, copy=False))
+        del columns
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed > 0 else float('inf')
+        print(f"Успешно обработано {len(features_df)} из {total} номеров ({rate:,.0f} строк/с)")
+        return features_df
+
+    def compact_dataframe(self, features_df: pd.DataFrame, keep: Iterable[str] = ()) -> pd.DataFrame:
+        """Компактное представление для обучения.
+
+        Остаются только признаки модели (плюс price/log_price, weight и колонки keep):
+        числа - int8/int16/uint16, категории - pandas categorical с фиксированным
+        набором значений. Строковые колонки и one-hot не строятся вовсе.
+        """
+        category_values = {
+            'digit_category': ['premium', 'prestige', 'popular', 'standard'],
+            'digit_type': list(self.digit_categories) + ['regular'],
+            'region_group': ['moscow', 'spb', 'million', 'early', 'other'],
+        }
+
+        columns = {}
+        for col in MODEL_NUMERICAL_FEATURES:
+            if col in features_df.columns:
+                columns[col] = self._downcast(features_df[col].to_numpy(), COMPACT_DTYPES.get(col, np.int8))
+        for col in MODEL_CATEGORICAL_FEATURES:
+            if col in features_df.columns:
+                columns[col] = pd.Categorical(features_df[col], categories=category_values[col])
+        for col in ['price', 'log_price', 'weight', *keep]:
+            if col in features_df.columns:
+                columns[col] = features_df[col].to_numpy()
+
+        return pd.DataFrame(columns, index=features_df.index, copy=False)
+
+    @staticmethod
+    def _downcast(values: np.ndarray, dtype) -> np.ndarray:
+        """Приведение к узкому целому типу, если значения в него помещаются"""
+        if not len(values):
+            return values.astype(dtype)
+        info = np.iinfo(dtype)
+        if values.min() < info.min or values.max() > info.max:
+            return values
+        return values.astype(dtype)
+
+    def _add_dummies(self, features_df: pd.DataFrame) -> pd.DataFrame:
+        """Добавляем one-hot кодирование для категориальных признаков"""
+        categorical_cols = ['digit_category', 'region_group', 'prestige_category']
+        for col in categorical_cols:
+            if col in features_df.columns:
+                dummies = pd.get_dummies(features_df[col], prefix=col)
+                # Добавляем колонки на месте, без копии всей таблицы через concat
+                for dummy_col in dummies.columns:
+                    features_df[dummy_col] = dummies[dummy_col]
+        return features_df
+
+    @staticmethod
+    def bytes_per_row(features_df: pd.DataFrame) -> float:
+        """Память DataFrame на строку, включая python-строки в object-колонках"""
+        if not len(features_df):
+            return 0.0
+        return features_df.memory_usage(deep=True, index=False).sum() / len(features_df)
+
+    def _prepare_rowwise(self, df: pd.DataFrame, number_col: str, price_col: str) -> pd.DataFrame:
+        """Построчное извлечение признаков (исходный режим)"""
+        features_list = []
+
         for idx, row in df.iterrows():
             number = row[number_col]
             features = self.extract_features(number)
-            
+
             if features:
                 # Сохраняем исходную цену
                 if price_col in row:
                     features['price'] = float(row[price_col])
                     features['log_price'] = np.log1p(features['price'])
-                
+
                 features_list.append(features)
-        
+
         if not features_list:
             return pd.DataFrame()
-        
-        features_df = pd.DataFrame(features_list)
-        
-        # Добавляем one-hot кодирование для категориальных признаков
-        categorical_cols = ['digit_category', 'region_group', 'prestige_category']
-        for col in categorical_cols:
-            if col in features_df.columns:
-                dummies = pd.get_dummies(features_df[col], prefix=col)
-                features_df = pd.concat([features_df, dummies], axis=1)
-        
-        print(f"Успешно обработано {len(features_df)} из {len(df)} номеров")
+
+        return pd.DataFrame(features_list)
+
+    def _prepare_columnar(self, df: pd.DataFrame, number_col: str, price_col: str) -> pd.DataFrame:
+        """Колоночное извлечение признаков по всей колонке номеров"""
+        if df.empty:
+            return pd.DataFrame()
+
+        features_df = self.extract_features_batch(df[number_col].to_numpy(dtype=object))
+        rows = features_df.pop('_row').to_numpy()
+
+        # Сохраняем исходную цену
+        if price_col in df.columns:
+            prices = pd.Series(df[price_col].to_numpy(dtype=object)[rows]).astype(float).to_numpy()
+            features_df['price'] = prices
+            features_df['log_price'] = np.log1p(prices)
+        for col in HISTORY_FEATURES:
+            if col in df.columns:
+                features_df[col] = df[col].to_numpy(dtype=np.int64)[rows]
+        # Вес строки после схлопывания повторов (DataLoader, dedup_days)
+        if 'weight' in df.columns:
+            features_df['weight'] = df['weight'].to_numpy(dtype=np.float64)[rows]
+
         return features_df
     
     def analyze_number(self, number_str: str) -> Optional[Dict[str, Any]]:
@@ -555,6 +971,100 @@ class FeatureEngineer:
         return features
 
 
+class _ComponentTables:
+    """Плотные таблицы признаков по компонентам номера.
+
+    Каждый признак зависит только от цифр (1000 значений), серии
+    (12^3 = 1728 значений) или региона (100 двузначных + 1000 трехзначных кодов),
+    поэтому считаем их один раз эталонными методами FeatureEngineer.
+    """
+
+    def __init__(self, engineer: FeatureEngineer):
+        letters = sorted(engineer.allowed_letters, key=lambda c: engineer.letter_to_num[c])
+        visual_pairs = [(d, l) for d, ls in engineer.visual_analogies.items() for l in ls]
+        semantic_pairs = [(d, l) for d, ls in engineer.semantic_matches.items() for l in ls]
+        self.visual_pairs = len(visual_pairs)
+
+        # Код символа -> позиция буквы (0..11)
+        self.letter_index = np.zeros(max(ord(c) for c in letters) + 1, dtype=np.int64)
+        for letter in letters:
+            self.letter_index[ord(letter)] = engineer.letter_to_num[letter] - 1
+        self.letters = np.array(letters, dtype=object)
+        self.pair_keys = np.array([a + b for a in letters for b in letters], dtype=object)
+
+        # --- ЦИФРЫ: индекс = само число ---
+        digit_keys = [f'{d:03d}' for d in range(1000)]
+        digit_rows, digit_extra = [], []
+        for key in digit_keys:
+            base = {'digits_str': key, 'digits': int(key),
+                    'digit_1': int(key[0]), 'digit_2': int(key[1]), 'digit_3': int(key[2])}
+            features = dict(base)
+            engineer._extract_digit_features(features)
+            digit_rows.append({k: v for k, v in features.items() if k not in base})
+            digit_extra.append((self._mask(visual_pairs, key, 0), self._mask(semantic_pairs, key, 0),
+                                engineer._digit_score(features)))
+
+        # --- СЕРИИ: индекс = i1*144 + i2*12 + i3 ---
+        series_keys = [a + b + c for a in letters for b in letters for c in letters]
+        series_rows, series_extra = [], []
+        for key in series_keys:
+            base = {'full_series': key, 'first_letter': key[0], 'series': key[1:]}
+            features = dict(base)
+            engineer._extract_letter_features(features)
+            series_rows.append({k: v for k, v in features.items() if k not in base})
+            series_extra.append((self._mask(visual_pairs, key, 1), self._mask(semantic_pairs, key, 1),
+                                 engineer._letter_score(features)))
+
+        # --- РЕГИОНЫ: индекс = код для двузначных, 100 + код для трехзначных ---
+        region_keys = [f'{r:02d}' for r in range(100)] + [f'{r:03d}' for r in range(1000)]
+        region_rows, region_score = [], []
+        for key in region_keys:
+            base = {'region_str': key, 'region': int(key)}
+            features = dict(base)
+            engineer._extract_region_features(features)
+            region_rows.append({k: v for k, v in features.items() if k not in base})
+            region_score.append(engineer._region_score(features))
+
+        # Одиночный путь: словари строк и python-значения
+        self.digit_index = {key: i for i, key in enumerate(digit_keys)}
+        self.series_index = {key: i for i, key in enumerate(series_keys)}
+        self.region_index = {key: i for i, key in enumerate(region_keys)}
+        self.digit_rows, self.series_rows, self.region_rows = digit_rows, series_rows, region_rows
+        self.digit_extra, self.series_extra = digit_extra, series_extra
+        self.region_score = region_score
+
+        # Пакетный путь: колонки numpy
+        self.digit_keys = np.array(digit_keys, dtype=object)
+        self.series_keys = np.array(series_keys, dtype=object)
+        self.region_keys = np.array(region_keys, dtype=object)
+        self.digit_cols = self._columns(digit_rows)
+        self.series_cols = self._columns(series_rows)
+        self.region_cols = self._columns(region_rows)
+        self.digit_visual, self.digit_semantic, self.digit_score = (
+            np.array(col, dtype=np.int64) for col in zip(*digit_extra))
+        self.series_visual, self.series_semantic, self.series_score = (
+            np.array(col, dtype=np.int64) for col in zip(*series_extra))
+        self.region_score_array = np.array(region_score, dtype=np.int64)
+        self.digit_premium = self.digit_cols['digit_category'] == 'premium'
+
+    @staticmethod
+    def _mask(pairs: List[Tuple[str, str]], text: str, side: int) -> int:
+        """Битовая маска пар (цифры, буквы), чья сторона side входит в text"""
+        mask = 0
+        for bit, pair in enumerate(pairs):
+            if pair[side] in text:
+                mask |= 1 << bit
+        return mask
+
+    @staticmethod
+    def _columns(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        columns = {}
+        for name, value in rows[0].items():
+            dtype = object if isinstance(value, str) else np.int64
+            columns[name] = np.array([row[name] for row in rows], dtype=dtype)
+        return columns
+
+
 # Пример использования
 if __name__ == "__main__":
     feature_engineer = FeatureEngineer()
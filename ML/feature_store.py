@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from feature_extractor import (FeatureEngineer, HISTORY_DEFAULTS, HISTORY_FEATURES, MODEL_CATEGORICAL_FEATURES,
+                               MODEL_NUMERICAL_FEATURES)
+
+# Версия формата хранилища: при изменении старые сегменты пересобираются
+FEATURE_STORE_VERSION = 3
+
+# Служебные колонки сегмента (в обучающий DataFrame не попадают)
+KEY_COLUMNS = ['offer_id', 'number_id', 'posted_at', 'updated_at']
+
+
+class FeatureStore:
+    """Инкрементальное хранилище признаков на диске.
+
+    Данные лежат сегментами: каталог с колонками .npy (читаются через mmap)
+    и manifest.json с отметкой updated_at последней выгрузки. Каждое
+    обучение дописывает новый сегмент только из новых/измененных предложений;
+    при чтении для каждого offer_id берется строка из самого свежего сегмента.
+    """
+
+    def __init__(self, path: str = 'feature_store', feature_engineer: Optional[FeatureEngineer] = None,
+                 max_segments: int = 16):
+        self.path = path
+        self.feature_engineer = feature_engineer or FeatureEngineer()
+        self.max_segments = max_segments
+        self.manifest = self._read_manifest()
+
+    @property
+    def watermark(self) -> Optional[datetime]:
+        """updated_at, до которого предложения уже в хранилище"""
+        value = self.manifest.get('watermark')
+        return pd.Timestamp(value).to_pydatetime() if value else None
+
+    def update(self, chunks: Iterable[pd.DataFrame]) -> int:
+        """Извлечь признаки для порций DataLoader.iter_offer_chunks и дописать сегментом"""
+        started = time.perf_counter()
+        parts: Dict[str, List[np.ndarray]] = {}
+        watermark = self.watermark
+        total = 0
+
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            chunk_watermark = pd.Timestamp(chunk['updated_at'].max()).to_pydatetime()
+            watermark = chunk_watermark if watermark is None else max(watermark, chunk_watermark)
+
+            features = self.feature_engineer.extract_features_batch(chunk['number'].to_numpy(dtype=object))
+            rows = features.pop('_row').to_numpy()
+            if not len(rows):
+                continue
+
+            prices = chunk['price'].to_numpy(dtype=np.float64)[rows]
+            features['price'] = prices
+            features['log_price'] = np.log1p(prices)
+            features['offer_id'] = chunk['offer_id'].to_numpy(dtype=object)[rows]
+            features['number_id'] = chunk['number_id'].to_numpy(dtype=object)[rows]
+            features['posted_at'] = self._to_ns(chunk['posted_at'])[rows]
+            features['updated_at'] = self._to_ns(chunk['updated_at'])[rows]
+
+            for col in features.columns:
+                parts.setdefault(col, []).append(features[col].to_numpy())
+            total += len(rows)
+
+        if total:
+            self._write_segment({col: np.concatenate(values) for col, values in parts.items()})
+        if watermark is not None:
+            self.manifest['watermark'] = pd.Timestamp(watermark).isoformat()
+            self._write_manifest()
+
+        print(f"Хранилище признаков: +{total} строк за {time.perf_counter() - started:.1f} с, "
+              f"отметка {self.manifest.get('watermark')}")
+
+        if len(self.manifest['segments']) > self.max_segments:
+            self.compact()
+        return total
+
+    def load(self, days_back: Optional[int] = None, min_price: float = 1000,
+             max_price: float = 10000000, compact: bool = False,
+             history: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Обучающий DataFrame в формате FeatureEngineer.prepare_dataframe.
+
+        С compact=True читаются только признаки модели (FeatureEngineer.compact_dataframe).
+        history - признаки истории цен по number_id (DataLoader.load_price_history_features):
+        в сегментах их нет, они устаревают без изменения предложения и
+        подставляются при каждом чтении; номерам без истории - HISTORY_DEFAULTS.
+        """
+        feature_columns = self.manifest['columns']
+        if compact:
+            model_columns = set(MODEL_NUMERICAL_FEATURES + MODEL_CATEGORICAL_FEATURES)
+            feature_columns = [col for col in feature_columns if col in model_columns]
+        columns = self._read_latest(feature_columns)
+        if not columns:
+            return pd.DataFrame()
+
+        prices = columns['price']
+        mask = (prices > min_price) & (prices < max_price)
+        if days_back is not None:
+            since = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=days_back)
+            mask &= columns['posted_at'] >= since.value
+
+        features_df = pd.DataFrame(
+            {col: self._from_stored(columns[col][mask], self.manifest['dtypes'].get(col, 'float64'))
+             for col in feature_columns + ['price', 'log_price']},
+            copy=False
+        )
+        if history is not None:
+            positions = pd.Index(history['number_id']).get_indexer(columns['number_id'][mask].astype(object))
+            for col in HISTORY_FEATURES:
+                values = history[col].to_numpy(dtype=np.int64)
+                features_df[col] = np.where(positions >= 0, values[positions], HISTORY_DEFAULTS[col])
+        if compact:
+            features_df = self.feature_engineer.compact_dataframe(features_df)
+        else:
+            features_df = self.feature_engineer._add_dummies(features_df)
+
+        print(f"Из хранилища признаков: {len(features_df)} строк")
+        return features_df
+
+    def compact(self) -> None:
+        """Слить все сегменты в один, оставив последнюю версию каждого предложения"""
+        self._rewrite(self._read_latest())
+
+    def retain(self, offer_ids: Iterable[str]) -> int:
+        """Удалить предложения, которых больше нет в источнике.
+
+        offer_ids - полный список текущих id (DataLoader.load_offer_ids):
+        выгрузка по updated_at удалений не видит. Если удалять нечего,
+        сегменты не переписываются. Возвращает число удаленных строк.
+        """
+        columns = self._read_latest()
+        if not columns:
+            return 0
+        keep = np.isin(columns['offer_id'], np.asarray(list(offer_ids), dtype=str))
+        removed = int((~keep).sum())
+        if removed:
+            self._rewrite({col: values[keep] for col, values in columns.items()})
+            print(f"Из хранилища признаков удалено {removed} исчезнувших предложений")
+        return removed
+
+    def _rewrite(self, columns: Dict[str, np.ndarray]) -> None:
+        """Заменить все сегменты одним из columns (формат _read_latest)"""
+        old_segments = list(self.manifest['segments'])
+        self.manifest['segments'] = []
+        if columns and len(columns['offer_id']):
+            self._write_segment(columns, from_stored=True)
+        else:
+            self._write_manifest()
+
+        for segment in old_segments:
+            shutil.rmtree(os.path.join(self.path, segment), ignore_errors=True)
+        print(f"Хранилище признаков сжато: {len(old_segments)} сегментов -> {len(self.manifest['segments'])}")
+
+    def reset(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.manifest = self._empty_manifest()
+
+    def _read_latest(self, feature_columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Колонки всех сегментов с одной (последней) строкой на offer_id"""
+        segments = self.manifest['segments']
+        if not segments:
+            return {}
+
+        if feature_columns is None:
+            feature_columns = self.manifest['columns']
+        columns = {}
+        for col in feature_columns + ['price', 'log_price'] + KEY_COLUMNS:
+            arrays = [np.load(os.path.join(self.path, segment, f'{col}.npy'), mmap_mode='r')
+                      for segment in segments]
+            columns[col] = np.concatenate(arrays) if len(arrays) > 1 else np.asarray(arrays[0])
+
+        # Последний сегмент и последняя строка в нем - самая свежая версия
+        latest = ~pd.Series(columns['offer_id']).duplicated(keep='last').to_numpy()
+        if latest.all():
+            return columns
+        return {col: values[latest] for col, values in columns.items()}
+
+    def _write_segment(self, columns: Dict[str, np.ndarray], from_stored: bool = False) -> None:
+        if not from_stored:
+            feature_columns = [col for col in columns if col not in KEY_COLUMNS + ['price', 'log_price']]
+            if not self.manifest['columns']:
+                self.manifest['columns'] = feature_columns
+                self.manifest['dtypes'] = {col: 'object' if columns[col].dtype == object else str(columns[col].dtype)
+                                           for col in feature_columns}
+
+        name = f"segment_{self.manifest['next_segment']:06d}"
+        tmp_dir = os.path.join(self.path, f'.{name}.tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        for col, values in columns.items():
+            # Строки храним фиксированной ширины - такие массивы читаются через mmap
+            stored = np.asarray(values, dtype=str) if values.dtype == object else values
+            np.save(os.path.join(tmp_dir, f'{col}.npy'), stored)
+        os.replace(tmp_dir, os.path.join(self.path, name))
+
+        self.manifest['segments'].append(name)
+        self.manifest['next_segment'] += 1
+        self._write_manifest()
+
+    @staticmethod
+    def _from_stored(values: np.ndarray, dtype: str) -> np.ndarray:
+        if dtype == 'object':
+            return values.astype(object)
+        return np.array(values, dtype=dtype)
+
+    @staticmethod
+    def _to_ns(values: pd.Series) -> np.ndarray:
+        return pd.to_datetime(values, utc=True).to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+    def _fingerprint(self) -> str:
+        """Отпечаток справочников FeatureEngineer - при их изменении признаки устарели"""
+        engineer = self.feature_engineer
+        reference = {
+            name: sorted(map(str, value)) if isinstance(value, set) else value
+            for name, value in vars(engineer).items()
+            if not name.startswith('_')
+        }
+        payload = json.dumps(reference, sort_keys=True, default=lambda v: sorted(map(str, v)))
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def _empty_manifest(self) -> Dict[str, Any]:
+        return {
+            'version': FEATURE_STORE_VERSION,
+            'fingerprint': self._fingerprint(),
+            'watermark': None,
+            'columns': [],
+            'dtypes': {},
+            'segments': [],
+            'next_segment': 1,
+        }
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        manifest_path = os.path.join(self.path, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            return self._empty_manifest()
+
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+        if manifest.get('version') != FEATURE_STORE_VERSION or manifest.get('fingerprint') != self._fingerprint():
+            print("⚠️ Хранилище признаков устарело (изменились признаки) - будет пересобрано")
+            self.reset()
+            return self._empty_manifest()
+        return manifest
+
+    def _write_manifest(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        manifest_path = os.path.join(self.path, 'manifest.json')
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, manifest_path)
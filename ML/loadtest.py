@@ -0,0 +1,252 @@
+import argparse
+import contextlib
+import http.client
+import io
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from synthetic import generate_plates, train_synthetic_model
+
+# Границы корзин гистограммы латентности, мс
+HISTOGRAM_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+def zipf_plates(n_unique: int, n_requests: int, s: float = 1.1, seed: int = 42) -> List[str]:
+    """Поток запросов с перекосом: номер ранга k запрашивается с частотой ~ 1/k^s"""
+    rng = np.random.default_rng(seed)
+    plates = generate_plates(n_unique, seed=seed)
+    weights = 1.0 / np.arange(1, n_unique + 1) ** s
+    return [plates[i] for i in rng.choice(n_unique, size=n_requests, p=weights / weights.sum())]
+
+
+class ServiceProcess:
+    """main.app под uvicorn в отдельном процессе с рабочим каталогом workdir"""
+
+    def __init__(self, workdir: str, port: int, env: Optional[Dict[str, str]] = None):
+        self.workdir = workdir
+        self.port = port
+        self.env = {**os.environ, 'PYTHONPATH': os.path.dirname(os.path.abspath(__file__)), **(env or {})}
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1',
+             '--port', str(self.port), '--log-level', 'warning'],
+            cwd=self.workdir, env=self.env,
+            stdout=open(os.path.join(self.workdir, 'service.log'), 'w'), stderr=subprocess.STDOUT
+        )
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Сервис завершился при старте, см. {self.workdir}/service.log")
+            try:
+                request(self.port, 'GET', '/')
+                return self
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError("Сервис не ответил за 60 с")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+def request(port: int, method: str, path: str, body: Optional[dict] = None,
+            connection: Optional[http.client.HTTPConnection] = None):
+    """Один HTTP-запрос к сервису: (статус, JSON ответа)"""
+    conn = connection or http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    payload = json.dumps(body) if body is not None else None
+    conn.request(method, path, body=payload, headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    data = response.read()
+    if connection is None:
+        conn.close()
+    return response.status, json.loads(data) if data else None
+
+
+def run_load(port: int, plates: List[str], concurrency: int, rate: float,
+             on_progress=None) -> Dict[str, np.ndarray]:
+    """Прогнать plates через /api/predict.
+
+    rate > 0 - открытая модель нагрузки: i-й запрос запланирован на start + i/rate,
+    латентность считается от запланированного момента (очередь тоже в ней).
+    rate = 0 - закрытая модель: concurrency клиентов шлют запросы без пауз.
+    """
+    counter = itertools.count()
+    started_at = np.zeros(len(plates))
+    latencies = np.full(len(plates), np.nan)
+    statuses = np.zeros(len(plates), dtype=np.int16)
+    start = time.perf_counter() + 0.1
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        while True:
+            i = next(counter)
+            if i >= len(plates):
+                break
+            scheduled = start + i / rate if rate > 0 else time.perf_counter()
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            path = '/api/predict?' + urllib.parse.urlencode({'number': plates[i]})
+            try:
+                status, _ = request(port, 'GET', path, connection=conn)
+            except (OSError, http.client.HTTPException):
+                status = 0
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            started_at[i] = scheduled - start
+            latencies[i] = (time.perf_counter() - scheduled) * 1e3
+            statuses[i] = status
+            if on_progress is not None:
+                on_progress(i)
+        conn.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'start': start, 'started_at': started_at, 'latency_ms': latencies, 'status': statuses}
+
+
+def summarize(result: Dict[str, np.ndarray], mask: Optional[np.ndarray] = None) -> dict:
+    """Пропускная способность, перцентили и гистограмма латентности"""
+    if mask is None:
+        mask = np.ones(len(result['latency_ms']), dtype=bool)
+    latency = result['latency_ms'][mask]
+    started_at = result['started_at'][mask]
+    if not len(latency):
+        return {'requests': 0}
+
+    ok = result['status'][mask] == 200
+    # Время, занятое выборкой, с точностью 0.1 с (выборка может быть несплошной)
+    duration = len(np.unique((started_at * 10).astype(int))) / 10
+    counts, _ = np.histogram(latency, bins=[0] + HISTOGRAM_BUCKETS_MS + [np.inf])
+    return {
+        'requests': int(len(latency)),
+        'errors': int((~ok).sum()),
+        'throughput_rps': float(len(latency) / duration),
+        'p50_ms': float(np.percentile(latency, 50)),
+        'p90_ms': float(np.percentile(latency, 90)),
+        'p99_ms': float(np.percentile(latency, 99)),
+        'max_ms': float(latency.max()),
+        'histogram_ms': {f'<={bound}': int(count) for bound, count in zip(HISTOGRAM_BUCKETS_MS + ['inf'], counts)},
+    }
+
+
+def timeline(result: Dict[str, np.ndarray], window: float = 1.0) -> List[dict]:
+    """Запросы и p99 по окнам времени - видно провал во время переобучения"""
+    seconds = (result['started_at'] // window).astype(int)
+    return [{'second': int(second * window), 'requests': int((seconds == second).sum()),
+             'p99_ms': float(np.percentile(result['latency_ms'][seconds == second], 99))}
+            for second in np.unique(seconds)]
+
+
+class Retrain:
+    """Запуск /api/train на середине нагрузки и отслеживание задачи до конца"""
+
+    def __init__(self, port: int, at_request: int, days_back: int):
+        self.port = port
+        self.at_request = at_request
+        self.days_back = days_back
+        self.started = None
+        self.finished = None
+        self.job = None
+        self._started = threading.Event()
+        self._thread = None
+
+    def on_progress(self, i: int) -> None:
+        if i >= self.at_request and not self._started.is_set():
+            self._started.set()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: float) -> None:
+        """Дождаться конца обучения - сервис нельзя останавливать, пока задача опрашивается"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def window(self, load_start: float):
+        """Интервал обучения в секундах от начала нагрузки (если не закончилось - до конца нагрузки)"""
+        if self.started is None:
+            return None
+        return self.started - load_start, (self.finished or float('inf')) - load_start
+
+    def _run(self) -> None:
+        self.started = time.perf_counter()
+        status, body = request(self.port, 'POST', '/api/train', {'days_back': self.days_back})
+        if status != 200:
+            self.job = {'status': 'not_started', 'error': body}
+            return
+        while True:
+            time.sleep(0.5)
+            _, self.job = request(self.port, 'GET', f"/api/train/{body['job_id']}")
+            if self.job['status'] != 'running':
+                break
+        self.finished = time.perf_counter()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест /api/predict на локальном uvicorn")
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=500, help="запросов/с (0 - без ограничения)")
+    parser.add_argument('--unique-plates', type=int, default=5000)
+    parser.add_argument('--zipf', type=float, default=1.1, help="перекос популярности номеров")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--retrain', action='store_true', help="запустить переобучение на середине")
+    parser.add_argument('--retrain-rows', type=int, default=20000,
+                        help="синтетических объявлений в переобучении (0 - обучение из БД по DATABASE_*)")
+    parser.add_argument('--days-back', type=int, default=365)
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    with contextlib.redirect_stdout(io.StringIO()):
+        train_synthetic_model(model_path=os.path.join(workdir, 'models', 'price_catboost_model.cbm'))
+    plates = zipf_plates(args.unique_plates, args.requests, s=args.zipf)
+    print(f"Рабочий каталог {workdir}, {args.requests} запросов, {len(set(plates))} разных номеров")
+
+    # Без БД сервис переобучается на синтетике (trainer.train_synthetic)
+    with ServiceProcess(workdir, args.port, env={'TRAIN_SYNTHETIC_ROWS': str(args.retrain_rows)}):
+        retrain = Retrain(args.port, args.requests // 2, args.days_back) if args.retrain else None
+        result = run_load(args.port, plates, args.concurrency, args.rate,
+                          on_progress=retrain.on_progress if retrain else None)
+        _, cache = request(args.port, 'GET', '/api/predict/cache')
+        if retrain is not None:
+            retrain.wait(timeout=600)
+
+    report = {'config': vars(args), 'total': summarize(result), 'cache': cache, 'timeline': timeline(result)}
+    if retrain is not None:
+        report['retrain'] = retrain.job
+        window = retrain.window(result['start'])
+        if window is not None:
+            during = (result['started_at'] >= window[0]) & (result['started_at'] <= window[1])
+            report['during_retrain'] = summarize(result, during)
+            report['outside_retrain'] = summarize(result, ~during)
+
+    for name in ('total', 'outside_retrain', 'during_retrain'):
+        stats = report.get(name)
+        if stats and stats['requests']:
+            print(f"{name:>16}: {stats['requests']:>7} запросов, ошибок {stats['errors']}, "
+                  f"{stats['throughput_rps']:>8,.0f} rps, p50 {stats['p50_ms']:7.2f} мс, "
+                  f"p90 {stats['p90_ms']:7.2f} мс, p99 {stats['p99_ms']:8.2f} мс, max {stats['max_ms']:8.1f} мс")
+    print("Гистограмма, мс: " + ", ".join(f"{k}: {v}" for k, v in report['total']['histogram_ms'].items() if v))
+    print(f"Кэш: попаданий {cache['hits']}, промахов {cache['misses']}")
+    if retrain is not None:
+        print(f"Переобучение: {json.dumps(retrain.job, ensure_ascii=False)}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
@@ -1,24 +1,114 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
 import asyncio
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import json
 import os
 
-from data_loader import DataLoader
 from price_predictor import NumberPricePredictor
-from feature_extractor import FeatureEngineer
+from model_router import ModelRouter, REGION_GROUPS
+from feature_extractor import normalize_number
+from prediction_cache import PredictionCache
+from plate_search import PlateSearch
+from training_jobs import TrainingJobs
+from trainer import TrainerProcess, train_model, train_synthetic
+from metrics import (REGISTRY, MetricsMiddleware, MODEL_INFO, PREDICTION_CACHE,
+                     TRAINING_RUNS, TRAINING_STAGE_SECONDS)
 
 # Инициализация
 predictor = None
-is_training = False
+
+# Задачи обучения (прогресс и флаги отмены - файлы в этом каталоге)
+training_jobs = TrainingJobs(os.getenv('TRAINING_JOBS_PATH', 'training_jobs'))
+
+# Размер порции при потоковой загрузке обучающих данных
+TRAIN_CHUNK_SIZE = int(os.getenv('TRAIN_CHUNK_SIZE', '50000'))
+
+# Обучать на стольких синтетических объявлениях вместо БД (0 - из БД); для нагрузочного теста
+TRAIN_SYNTHETIC_ROWS = int(os.getenv('TRAIN_SYNTHETIC_ROWS', '0'))
+
+# Каталог инкрементального хранилища признаков
+FEATURE_STORE_PATH = os.getenv('FEATURE_STORE_PATH', 'feature_store')
+
+# Кэш предсказаний: размер и TTL (секунды, 0 - без TTL)
+prediction_cache = PredictionCache(
+    max_size=int(os.getenv('PREDICT_CACHE_SIZE', '10000')),
+    ttl=float(os.getenv('PREDICT_CACHE_TTL', '0'))
+)
+
+# Чем считать деревья модели: catboost или numpy (ObliviousTreeEngine)
+PREDICT_ENGINE = os.getenv('PREDICT_ENGINE', 'catboost')
+
+# Максимум номеров в одном пакетном запросе (ограничивает размер ответа)
+MAX_BATCH_SIZE = int(os.getenv('PREDICT_MAX_BATCH_SIZE', '10000'))
+
+# Максимум похожих объявлений в ответе /api/comparables
+MAX_COMPARABLES = int(os.getenv('MAX_COMPARABLES', '100'))
+
+# Поиск дорогих номеров: предел времени на запрос, секунды
+SEARCH_MAX_SECONDS = float(os.getenv('SEARCH_MAX_SECONDS', '10'))
+plate_searches = {}
+
+# Модели сегментов: каталог реестров (по одному на сегмент), ключ сегмента
+# (region_group или type) и бюджет памяти загруженных моделей, МБ
+SEGMENT_MODELS_PATH = os.getenv('SEGMENT_MODELS_PATH', 'models/segments')
+SEGMENT_KEY = os.getenv('SEGMENT_KEY', 'region_group')
+SEGMENT_MEMORY_BUDGET_MB = float(os.getenv('SEGMENT_MEMORY_BUDGET_MB', '1024'))
+router = None
 
 # Pydantic модели
 class TrainRequest(BaseModel):
     days_back: int = 365
+    # Брать признаки из хранилища (offers) и досчитывать только новые/измененные предложения;
+    # по умолчанию - полная загрузка car_numbers, как до появления хранилища
+    incremental: bool = False
+    # Окно схлопывания повторных объявлений одного номера, дней (только incremental=false)
+    dedup_days: Optional[int] = Field(None, ge=0)
+    # Обучить модель одной группы регионов вместо общей (SEGMENT_KEY=region_group)
+    segment: Optional[str] = None
+
+    @model_validator(mode='after')
+    def check_dedup_days(self):
+        # Хранилище признаков держит предложения, а не сырые объявления car_numbers - схлопывать нечего
+        if self.dedup_days is not None and self.incremental:
+            raise ValueError("dedup_days применяется только при полной загрузке (incremental=false)")
+        return self
+
+class BatchPredictRequest(BaseModel):
+    numbers: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+    # Тип ТС номеров пакета (для моделей сегментов с SEGMENT_KEY=type)
+    type: Optional[str] = None
+
+class SearchRequest(BaseModel):
+    # Шаблоны частей номера, '?' - любой символ
+    region: str
+    series: str = '???'
+    digits: str = '???'
+    top_n: int = Field(10, ge=1, le=1000)
+    time_budget: float = Field(1.0, gt=0, le=SEARCH_MAX_SECONDS)
+
+def init_predictor():
+    """Загружаем модель при старте"""
+    global predictor, router
+    router = ModelRouter(SEGMENT_MODELS_PATH, SEGMENT_KEY, SEGMENT_MEMORY_BUDGET_MB, engine=PREDICT_ENGINE)
+    predictor = NumberPricePredictor(engine=PREDICT_ENGINE)
+    try:
+        predictor.load_model()
+        print("✅ Модель загружена")
+    except:
+        print("⚠️ Модель не загружена")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Модель грузится при старте сервера, а не при импорте модуля
+    init_predictor()
+    yield
 
 # FastAPI приложение
-app = FastAPI(title="Car Number Price API", version="1.0")
+app = FastAPI(title="Car Number Price API", version="1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,92 +123,143 @@ app.add_middleware(
     allow_methods=["*"],  # Разрешить все методы
     allow_headers=["*"],  # Разрешить все заголовки
 )
+app.add_middleware(MetricsMiddleware)
 
-def init_predictor():
-    """Загружаем модель при старте"""
+trainer = TrainerProcess()
+
+async def swap_model(model_path: str, version: str):
+    """Загрузить версию модели в стороннем потоке и подменить ссылку на предиктор.
+
+    Запросы, уже взявшие старый предиктор, дорабатывают на нем; новые сразу
+    получают полностью загруженную модель.
+    """
     global predictor
-    predictor = NumberPricePredictor()
-    try:
-        predictor.load_model()
-        print("✅ Модель загружена")
-    except:
-        print("⚠️ Модель не загружена")
+    new_predictor = NumberPricePredictor(model_path=model_path, engine=PREDICT_ENGINE)
+    await asyncio.get_running_loop().run_in_executor(None, new_predictor.load_model, version)
+    predictor = new_predictor
 
-# Загружаем модель при импорте
-init_predictor()
+async def train_background(job_id: str, days_back: int, incremental: bool = False,
+                           dedup_days: Optional[int] = None, segment: Optional[str] = None):
+    """Запуск обучения в отдельном процессе и подмена модели готовым артефактом"""
+    executor = None
+    model_kwargs = {'model_path': router.model_path(segment), 'segment': segment} if segment is not None else {}
 
-def train_model_sync(days_back: int):
-    """Синхронное обучение модели"""
-    global is_training, predictor
-    
     try:
-        is_training = True
-        
-        # Конфигурация БД
-        db_config = {
-            'host': os.getenv('DATABASE_HOST', 'postgres'),
-            'database': os.getenv('DATABASE_NAME', 'postgres'),
-            'user': os.getenv('DATABASE_USER', 'postgres'),
-            'password': os.getenv('DATABASE_PASSWORD', 'postgres1'),
-            'port': os.getenv('DATABASE_PORT', '5432')
-        }
-        
-        # Загрузка данных
-        loader = DataLoader(db_config)
-        raw_data = loader.load_data(days_back=days_back)
-        loader.close()
-        
-        # Подготовка признаков
-        feature_engineer = FeatureEngineer()
-        processed_data = feature_engineer.prepare_dataframe(raw_data)
-        
-        # 3. Обучение модели
-        print("\nШаг 3: Обучение модели...")
-        predictor = NumberPricePredictor()
-        model = predictor.train(processed_data)
+        # Внутри try: если пул процессов не создался, задача все равно завершается и не блокирует обучение
+        executor = trainer.executor()
+        if TRAIN_SYNTHETIC_ROWS:
+            future = trainer.submit(executor, train_synthetic, TRAIN_SYNTHETIC_ROWS,
+                                    progress_path=training_jobs.progress_path(job_id))
+        else:
+            future = trainer.submit(
+                executor, train_model, days_back, incremental,
+                chunk_size=TRAIN_CHUNK_SIZE, feature_store_path=FEATURE_STORE_PATH,
+                progress_path=training_jobs.progress_path(job_id), dedup_days=dedup_days, **model_kwargs
+            )
+        result = await asyncio.wrap_future(future)
+        if not result['success']:
+            status = 'cancelled' if result.get('cancelled') else 'failed'
+            training_jobs.finish(job_id, status, result['error'])
+            return result
+
+        # Сервис только загружает готовую версию из реестра;
+        # модель сегмента загрузится роутером при следующем запросе
+        if segment is not None:
+            router.invalidate(segment)
+        else:
+            await swap_model(result['model_path'], result['model_version'])
+        training_jobs.finish(job_id, 'succeeded')
+        print(f"✅ Модель обновлена ({result['rows']} строк)")
+        return result
 
-        print("✅ Обучение завершено")
-        return {"success": True, "message": "Модель обучена"}
-        
     except Exception as e:
-        print(f"❌ Ошибка обучения: {e}")
+        print(f"❌ Ошибка процесса обучения: {e}")
+        training_jobs.finish(job_id, 'failed', str(e))
         return {"success": False, "error": str(e)}
     finally:
-        is_training = False
+        if executor is not None:
+            executor.shutdown(wait=False)
+        record_training_metrics(job_id)
 
-async def train_background(days_back: int):
-    """Запуск обучения в фоне"""
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, train_model_sync, days_back)
+def record_training_metrics(job_id: str):
+    """Итог обучения и длительности его этапов - в метрики"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        return
+    TRAINING_RUNS.labels(job['status']).inc()
+    TRAINING_STAGE_SECONDS.remove_all()
+    for stage, seconds in (job.get('stages') or {}).items():
+        TRAINING_STAGE_SECONDS.labels(stage).set(seconds)
 
 # Эндпоинты
 @app.post("/api/train")
 async def train(request: TrainRequest, background_tasks: BackgroundTasks):
     """Запуск обучения модели"""
-    global is_training
-    
-    if is_training:
+    if request.segment is not None and (SEGMENT_KEY != 'region_group' or request.segment not in REGION_GROUPS):
+        # Тип ТС в обучающих данных не хранится - обучаются только сегменты по группе региона
+        raise HTTPException(400, f"Обучение сегмента доступно только по группе региона: {', '.join(REGION_GROUPS)}")
+    if request.segment is not None and TRAIN_SYNTHETIC_ROWS:
+        raise HTTPException(400, "На синтетике обучается только общая модель")
+
+    job_id = training_jobs.start({"days_back": request.days_back, "incremental": request.incremental,
+                                  "dedup_days": request.dedup_days, "segment": request.segment})
+    if job_id is None:
         raise HTTPException(400, "Обучение уже выполняется")
     
     # Запускаем в фоне
-    background_tasks.add_task(train_background, request.days_back)
+    background_tasks.add_task(train_background, job_id, request.days_back, request.incremental,
+                              request.dedup_days, request.segment)
     
     return {
         "message": "Обучение запущено",
+        "job_id": job_id,
         "days_back": request.days_back,
+        "incremental": request.incremental,
+        "dedup_days": request.dedup_days,
+        "segment": request.segment,
         "status": "training"
     }
 
+@app.get("/api/train/{job_id}")
+async def train_status(job_id: str):
+    """Статус задачи обучения: этап, длительности этапов, строки, итерация, метрики"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Задача обучения не найдена")
+    return job
+
+@app.post("/api/train/{job_id}/cancel")
+async def train_cancel(job_id: str):
+    """Отмена задачи обучения"""
+    if training_jobs.get(job_id) is None:
+        raise HTTPException(404, "Задача обучения не найдена")
+    if not training_jobs.cancel(job_id):
+        raise HTTPException(400, "Задача обучения уже завершена")
+    return {"message": "Отмена запрошена", "job_id": job_id}
+
 @app.get("/api/predict")
-async def predict(number: str):
-    """Предсказание цены номера"""
+async def predict(number: str, type: Optional[str] = None):
+    """Предсказание цены номера (моделью его сегмента, если она есть)"""
     global predictor
     
     if predictor is None or predictor.model is None:
         raise HTTPException(503, "Модель не загружена")
     
     try:
-        result = predictor.predict_single(number_str=number, return_features=True)
+        number = normalize_number(number)
+        default = predictor
+        # Кэш один на все модели: версия - общая модель плюс поколение моделей сегментов
+        version = (default.model_version, router.generation)
+        key = (number, type.lower()) if router.segment_key == 'type' and type else number
+        result = prediction_cache.get(key, version)
+        if result is None:
+            # Модель сегмента при первом обращении грузится с диска - не в цикле событий
+            segment, model = await asyncio.get_running_loop().run_in_executor(
+                None, router.resolve, router.segment_of(number, type), default)
+            result = model.predict_single(number_str=number, return_features=True)
+            if result is not None:
+                result['segment'] = segment
+                prediction_cache.put(key, version, result)
         
         if result is None:
             raise HTTPException(400, "Некорректный номер")
@@ -128,12 +269,165 @@ async def predict(number: str):
             "predicted_price": result['predicted_price'],
             "confidence": result['confidence'],
             "price_range": result['price_range'],
+            # Сегмент модели, которая оценила номер (None - общая модель)
+            "segment": result['segment'],
             "all_features": result['all_features']
         }
         
     except Exception as e:
         raise HTTPException(500, f"Ошибка: {str(e)}")
 
+@app.post("/api/predict/batch")
+async def predict_batch(request: BatchPredictRequest):
+    """Пакетное предсказание цен номеров"""
+    global predictor
+    
+    if predictor is None or predictor.model is None:
+        raise HTTPException(503, "Модель не загружена")
+    
+    try:
+        # Те же модели сегментов, что и в /api/predict; загрузка модели - не в цикле событий
+        results = await asyncio.get_running_loop().run_in_executor(
+            None, router.predict_batch, request.numbers, predictor, request.type)
+    except Exception as e:
+        raise HTTPException(500, f"Ошибка: {str(e)}")
+
+    return {
+        "count": len(results),
+        "errors": sum(1 for item in results if 'error' in item),
+        "results": results
+    }
+
+@app.get("/api/comparables")
+async def comparables(number: str, k: int = Query(10, ge=1, le=MAX_COMPARABLES)):
+    """Самые похожие объявления из обучающей выборки и их цены"""
+    if predictor is None or predictor.model is None:
+        raise HTTPException(503, "Модель не загружена")
+
+    number = normalize_number(number)
+    segment, model = await asyncio.get_running_loop().run_in_executor(
+        None, router.resolve, router.segment_of(number), predictor)
+    try:
+        result = model.find_comparables(number, k)
+    except LookupError as e:
+        raise HTTPException(404, str(e))
+    if result is None:
+        raise HTTPException(400, "Некорректный номер")
+    return {**result, 'segment': segment}
+
+def get_plate_search(model: NumberPricePredictor) -> PlateSearch:
+    """Поиск по пространству номеров для указанной модели.
+
+    Поиски держатся только для общей модели и загруженных моделей сегментов:
+    после смены или вытеснения модели ее поиск выбрасывается.
+    """
+    global plate_searches
+    search = plate_searches.get(model)
+    if search is None:
+        search = PlateSearch(model)
+        live = [predictor, *router.loaded_models()]
+        plate_searches = {m: s for m, s in plate_searches.items() if any(m is x for x in live)}
+        plate_searches[model] = search
+    return search
+
+def route_regions(region_idx, default: NumberPricePredictor):
+    """(сегмент, модель) для набора регионов: модель сегмента, если все регионы в одном сегменте"""
+    return router.resolve(router.segment_of_regions(region_idx), default)
+
+def run_search(default: NumberPricePredictor, request: SearchRequest):
+    segment, model = route_regions(get_plate_search(default).match_regions(request.region), default)
+    result = get_plate_search(model).search(request.region, request.series, request.digits,
+                                            top_n=request.top_n, time_budget=request.time_budget)
+    return {**result, 'segment': segment}
+
+def run_price_pattern(default: NumberPricePredictor, pattern: str, limit: Optional[int]):
+    segment, model = route_regions(get_plate_search(default).expand_pattern(pattern)[2], default)
+    return (segment, *get_plate_search(model).price_pattern(pattern, limit=limit))
+
+@app.post("/api/search")
+async def search(request: SearchRequest):
+    """Самые дорогие номера под шаблоны региона, серии и цифр"""
+    if predictor is None or predictor.model is None:
+        raise HTTPException(503, "Модель не загружена")
+
+    # Поиск занимает до time_budget секунд - не держим цикл событий
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, run_search, predictor, request)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@app.get("/api/predict/pattern")
+async def predict_pattern(pattern: str, limit: Optional[int] = Query(None, ge=1)):
+    """Цены всех номеров под шаблон (например, А**7ММ77) потоком NDJSON"""
+    if predictor is None or predictor.model is None:
+        raise HTTPException(503, "Модель не загружена")
+
+    try:
+        segment, total, batches = await asyncio.get_running_loop().run_in_executor(
+            None, run_price_pattern, predictor, pattern, limit)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    def ndjson():
+        # Синхронный генератор StreamingResponse обходит в пуле потоков - цикл событий свободен
+        for batch in batches:
+            yield ''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in batch)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson",
+                             headers={"X-Total-Count": str(total), "X-Segment": segment or ''})
+
+@app.get("/api/predict/cache")
+async def predict_cache_stats():
+    """Статистика кэша предсказаний"""
+    return prediction_cache.stats()
+
+@app.get("/api/model")
+async def model_info():
+    """Текущая версия модели и версии в реестре"""
+    if predictor is None:
+        raise HTTPException(503, "Модель не загружена")
+
+    return {
+        "current": predictor.model_version if predictor is not None else None,
+        "versions": predictor.registry.versions(),
+        "segments": router.stats() if router is not None else None
+    }
+
+@app.post("/api/model/rollback")
+async def model_rollback():
+    """Откат на предыдущую версию модели"""
+    if training_jobs.active is not None:
+        raise HTTPException(400, "Обучение уже выполняется")
+
+    if predictor is None:
+        raise HTTPException(503, "Модель не загружена")
+
+    try:
+        version = predictor.registry.rollback_target()
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    # Реестр переключается только после того, как версия загрузилась
+    try:
+        await swap_model(predictor.model_path, version)
+    except Exception as e:
+        raise HTTPException(500, f"Не удалось загрузить версию {version}: {e}")
+    predictor.registry.rollback(version)
+
+    return {"message": "Модель откачена", "current": version}
+
+@app.get("/metrics")
+async def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    MODEL_INFO.remove_all()
+    if predictor is not None and predictor.model_version is not None:
+        MODEL_INFO.labels(predictor.model_version).set(1)
+    for stat, value in prediction_cache.stats().items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            PREDICTION_CACHE.labels(stat).set(value)
+
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 async def root():
     """Информация о сервисе"""
@@ -141,7 +435,16 @@ async def root():
         "service": "Car Number Price API",
         "endpoints": {
             "POST /api/train": "Обучение модели",
-            "GET /predict?number=": "Предсказание цены"
+            "GET /api/train/{job_id}": "Статус обучения",
+            "POST /api/train/{job_id}/cancel": "Отмена обучения",
+            "GET /predict?number=&type=": "Предсказание цены (модель сегмента или общая)",
+            "POST /api/predict/batch": f"Пакетное предсказание (до {MAX_BATCH_SIZE} номеров)",
+            "GET /api/predict/pattern?pattern=&limit=": "Цены номеров под шаблон потоком NDJSON",
+            "GET /api/comparables?number=&k=": "Похожие объявления из обучающей выборки",
+            "POST /api/search": "Самые дорогие номера под шаблоны региона, серии и цифр",
+            "GET /api/model": "Версии модели и загруженные модели сегментов",
+            "GET /metrics": "Метрики Prometheus",
+            "POST /api/model/rollback": "Откат на предыдущую версию модели"
         }
     }
 
@@ -0,0 +1,199 @@
+import abc
+import bisect
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+# Корзины латентности, секунды: от десятков микросекунд (этапы predict_single) до секунд
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class MetricsRegistry:
+    """Набор метрик и их вывод в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: List['_Metric'] = []
+
+    def register(self, metric: '_Metric') -> None:
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+class _Metric(abc.ABC):
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: MetricsRegistry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def labels(self, *values):
+        """Метрика с конкретными значениями меток; на горячем пути лучше получить ее заранее"""
+        child = self._children.get(values)
+        if child is None:
+            key = tuple(str(v) for v in values)
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def remove_all(self) -> None:
+        with self._lock:
+            self._children.clear()
+
+    def samples(self) -> List[str]:
+        if not self.labelnames:
+            return self._child_samples(self.labels(), '')
+        lines = []
+        for key, child in list(self._children.items()):
+            lines.extend(self._child_samples(child, _format_labels(self.labelnames, key)))
+        return lines
+
+    @abc.abstractmethod
+    def _new_child(self):
+        """Значение метрики для одного набора меток"""
+
+    @abc.abstractmethod
+    def _child_samples(self, child, labels: str) -> List[str]:
+        """Строки Prometheus для значения одного набора меток"""
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: счетчик и гистограмма времени HTTP-запросов по шаблону маршрута"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Шаблон маршрута, а не сырой путь - иначе метки растут с каждым номером/id
+            route = scope.get('route')
+            path = route.path if route is not None else 'unmatched'
+            HTTP_REQUEST_SECONDS.labels(path).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(scope['method'], path, str(status)).inc()
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _new_child(self):
+        return _Value()
+
+    def _child_samples(self, child, labels):
+        return [f'{self.name}{{{labels}}} {child.value:g}' if labels else f'{self.name} {child.value:g}']
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, registry: MetricsRegistry = REGISTRY):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def _child_samples(self, child, labels):
+        prefix = f'{labels},' if labels else ''
+        suffix = f'{{{labels}}}' if labels else ''
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else f'{bound:g}'
+            lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+        lines.append(f'{self.name}_sum{suffix} {total:g}')
+        lines.append(f'{self.name}_count{suffix} {cumulative}')
+        return lines
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+# Метрики сервиса
+HTTP_REQUESTS = Counter('ml_http_requests_total', 'HTTP-запросы по методу, маршруту и статусу',
+                        ['method', 'path', 'status'])
+HTTP_REQUEST_SECONDS = Histogram('ml_http_request_duration_seconds', 'Время обработки HTTP-запроса',
+                                 ['path'])
+PREDICT_STAGE_SECONDS = Histogram('ml_predict_stage_duration_seconds',
+                                  'Этапы predict_single: признаки, кодирование, CatBoost', ['stage'])
+MODEL_LOAD_SECONDS = Gauge('ml_model_load_duration_seconds', 'Время последней загрузки модели')
+MODEL_INFO = Gauge('ml_model_info', 'Загруженная версия модели', ['version'])
+TRAINING_RUNS = Counter('ml_training_runs_total', 'Завершенные обучения по статусу', ['status'])
+TRAINING_STAGE_SECONDS = Gauge('ml_training_stage_duration_seconds',
+                               'Длительность этапов последнего обучения', ['stage'])
+PREDICTION_CACHE = Gauge('ml_prediction_cache', 'Статистика кэша предсказаний', ['stat'])
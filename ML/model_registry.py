@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+# Файлы одной версии модели
+MODEL_FILE = 'price_catboost_model.cbm'
+LABEL_ENCODERS_FILE = 'price_label_encoders.pkl'
+FEATURE_ENGINEER_FILE = 'price_feature_engineer.pkl'
+USED_FEATURES_FILE = 'used_features.pkl'
+CATEGORIES_FILE = 'categories.json'
+META_FILE = 'meta.json'
+COMPARABLES_DIR = 'comparables'
+
+
+class ModelRegistry:
+    """Версионированное хранилище моделей.
+
+    Каждая версия - отдельный каталог versions/<id> со всеми артефактами.
+    Версия сначала пишется целиком во временный каталог и переносится на
+    место одним os.replace; затем так же атомарно подменяется registry.json
+    с указателем на текущую версию и историей активаций (для отката).
+    """
+
+    def __init__(self, root: str = 'models', keep_versions: int = 5):
+        self.root = root
+        self.keep_versions = keep_versions
+        self.versions_dir = os.path.join(root, 'versions')
+
+    @property
+    def current(self) -> Optional[str]:
+        """Текущая версия (None, если в реестре еще ничего нет)"""
+        return self._read_state()['current']
+
+    def path(self, version: str, filename: str = '') -> str:
+        return os.path.join(self.versions_dir, version, filename)
+
+    def stage(self) -> str:
+        """Временный каталог для записи новой версии"""
+        staging = os.path.join(self.versions_dir, f'.staging-{uuid.uuid4().hex}')
+        os.makedirs(staging)
+        return staging
+
+    def publish(self, staging: str, meta: Optional[Dict[str, Any]] = None) -> str:
+        """Сделать полностью записанный каталог staging новой текущей версией"""
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        with open(os.path.join(staging, META_FILE), 'w') as f:
+            json.dump({'version': version, 'created_at': time.time(), **(meta or {})}, f, indent=2)
+
+        os.replace(staging, self.path(version))
+        self.activate(version)
+        self.prune()
+        return version
+
+    def activate(self, version: str) -> None:
+        """Переключить указатель текущей версии"""
+        if not os.path.isdir(self.path(version)):
+            raise ValueError(f"Версия модели {version} не найдена")
+
+        state = self._read_state()
+        history = [v for v in state['history'] if v != version] + [version]
+        self._write_state({'current': version, 'history': history})
+
+    def rollback_target(self) -> str:
+        """Предыдущая активная версия - куда откатится rollback (реестр не меняется)"""
+        history = [v for v in self._read_state()['history'][:-1] if os.path.isdir(self.path(v))]
+        if not history:
+            raise ValueError("Нет предыдущей версии модели для отката")
+        return history[-1]
+
+    def rollback(self, version: Optional[str] = None) -> str:
+        """Вернуться к предыдущей активной версии (или к version из истории).
+
+        Сервис сначала загружает rollback_target() и только после успешной
+        загрузки вызывает rollback - иначе реестр и обслуживаемая модель
+        разойдутся.
+        """
+        version = version or self.rollback_target()
+        history = [v for v in self._read_state()['history'][:-1] if os.path.isdir(self.path(v))]
+        if version not in history:
+            raise ValueError(f"Версии {version} нет в истории активаций")
+
+        history = history[:history.index(version) + 1]
+        self._write_state({'current': version, 'history': history})
+        return version
+
+    def versions(self) -> List[Dict[str, Any]]:
+        """Версии в реестре, от новых к старым"""
+        if not os.path.isdir(self.versions_dir):
+            return []
+
+        result = []
+        for version in sorted(os.listdir(self.versions_dir), reverse=True):
+            if version.startswith('.'):
+                continue
+            try:
+                with open(self.path(version, META_FILE)) as f:
+                    result.append(json.load(f))
+            except FileNotFoundError:
+                result.append({'version': version})
+        # Id версии - время с точностью до секунды: версии одной секунды упорядочивает created_at
+        result.sort(key=lambda item: (item['version'][:15], item.get('created_at', 0)), reverse=True)
+        return result
+
+    def prune(self) -> None:
+        """Удалить старые версии, кроме последних keep_versions и версий из истории отката"""
+        state = self._read_state()
+        protected = set(state['history'][-2:])
+        for item in self.versions()[self.keep_versions:]:
+            if item['version'] not in protected:
+                shutil.rmtree(self.path(item['version']), ignore_errors=True)
+
+        # Недописанные версии упавших обучений
+        for name in os.listdir(self.versions_dir):
+            if name.startswith('.staging-') and time.time() - os.path.getmtime(os.path.join(self.versions_dir, name)) > 86400:
+                shutil.rmtree(os.path.join(self.versions_dir, name), ignore_errors=True)
+
+    def _read_state(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.root, 'registry.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'current': None, 'history': []}
+
+    def _write_state(self, state: Dict[str, Any]) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        state_path = os.path.join(self.root, 'registry.json')
+        tmp_path = f'{state_path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, state_path)
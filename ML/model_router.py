@@ -0,0 +1,198 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from feature_extractor import FeatureEngineer, normalize_number
+from model_registry import MODEL_FILE
+from price_predictor import NumberPricePredictor
+
+# Чем определяется сегмент: группа региона номера или тип ТС из запроса
+SEGMENT_KEYS = ('region_group', 'type')
+
+# Сегменты по группе региона (FeatureEngineer._extract_region_features)
+REGION_GROUPS = ['moscow', 'spb', 'million', 'early', 'other']
+
+PLATE_PATTERN = re.compile(r'[АВЕКМНОРСТУХ][0-9]{3}[АВЕКМНОРСТУХ]{2}([0-9]{2,3})')
+
+
+class ModelRouter:
+    """Модели сегментов перед общей моделью.
+
+    Модель сегмента - отдельный реестр (ModelRegistry) в каталоге
+    root/<сегмент>. Модели загружаются при первом запросе к сегменту и
+    держатся в LRU: когда суммарный размер загруженных версий превышает
+    memory_budget_mb, вытесняются давно не использованные. Номер без
+    модели своего сегмента предсказывается общей моделью.
+    """
+
+    def __init__(self, root: str = 'models/segments', segment_key: str = 'region_group',
+                 memory_budget_mb: float = 1024, engine: str = 'catboost'):
+        if segment_key not in SEGMENT_KEYS:
+            raise ValueError(f"Неизвестный ключ сегмента: {segment_key}")
+        self.root = root
+        self.segment_key = segment_key
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.engine = engine
+        # Меняется при переобучении модели сегмента - входит в версию кэша предсказаний
+        self.generation = 0
+
+        self._models: 'OrderedDict[str, NumberPricePredictor]' = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._available = self._scan()
+        self._region_tables = None
+
+        self.loads = 0
+        self.evictions = 0
+
+    def segment_of(self, number: str, vehicle_type: Optional[str] = None) -> Optional[str]:
+        """Сегмент нормализованного номера; None - сегмент не определен"""
+        if self.segment_key == 'type':
+            return vehicle_type.lower() if vehicle_type else None
+
+        match = PLATE_PATTERN.fullmatch(number)
+        if match is None:
+            return None
+        tables = self._get_region_tables()
+        return tables.region_rows[tables.region_index[match.group(1)]]['region_group']
+
+    def segment_of_regions(self, region_idx: Sequence[int]) -> Optional[str]:
+        """Общий сегмент регионов (индексы таблицы регионов FeatureEngineer); None - сегментов несколько"""
+        if self.segment_key != 'region_group':
+            return None
+        tables = self._get_region_tables()
+        segments = {tables.region_rows[i]['region_group'] for i in region_idx}
+        return segments.pop() if len(segments) == 1 else None
+
+    def route(self, number: str, vehicle_type: Optional[str] = None,
+              default: Optional[NumberPricePredictor] = None) -> Optional[NumberPricePredictor]:
+        """Предиктор для номера: модель его сегмента или default"""
+        return self.resolve(self.segment_of(number, vehicle_type), default)[1]
+
+    def resolve(self, segment: Optional[str],
+                default: Optional[NumberPricePredictor] = None) -> Tuple[Optional[str], Optional[NumberPricePredictor]]:
+        """(сегмент, модель) для сегмента; (None, default), если своей модели у сегмента нет"""
+        if segment is None or segment not in self._available:
+            return None, default
+        model = self.get(segment)
+        return (segment, model) if model is not None else (None, default)
+
+    def predict_batch(self, numbers: List[str], default: NumberPricePredictor, vehicle_type: Optional[str] = None,
+                      thread_count: int = -1) -> List[Dict[str, Any]]:
+        """Пакетное предсказание: номера группируются по сегментам, по вызову predict_batch на модель.
+
+        Как и в /api/predict, номера нормализуются (normalize_number) и номер
+        без модели своего сегмента оценивает default; в результатах без
+        ошибки 'segment' - сегмент ответившей модели (None - общая модель).
+        """
+        numbers = [normalize_number(number) for number in numbers]
+        groups: Dict[Optional[str], List[int]] = {}
+        for i, number in enumerate(numbers):
+            groups.setdefault(self.segment_of(number, vehicle_type), []).append(i)
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(numbers)
+        for segment, rows in groups.items():
+            segment, model = self.resolve(segment, default)
+            for row, result in zip(rows, model.predict_batch([numbers[i] for i in rows], thread_count=thread_count)):
+                if 'error' not in result:
+                    result['segment'] = segment
+                results[row] = result
+        return results
+
+    def get(self, segment: str) -> Optional[NumberPricePredictor]:
+        """Модель сегмента из LRU; загружается при первом обращении"""
+        with self._lock:
+            model = self._models.get(segment)
+            if model is not None:
+                self._models.move_to_end(segment)
+                return model
+            load_lock = self._load_locks.setdefault(segment, threading.Lock())
+
+        # Загрузка вне общей блокировки: запросы к другим сегментам не ждут
+        with load_lock:
+            while True:
+                with self._lock:
+                    model = self._models.get(segment)
+                    generation = self.generation
+                if model is not None:
+                    return model
+
+                model = NumberPricePredictor(model_path=self.model_path(segment), engine=self.engine)
+                try:
+                    model.load_model()
+                except (FileNotFoundError, ValueError) as e:
+                    print(f"⚠️ Модель сегмента {segment} не загружена: {e}")
+                    return None
+
+                with self._lock:
+                    # invalidate() во время загрузки: файл мог смениться - загруженная
+                    # модель устарела, в LRU ее не кладем и читаем файл заново
+                    if self.generation != generation:
+                        continue
+                    self._models[segment] = model
+                    self._sizes[segment] = self._model_size(model)
+                    self.loads += 1
+                    self._evict(keep=segment)
+                print(f"✅ Модель сегмента {segment} загружена (версия {model.model_version})")
+                return model
+
+    def loaded_models(self) -> List[NumberPricePredictor]:
+        with self._lock:
+            return list(self._models.values())
+
+    def model_path(self, segment: str) -> str:
+        return os.path.join(self.root, segment, MODEL_FILE)
+
+    def invalidate(self, segment: Optional[str] = None) -> None:
+        """Забыть загруженную модель сегмента (или все) и перечитать список сегментов"""
+        with self._lock:
+            for name in ([segment] if segment is not None else list(self._models)):
+                self._models.pop(name, None)
+                self._sizes.pop(name, None)
+            self._available = self._scan()
+            self.generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'segment_key': self.segment_key,
+                'available': sorted(self._available),
+                'loaded': {name: model.model_version for name, model in self._models.items()},
+                'memory_mb': round(sum(self._sizes.values()) / 1024 / 1024, 1),
+                'memory_budget_mb': round(self.memory_budget / 1024 / 1024, 1),
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+    def _get_region_tables(self):
+        if self._region_tables is None:
+            self._region_tables = FeatureEngineer()._get_component_tables()
+        return self._region_tables
+
+    def _evict(self, keep: str) -> None:
+        """Вытеснение давно не использованных моделей сверх бюджета памяти (под self._lock)"""
+        while sum(self._sizes.values()) > self.memory_budget and len(self._models) > 1:
+            name = next(iter(self._models))
+            if name == keep:
+                self._models.move_to_end(name)
+                continue
+            self._models.pop(name)
+            self._sizes.pop(name)
+            self.evictions += 1
+            print(f"♻️ Модель сегмента {name} вытеснена из памяти")
+
+    @staticmethod
+    def _model_size(model: NumberPricePredictor) -> int:
+        """Оценка памяти модели - размер файлов ее версии (индекс похожих читается через mmap)"""
+        model_dir = model._model_dir
+        return sum(entry.stat().st_size for entry in os.scandir(model_dir) if entry.is_file())
+
+    def _scan(self) -> set:
+        """Сегменты, у которых в реестре есть текущая версия"""
+        if not os.path.isdir(self.root):
+            return set()
+        return {name for name in os.listdir(self.root)
+                if os.path.exists(os.path.join(self.root, name, 'registry.json'))}
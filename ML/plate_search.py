@@ -0,0 +1,293 @@
+import itertools
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from feature_extractor import HISTORY_DEFAULTS, normalize_number
+from price_predictor import TREE_ENGINE_MAX_ROWS
+from tree_engine import ObliviousTreeEngine
+
+# Кандидатов за один вызов модели
+SEARCH_BATCH_ROWS = 8192
+
+# Номеров в одной пачке оценки по шаблону
+PATTERN_BATCH_ROWS = 4096
+
+# Символы позиций номера: буква, три цифры, две буквы, регион из 2-3 цифр
+PLATE_LETTERS = 'АВЕКМНОРСТУХ'
+PLATE_DIGITS = '0123456789'
+PATTERN_TOKEN = re.compile(r'\[[^\]]*\]|.')
+
+
+class PlateSearch:
+    """Поиск самых дорогих номеров по пространству компонентов.
+
+    Кандидаты - тройки индексов (цифры, серия, регион) таблиц компонентов
+    FeatureEngineer; признаки собираются из таблиц массивами, без строк номеров.
+    Группа кандидатов - один блок цифр в одном регионе со всеми подходящими
+    сериями. Для группы считается верхняя оценка цены по деревьям модели
+    (ObliviousTreeEngine.upper_bound на коробке min/max признаков группы),
+    группы перебираются от лучшей оценки, и перебор останавливается, когда
+    оценка следующей группы не выше N-й найденной цены или кончилось время.
+    """
+
+    def __init__(self, predictor):
+        self.predictor = predictor
+        self.engine = predictor.tree_engine or ObliviousTreeEngine.from_catboost(
+            predictor.model, predictor.categories)
+        self.engineer = predictor.feature_engineer
+        self.tables = self.engineer._get_component_tables()
+        _, category_codes = predictor._get_fast_path()
+
+        # Значения каждого признака модели по таблице своего компонента
+        tables = self.tables
+        digit_cols = {**tables.digit_cols, 'digits': np.arange(1000),
+                      'digit_1': np.arange(1000) // 100, 'digit_2': np.arange(1000) // 10 % 10,
+                      'digit_3': np.arange(1000) % 10}
+        region_idx = np.arange(len(tables.region_keys))
+        region_cols = {**tables.region_cols, 'region': np.where(region_idx >= 100, region_idx - 100, region_idx)}
+        interactions = self.engineer._interaction_columns(np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64),
+                                                          np.zeros(1, dtype=np.int64))
+
+        # (позиция, компонент, значения по индексу компонента, имя признака или константа)
+        self.sources = []
+        for position, col in enumerate(predictor.used_features):
+            for component, cols in (('digit', digit_cols), ('series', tables.series_cols), ('region', region_cols)):
+                if col in cols:
+                    values = cols[col]
+                    if col in category_codes:
+                        # Новые значения кодируем как первый класс, как в predict_single
+                        values = np.array([category_codes[col].get(v, 0) for v in values], dtype=np.int64)
+                    self.sources.append((position, component, values.astype(np.int64)))
+                    break
+            else:
+                if col in interactions:
+                    self.sources.append((position, 'interaction', col))
+                elif col in HISTORY_DEFAULTS:
+                    # Признаки истории цен - как у свежего объявления, как в predict_single
+                    self.sources.append((position, 'constant', HISTORY_DEFAULTS[col]))
+
+    def search(self, region: str, series: str = '???', digits: str = '???', top_n: int = 10,
+               time_budget: float = 1.0) -> Dict[str, Any]:
+        """Top-N номеров по предсказанной цене.
+
+        region, series, digits - шаблоны частей номера, '?' - любой символ
+        (например, region='77', series='А??', digits='?77').
+        """
+        started = time.perf_counter()
+        deadline = started + time_budget
+        digit_idx = self._match(digits, self.tables.digit_keys, r'[0-9?]{3}', 'цифр')
+        series_idx = self._match(normalize_number(series), self.tables.series_keys, r'[АВЕКМНОРСТУХ?]{3}', 'серии')
+        region_idx = self.match_regions(region)
+
+        best_log = np.empty(0)
+        best_keys = np.empty((0, 3), dtype=np.int64)
+        groups = evaluated = 0
+        exhaustive = True
+
+        # Оценки всех групп; регион за регионом, чтобы не держать сетку взаимодействий всех регионов.
+        # На оценки - не больше половины времени, остальное - на проверку лучших групп
+        bounds, group_digits, group_regions = [], [], []
+        for r in region_idx:
+            if time.perf_counter() > started + time_budget / 2:
+                exhaustive = False
+                break
+            interactions = self.engineer._interaction_columns(digit_idx[:, None], series_idx[None, :], r)
+            lower, upper = self._group_boxes(digit_idx, series_idx, r, interactions)
+            bounds.append(self.engine.upper_bound(lower, upper))
+            group_digits.append(digit_idx)
+            group_regions.append(np.full(len(digit_idx), r))
+
+        if bounds:
+            bounds = np.concatenate(bounds)
+            group_digits = np.concatenate(group_digits)
+            group_regions = np.concatenate(group_regions)
+        order = np.argsort(-np.asarray(bounds), kind='stable')
+        groups_per_batch = max(1, SEARCH_BATCH_ROWS // len(series_idx))
+
+        for start in range(0, len(order), groups_per_batch):
+            batch = order[start:start + groups_per_batch]
+            if len(best_log) >= top_n:
+                # Оценка группы не выше N-й найденной цены - ни один номер группы не войдет в top-N
+                batch = batch[bounds[batch] > best_log.min()]
+                if not len(batch):
+                    break
+            if time.perf_counter() > deadline:
+                exhaustive = False
+                break
+
+            keys = np.stack([
+                np.repeat(group_digits[batch], len(series_idx)),
+                np.tile(series_idx, len(batch)),
+                np.repeat(group_regions[batch], len(series_idx)),
+            ], axis=1)
+            log_price = self._predict_log(keys)
+            groups += len(batch)
+            evaluated += len(keys)
+
+            best_log = np.concatenate([best_log, log_price])
+            best_keys = np.concatenate([best_keys, keys])
+            if len(best_log) > top_n:
+                keep = np.argpartition(-best_log, top_n - 1)[:top_n]
+                best_log, best_keys = best_log[keep], best_keys[keep]
+
+        ranking = np.argsort(-best_log, kind='stable')
+        prestige = self.engineer._interaction_columns(best_keys[:, 0], best_keys[:, 1], best_keys[:, 2])['prestige_score']
+        results = []
+        for i in ranking:
+            prediction = np.expm1(best_log[i])
+            results.append({
+                'number': self._plate(*best_keys[i]),
+                'predicted_price': int(round(prediction, -2)),
+                'prestige_score': int(prestige[i]),
+            })
+
+        return {
+            'results': results,
+            'candidates': int(len(digit_idx) * len(series_idx) * len(region_idx)),
+            'evaluated': int(evaluated),
+            'groups_evaluated': int(groups),
+            'groups_total': int(len(order)),
+            # True - найденный top-N точный: непроверенные группы отсечены оценкой
+            'exhaustive': exhaustive,
+            'elapsed_sec': time.perf_counter() - started,
+        }
+
+    def _group_boxes(self, digit_idx: np.ndarray, series_idx: np.ndarray, region: int,
+                     interactions: Dict[str, np.ndarray]):
+        """Коробки признаков групп (блок цифр x все серии) одного региона"""
+        lower = np.zeros((len(digit_idx), len(self.predictor.used_features)), dtype=np.int64)
+        upper = np.zeros_like(lower)
+        for position, component, values in self.sources:
+            if component == 'digit':
+                lower[:, position] = upper[:, position] = values[digit_idx]
+            elif component == 'region':
+                lower[:, position] = upper[:, position] = values[region]
+            elif component == 'series':
+                lower[:, position] = values[series_idx].min()
+                upper[:, position] = values[series_idx].max()
+            elif component == 'constant':
+                lower[:, position] = upper[:, position] = values
+            else:
+                lower[:, position] = interactions[values].min(axis=1)
+                upper[:, position] = interactions[values].max(axis=1)
+        return lower, upper
+
+    def match_regions(self, region: str) -> np.ndarray:
+        """Индексы регионов (таблица регионов FeatureEngineer) под шаблон с '?'"""
+        return self._match(region, self.tables.region_keys, r'[0-9?]{2,3}', 'региона')
+
+    def price_pattern(self, pattern: str, limit: Optional[int] = None,
+                      batch_size: int = PATTERN_BATCH_ROWS) -> Tuple[int, Iterator[List[Dict[str, Any]]]]:
+        """Цены всех номеров под шаблон: (число номеров, генератор пачек результатов).
+
+        Шаблон - номер целиком, позиция за позицией: символ, '*', '?' или '.'
+        (любой допустимый символ позиции) или класс '[...]' как в регулярных
+        выражениях, например 'А**7ММ77' или 'А[0-3]00[АМ]А77'. Шаблон
+        проверяется сразу; номера перебираются лениво, по batch_size за раз.
+        """
+        digit_idx, series_idx, region_idx = self.expand_pattern(pattern)
+        total = len(digit_idx) * len(series_idx) * len(region_idx)
+        if limit is not None:
+            total = min(total, limit)
+        return total, self._price_batches(digit_idx, series_idx, region_idx, total, batch_size)
+
+    def expand_pattern(self, pattern: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Индексы цифр, серий и регионов, подходящих под шаблон номера"""
+        tokens = PATTERN_TOKEN.findall(normalize_number(pattern))
+        if len(tokens) not in (8, 9):
+            raise ValueError(f"Шаблон {pattern!r} не похож на номер: нужно 8 или 9 позиций")
+
+        positions = []
+        for i, token in enumerate(tokens):
+            allowed = PLATE_LETTERS if i in (0, 4, 5) else PLATE_DIGITS
+            if token in '*?.':
+                chars = allowed
+            elif token.startswith('['):
+                try:
+                    chars = ''.join(c for c in allowed if re.fullmatch(token, c))
+                except re.error:
+                    raise ValueError(f"Некорректный класс символов {token!r} в шаблоне")
+            else:
+                chars = token if token in allowed else ''
+            if not chars:
+                raise ValueError(f"Позиция {i + 1} шаблона ({token!r}) не допускает ни одного символа")
+            positions.append(chars)
+
+        def keys(chars: List[str], index: Dict[str, int]) -> np.ndarray:
+            return np.array([index[''.join(key)] for key in itertools.product(*chars)], dtype=np.int64)
+
+        return (keys(positions[1:4], self.tables.digit_index),
+                keys([positions[0], positions[4], positions[5]], self.tables.series_index),
+                keys(positions[6:], self.tables.region_index))
+
+    def _price_batches(self, digit_idx: np.ndarray, series_idx: np.ndarray, region_idx: np.ndarray,
+                       total: int, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        """Пачки результатов: кандидаты по порядку регион -> серия -> цифры, без списка всех номеров"""
+        tables = self.tables
+        for start in range(0, total, batch_size):
+            flat = np.arange(start, min(start + batch_size, total))
+            digits = digit_idx[flat % len(digit_idx)]
+            series = series_idx[flat // len(digit_idx) % len(series_idx)]
+            regions = region_idx[flat // (len(digit_idx) * len(series_idx))]
+
+            interactions = self.engineer._interaction_columns(digits, series, regions)
+            predictions = np.expm1(self._predict_log(np.column_stack([digits, series, regions]), interactions))
+            confidences = self.predictor._estimate_confidence_batch(pd.DataFrame({
+                'digit_category': tables.digit_cols['digit_category'][digits],
+                'is_vip_series': tables.series_cols['is_vip_series'][series],
+                'is_moscow': tables.region_cols['is_moscow'][regions],
+                'golden_number': interactions['golden_number'],
+                'prestige_score': interactions['prestige_score'],
+            }))
+
+            # Округление до сотен - массивами, в python-числа одним tolist()
+            prices, lows, highs = (np.round(values, -2).astype(np.int64).tolist()
+                                   for values in (predictions, predictions * 0.8, predictions * 1.2))
+            plates = [self._plate(d, s, r) for d, s, r in zip(digits.tolist(), series.tolist(), regions.tolist())]
+            yield [
+                {
+                    'number': plate,
+                    'predicted_price': price,
+                    'confidence': confidence,
+                    'price_range': {'low': low, 'high': high}
+                }
+                for plate, price, confidence, low, high in zip(plates, prices, confidences, lows, highs)
+            ]
+
+    def _predict_log(self, keys: np.ndarray, interactions: Optional[Dict[str, np.ndarray]] = None) -> np.ndarray:
+        """log-цена кандидатов (цифры, серия, регион) - строки модели прямо из таблиц компонентов"""
+        digit_idx, series_idx, region_idx = keys[:, 0], keys[:, 1], keys[:, 2]
+        if interactions is None:
+            interactions = self.engineer._interaction_columns(digit_idx, series_idx, region_idx)
+        # По колонкам (F-order): так быстрее и заполнять, и считать в CatBoost
+        rows = np.zeros((len(keys), len(self.predictor.used_features)), dtype=np.int64, order='F')
+        index = {'digit': digit_idx, 'series': series_idx, 'region': region_idx}
+        for position, component, values in self.sources:
+            if component == 'interaction':
+                rows[:, position] = interactions[values]
+            elif component == 'constant':
+                rows[:, position] = values
+            else:
+                rows[:, position] = values[index[component]]
+        if len(rows) > TREE_ENGINE_MAX_ROWS:
+            return self.predictor.model.predict(rows)
+        return self.engine.predict(rows)
+
+    def _plate(self, digit_idx: int, series_idx: int, region_idx: int) -> str:
+        series = self.tables.series_keys[series_idx]
+        return f"{series[0]}{self.tables.digit_keys[digit_idx]}{series[1:]}{self.tables.region_keys[region_idx]}"
+
+    @staticmethod
+    def _match(pattern: str, keys: np.ndarray, allowed: str, name: str) -> np.ndarray:
+        """Индексы ключей таблицы компонента, подходящих под шаблон с '?'"""
+        if not re.fullmatch(allowed, pattern):
+            raise ValueError(f"Некорректный шаблон {name}: {pattern!r}")
+        regex = re.compile(pattern.replace('?', '.'))
+        matched = np.array([i for i, key in enumerate(keys) if regex.fullmatch(key)], dtype=np.int64)
+        if not len(matched):
+            raise ValueError(f"Под шаблон {name} {pattern!r} не подходит ни одно значение")
+        return matched
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class PredictionCache:
+    """LRU-кэш предсказаний с опциональным TTL.
+
+    Ключ - (нормализованный номер, версия модели). При смене версии модели
+    кэш очищается целиком, поэтому старые цены не отдаются.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl if ttl else None
+        self._items: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._model_version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, number: str, model_version: Hashable) -> Optional[Any]:
+        with self._lock:
+            self._check_version(model_version)
+
+            item = self._items.get(number)
+            if item is None:
+                self.misses += 1
+                return None
+
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._items[number]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(number)
+            self.hits += 1
+            return value
+
+    def put(self, number: str, model_version: Hashable, value: Any) -> None:
+        with self._lock:
+            if self._model_version is None:
+                self._model_version = model_version
+            # Предсказание старой модели, посчитанное во время подмены, не кладем
+            if model_version != self._model_version:
+                return
+
+            expires_at = time.monotonic() + self.ttl if self.ttl else None
+            self._items[number] = (value, expires_at)
+            self._items.move_to_end(number)
+
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._items),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'model_version': self._model_version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+    def _check_version(self, model_version: Hashable) -> None:
+        if model_version == self._model_version:
+            return
+        if self._model_version is not None and self._items:
+            self.invalidations += 1
+        self._items.clear()
+        self._model_version = model_version
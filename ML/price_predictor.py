@@ -1,26 +1,50 @@
-from sklearn.calibration import LabelEncoder
-from sklearn.model_selection import train_test_split
-import CarNumberFeatureExtractor
-from feature_extractor import FeatureEngineer
+from feature_extractor import (FeatureEngineer, HISTORY_DEFAULTS, HISTORY_FEATURES, MODEL_CATEGORICAL_FEATURES,
+                               MODEL_NUMERICAL_FEATURES)
+from training_jobs import JobProgress
+from tree_engine import ObliviousTreeEngine
+from comparables import ComparablesIndex
+from metrics import MODEL_LOAD_SECONDS, PREDICT_STAGE_SECONDS
+from model_registry import (ModelRegistry, MODEL_FILE, LABEL_ENCODERS_FILE, FEATURE_ENGINEER_FILE,
+                            USED_FEATURES_FILE, CATEGORIES_FILE, COMPARABLES_DIR)
 import numpy as np
 import pandas as pd
 import joblib
+import json
+import os
+import threading
+import time
 
 from catboost import CatBoostRegressor, Pool
-from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
-import matplotlib.pyplot as plt
-import seaborn as sns
+
+# Таймеры этапов predict_single (метки фиксированы заранее - без поиска на горячем пути)
+EXTRACT_SECONDS = PREDICT_STAGE_SECONDS.labels('extract')
+ENCODE_SECONDS = PREDICT_STAGE_SECONDS.labels('encode')
+MODEL_SECONDS = PREDICT_STAGE_SECONDS.labels('model')
+
+# На пачках больше этого CatBoost уже быстрее numpy-движка
+TREE_ENGINE_MAX_ROWS = 100
 
 class NumberPricePredictor:
-    def __init__(self, model_path='models/price_catboost_model.cbm'):
+    def __init__(self, model_path='models/price_catboost_model.cbm', engine='catboost'):
         self.model_path = model_path
+        # 'numpy' - считать деревья модели через ObliviousTreeEngine вместо CatBoost
+        self.engine = engine
+        self.tree_engine = None
+        # Индекс похожих объявлений обучающей выборки (ComparablesIndex)
+        self.comparables = None
+        self.registry = ModelRegistry(os.path.dirname(model_path) or '.')
         self.model = None
         self.scaler = None
         self.label_encoders = {}
+        self.categories = {}
         self.feature_engineer = FeatureEngineer()
+        self._fast_path = None
+        self.model_version = None
         
     def prepare_features(self, features_df):
         """Подготовка признаков для обучения"""
+        # sklearn нужен только для обучения - не грузим его в сервис предсказаний
+        from sklearn.preprocessing import LabelEncoder
         
         # Копируем данные
         df = features_df.copy()
@@ -31,25 +55,13 @@ class NumberPricePredictor:
             df = df.drop(['price', 'log_price'], axis=1)
         else:
             y = None
+
+        # Веса строк после схлопывания повторных объявлений (DataLoader, dedup_days)
+        weight = df.pop('weight').to_numpy() if 'weight' in df.columns else None
         
         # Определяем типы признаков
-        categorical_features = ['digit_category', 'digit_type', 'region_group']
-        numerical_features = [
-            'digits', 'digit_1', 'digit_2', 'digit_3', 'digit_sum',
-            'is_single_digit', 'is_triple', 'is_mirror', 'is_sequence',
-            'is_round', 'has_7', 'has_0', 'has_0_middle',
-            'letter1_num', 'letter2_num', 'letter3_num',
-            'letter_diff_1_2', 'letter_diff_2_3',
-            'is_triple_letters', 'is_vip_series', 'is_mirror_series',
-            'is_beautiful_word', 'is_prestige_first_letter',
-            'is_same_last_two_letters', 'is_hot_series',
-            'region', 'is_moscow', 'is_spb', 'is_million_city', 'is_early_region',
-            'region_length', 'region_last_two', 'region_last_digit', 'region_first_digit',
-            'digit_region_exact_match', 'digit_region_last_two_match', 'digit_region_first_two_match',
-            'visual_match_score', 'semantic_match', 'full_pattern_match',
-            'golden_number', 'digit_letter_position_match',
-            'prestige_score_raw', 'prestige_score'
-        ]
+        categorical_features = MODEL_CATEGORICAL_FEATURES
+        numerical_features = MODEL_NUMERICAL_FEATURES
         
         # Убираем признаки, которых может не быть
         available_numerical = [col for col in numerical_features if col in df.columns]
@@ -60,9 +72,11 @@ class NumberPricePredictor:
             le = LabelEncoder()
             df[col] = le.fit_transform(df[col].astype(str))
             self.label_encoders[col] = le
+            self.categories[col] = le.classes_.tolist()
 
         # Отслеживаем, какие признаки использовались
         self.used_features = available_numerical + available_categorical
+        self._fast_path = None
         print(f"Используется {len(self.used_features)} признаков:")
         print(f"  - Категориальные: {len(available_categorical)}")
         print(f"  - Числовые: {len(available_numerical)}")
@@ -72,14 +86,22 @@ class NumberPricePredictor:
         
         # Создаем CatBoost Pool
         if y is not None:
-            pool = Pool(df, y, cat_features=available_categorical)
+            pool = Pool(df, y, cat_features=available_categorical, weight=weight)
         else:
-            pool = Pool(df, cat_features=available_categorical)
+            pool = Pool(df, cat_features=available_categorical, weight=weight)
         
         return df, y, pool
 
-    def train(self, df, test_size=0.2, random_state=42):
-        """Обучение модели"""
+    def train(self, df, test_size=0.2, random_state=42, thread_count=-1, progress=None):
+        """Обучение модели (thread_count - потоков CatBoost, -1 - все ядра).
+
+        progress (training_jobs.JobProgress) получает этапы, итерации и метрики
+        и может остановить обучение до сохранения модели.
+        """
+        from sklearn.model_selection import train_test_split
+
+        if progress is None:
+            progress = JobProgress()
         
         print("=" * 50)
         print("НАЧАЛО ОБУЧЕНИЯ МОДЕЛИ")
@@ -113,6 +135,7 @@ class NumberPricePredictor:
             'verbose': 100,
             'task_type': 'CPU',  # 'GPU' если есть видеокарта
             'border_count': 128,
+            'thread_count': thread_count,
             'cat_features': [col for col in X_train.columns 
                            if col in ['digit_category', 'digit_type', 'region_group', 'prestige_category']]
         }
@@ -120,22 +143,33 @@ class NumberPricePredictor:
         # Создание и обучение модели
         self.model = CatBoostRegressor(**model_params)
         
+        progress.fit_started(model_params['iterations'])
         self.model.fit(
             train_pool,
             eval_set=test_pool,
-            plot=False  # можно установить True для визуализации
+            plot=False,  # можно установить True для визуализации
+            callbacks=[progress]
         )
+        progress.check()
+        self.tree_engine = self._build_tree_engine(self.model, self.categories)
+        importance = dict(zip(self.used_features, self.model.get_feature_importance()))
+        self.comparables = ComparablesIndex.build(df, self.feature_engineer, importance)
+        print(f"Индекс похожих объявлений: {len(self.comparables)} строк")
         
         # Оценка модели
-        self.evaluate(X_test, y_test)
+        progress.stage('evaluate')
+        progress.set_metrics(self.evaluate(X_test, y_test))
         
         # Сохранение модели
+        progress.check()
+        progress.stage('save')
         self.save_model()
         
         return self.model
     
     def evaluate(self, X_test, y_test):
         """Оценка качества модели"""
+        from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
         
         predictions_log = self.model.predict(X_test)
         predictions = np.expm1(predictions_log)
@@ -154,42 +188,102 @@ class NumberPricePredictor:
         print(f"RMSE: {rmse:,.0f} руб.")
         print(f"Средняя цена в тесте: {actual.mean():,.0f} руб.")
         print(f"Медианная цена в тесте: {np.median(actual):,.0f} руб.")
+
+        self.metrics = {'mae': float(mae), 'mape': float(mape), 'rmse': float(rmse)}
+        return self.metrics
     
     
     def save_model(self):
-        """Сохранение модели и препроцессоров"""
-        import os
-        os.makedirs('models', exist_ok=True)
+        """Сохранение модели и препроцессоров новой версией в реестре"""
+        staging = self.registry.stage()
         
         # Сохраняем CatBoost модель
-        self.model.save_model(self.model_path)
+        self.model.save_model(os.path.join(staging, MODEL_FILE))
         
         # Сохраняем label encoders
-        joblib.dump(self.label_encoders, 'models/price_label_encoders.pkl')
+        joblib.dump(self.label_encoders, os.path.join(staging, LABEL_ENCODERS_FILE))
+        # Классы категорий отдельно в JSON - для предсказаний не нужно поднимать sklearn
+        with open(os.path.join(staging, CATEGORIES_FILE), 'w') as f:
+            json.dump(self.categories, f, ensure_ascii=False)
         
         # Сохраняем feature engineer
-        joblib.dump(self.feature_engineer, 'models/price_feature_engineer.pkl')
+        joblib.dump(self.feature_engineer, os.path.join(staging, FEATURE_ENGINEER_FILE))
         
         if hasattr(self, 'used_features'):
-            joblib.dump(self.used_features, 'models/used_features.pkl')
+            joblib.dump(self.used_features, os.path.join(staging, USED_FEATURES_FILE))
         else:
             # Сохраняем пустой список как fallback
-            joblib.dump([], 'models/used_features.pkl')
-        print(f"\nМодель сохранена в {self.model_path}")
+            joblib.dump([], os.path.join(staging, USED_FEATURES_FILE))
+
+        if self.comparables is not None:
+            self.comparables.save(os.path.join(staging, COMPARABLES_DIR))
+
+        # Версия становится текущей только после записи всех файлов
+        self.model_version = self.registry.publish(staging, {'metrics': getattr(self, 'metrics', None)})
+        print(f"\nМодель сохранена: версия {self.model_version}")
     
-    def load_model(self):
-        """Загрузка модели"""
-        self.model = CatBoostRegressor()
-        self.model.load_model(self.model_path)
-        self.label_encoders = joblib.load('models/price_label_encoders.pkl')
-        self.feature_engineer = joblib.load('models/price_feature_engineer.pkl')
+    def load_model(self, version=None):
+        """Загрузка модели: указанной версии, текущей версии реестра или из старых фиксированных путей"""
+        started = time.perf_counter()
+        version = version or self.registry.current
+        if version is not None:
+            model_dir = self.registry.path(version)
+            model_file = os.path.join(model_dir, MODEL_FILE)
+        else:
+            # Модели, сохраненные до появления реестра
+            model_dir = self.registry.root
+            model_file = self.model_path
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(f"Модель не найдена: {model_file}")
+
+        model = CatBoostRegressor()
+        model.load_model(model_file)
+        categories_file = os.path.join(model_dir, CATEGORIES_FILE)
+        if os.path.exists(categories_file):
+            with open(categories_file) as f:
+                categories = json.load(f)
+            label_encoders = None  # загрузятся по требованию (_get_label_encoders)
+        else:
+            # Модели без categories.json - классы берем из кодировщиков
+            label_encoders = joblib.load(os.path.join(model_dir, LABEL_ENCODERS_FILE))
+            categories = {col: le.classes_.tolist() for col, le in label_encoders.items()}
+        feature_engineer = joblib.load(os.path.join(model_dir, FEATURE_ENGINEER_FILE))
 
         try:
-            self.used_features = joblib.load('models/used_features.pkl')
+            used_features = joblib.load(os.path.join(model_dir, USED_FEATURES_FILE))
         except FileNotFoundError:
             print("Предупреждение: файл used_features.pkl не найден. Создаю пустой список признаков.")
-            self.used_features = []
-        print("Модель загружена")
+            used_features = []
+
+        tree_engine = self._build_tree_engine(model, categories)
+
+        self.model = model
+        self.tree_engine = tree_engine
+        self.comparables = None  # загрузится по требованию (_get_comparables)
+        self.categories = categories
+        self.label_encoders = label_encoders
+        self._model_dir = model_dir
+        self.feature_engineer = feature_engineer
+        self.used_features = used_features
+        self._fast_path = None
+        self.model_version = version or self._file_version()
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - started)
+        print(f"Модель загружена (версия {self.model_version})")
+
+    def _build_tree_engine(self, model, categories):
+        """numpy-движок деревьев, если он включен и поддерживает модель"""
+        if self.engine != 'numpy':
+            return None
+        try:
+            return ObliviousTreeEngine.from_catboost(model, categories)
+        except ValueError as e:
+            print(f"⚠️ numpy-движок недоступен, предсказываем через CatBoost: {e}")
+            return None
+
+    def _file_version(self):
+        """Версия модели по файлу: время изменения и размер"""
+        stat = os.stat(self.model_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
     
     def predict_single(self, number_str, return_features=False):
         """Предсказание для одного номера"""
@@ -197,40 +291,19 @@ class NumberPricePredictor:
             self.load_model()
         
         # Извлекаем признаки
+        started = time.perf_counter()
         features = self.feature_engineer.extract_features(number_str)
+        extracted = time.perf_counter()
+        EXTRACT_SECONDS.observe(extracted - started)
         if features is None:
             return None
         
-        # Преобразуем в DataFrame
-        features_df = pd.DataFrame([features])
-        
-        # Подготовка признаков для предсказания
-        df_processed = features_df.copy()
-        
-        # Кодируем категориальные признаки
-        for col in self.label_encoders:
-            if col in df_processed.columns:
-                le = self.label_encoders[col]
-                try:
-                    df_processed[col] = le.transform([features[col]])[0]
-                except ValueError:
-                    # Если новое значение, используем most_frequent класс
-                    df_processed[col] = le.transform([le.classes_[0]])[0]
-        
-        # Оставляем только признаки, использованные при обучении
-        available_features = [col for col in self.used_features if col in df_processed.columns]
-        missing_features = set(self.used_features) - set(available_features)
-        
-        if missing_features:
-            print(f"Предупреждение: отсутствуют признаки: {missing_features}")
-            for feature in missing_features:
-                df_processed[feature] = 0
-        
-        df_processed = df_processed[self.used_features]
-
-        
         # Предсказание
-        prediction_log = self.model.predict(df_processed)[0]
+        row = self._encode_row(features)
+        encoded = time.perf_counter()
+        prediction_log = self._predict_row(row)
+        ENCODE_SECONDS.observe(encoded - extracted)
+        MODEL_SECONDS.observe(time.perf_counter() - encoded)
         prediction = np.expm1(prediction_log)
         
         # Оценка уверенности
@@ -262,6 +335,195 @@ class NumberPricePredictor:
         return result
         
         
+    def _predict_log(self, features):
+        """Предсказание log-цены без pandas: строка признаков сразу в numpy"""
+        return self._predict_row(self._encode_row(features))
+
+    def _predict_row(self, row):
+        """log-цена одной закодированной строки"""
+        if self.tree_engine is not None:
+            return self.tree_engine.predict(row)[0]
+        return self.model.predict(row)
+
+    def _encode_row(self, features):
+        """Строка признаков модели (int64) с закодированными категориями"""
+        slots, category_codes = self._get_fast_path()
+
+        # Своя предвыделенная строка на поток - predict_single зовут и из executor'а
+        local = self._fast_path_local
+        row = getattr(local, 'row', None)
+        if row is None or len(row) != len(slots):
+            # Позиции признаков, которых нет в номере, не перезаписываются - в них остаются значения по умолчанию
+            row = local.row = self._fast_path_defaults.copy()
+
+        for position, col, codes in slots:
+            if codes is not None:
+                # Если новое значение, используем первый класс (код 0)
+                row[position] = codes.get(features[col], 0)
+            elif col is not None:
+                row[position] = features[col]
+
+        return row
+
+    def _predict_log_dataframe(self, features):
+        """Предсказание log-цены через DataFrame (исходный путь, для сверки и замеров)"""
+        # Преобразуем в DataFrame
+        features_df = pd.DataFrame([features])
+        
+        # Подготовка признаков для предсказания
+        df_processed = features_df.copy()
+        
+        # Кодируем категориальные признаки
+        label_encoders = self._get_label_encoders()
+        for col in label_encoders:
+            if col in df_processed.columns:
+                le = label_encoders[col]
+                try:
+                    df_processed[col] = le.transform([features[col]])[0]
+                except ValueError:
+                    # Если новое значение, используем most_frequent класс
+                    df_processed[col] = le.transform([le.classes_[0]])[0]
+        
+        # Оставляем только признаки, использованные при обучении
+        available_features = [col for col in self.used_features if col in df_processed.columns]
+        missing_features = set(self.used_features) - set(available_features)
+        
+        if missing_features - set(HISTORY_FEATURES):
+            print(f"Предупреждение: отсутствуют признаки: {missing_features - set(HISTORY_FEATURES)}")
+        for feature in missing_features:
+            df_processed[feature] = HISTORY_DEFAULTS.get(feature, 0)
+        
+        df_processed = df_processed[self.used_features]
+
+        return self.model.predict(df_processed)[0]
+
+    def _get_label_encoders(self):
+        """Кодировщики sklearn: после load_model читаются с диска только при первом обращении"""
+        if self.label_encoders is None:
+            self.label_encoders = joblib.load(os.path.join(self._model_dir, LABEL_ENCODERS_FILE))
+        return self.label_encoders
+
+    def _get_comparables(self):
+        """Индекс похожих объявлений версии модели (None, если модель обучена без него)"""
+        if self.comparables is None:
+            index_dir = os.path.join(self._model_dir, COMPARABLES_DIR)
+            if os.path.isdir(index_dir):
+                self.comparables = ComparablesIndex.load(index_dir)
+        return self.comparables
+
+    def find_comparables(self, number_str, k=10):
+        """k самых похожих объявлений из обучающей выборки.
+
+        None - некорректный номер; LookupError - у модели нет индекса.
+        """
+        if self.model is None:
+            self.load_model()
+
+        features = self.feature_engineer.extract_features(number_str)
+        if features is None:
+            return None
+
+        index = self._get_comparables()
+        if index is None:
+            raise LookupError(f"Индекс похожих объявлений не построен для модели {self.model_version}")
+        return {'number': number_str, **index.query(features, k)}
+
+    def _get_fast_path(self):
+        """Раскладка признаков по позициям used_features и словари кодов категорий.
+
+        Строится один раз после загрузки/обучения модели. Все признаки
+        FeatureEngineer целочисленные, поэтому строка модели - int64.
+        """
+        if getattr(self, '_fast_path', None) is None:
+            category_codes = {
+                col: {cls: code for code, cls in enumerate(classes)}
+                for col, classes in self.categories.items()
+            }
+
+            # Какие признаки вообще выдает FeatureEngineer - по эталонному номеру
+            known = self.feature_engineer.extract_features('А001АА77') or {}
+            # Признаки истории цен при предсказании берутся из HISTORY_DEFAULTS
+            missing = [col for col in self.used_features if col not in known and col not in HISTORY_FEATURES]
+            if missing:
+                print(f"Предупреждение: отсутствуют признаки: {set(missing)}")
+
+            slots = [
+                (position, col if col in known else None, category_codes.get(col))
+                for position, col in enumerate(self.used_features)
+            ]
+            self._fast_path_defaults = np.array([HISTORY_DEFAULTS.get(col, 0) for col in self.used_features],
+                                                dtype=np.int64)
+            self._fast_path_local = threading.local()
+            self._fast_path = (slots, category_codes)
+
+        return self._fast_path
+
+    def predict_batch(self, numbers, thread_count=-1):
+        """Пакетное предсказание: один вызов модели на весь список номеров.
+
+        Возвращает список результатов в порядке входа; для некорректных
+        номеров элемент содержит только 'number' и 'error'. thread_count -
+        потоки CatBoost (-1 - все ядра).
+        """
+        if self.model is None:
+            self.load_model()
+
+        results = [{'number': number, 'error': 'Некорректный номер'} for number in numbers]
+
+        features_df = self.feature_engineer.extract_features_batch(numbers)
+        if features_df.empty:
+            return results
+
+        rows = features_df['_row'].to_numpy()
+        encoded = self._encode_features(features_df)
+        if self.tree_engine is not None and len(encoded) <= TREE_ENGINE_MAX_ROWS:
+            predictions_log = self.tree_engine.predict(encoded.to_numpy(np.int64))
+        else:
+            predictions_log = self.model.predict(encoded, thread_count=thread_count)
+        predictions = np.expm1(predictions_log)
+        confidences = self._estimate_confidence_batch(features_df)
+
+        for row, prediction, confidence in zip(rows, predictions, confidences):
+            results[row] = {
+                'number': numbers[row],
+                'predicted_price': int(round(prediction, -2)),
+                'confidence': confidence,
+                'price_range': {
+                    'low': int(round(prediction * 0.8, -2)),
+                    'high': int(round(prediction * 1.2, -2))
+                }
+            }
+
+        return results
+
+    def _encode_features(self, features_df):
+        """Кодирование категориальных признаков и порядок колонок как при обучении"""
+        _, category_codes = self._get_fast_path()
+        df_processed = pd.DataFrame(index=features_df.index)
+
+        for col in self.used_features:
+            if col not in features_df.columns:
+                df_processed[col] = HISTORY_DEFAULTS.get(col, 0)
+            elif col in category_codes:
+                # Новые значения кодируем как первый класс, как в predict_single
+                df_processed[col] = features_df[col].map(category_codes[col]).fillna(0).astype(np.int64)
+            else:
+                df_processed[col] = features_df[col]
+
+        return df_processed
+
+    def _estimate_confidence_batch(self, features_df):
+        """Векторная версия _estimate_confidence"""
+        confidence = np.full(len(features_df), 0.7)
+
+        confidence += np.where(features_df['digit_category'].isin(['premium', 'prestige']), 0.1, 0)
+        confidence += np.where(features_df['is_vip_series'] > 0, 0.05, 0)
+        confidence += np.where(features_df['is_moscow'] > 0, 0.05, 0)
+        confidence += np.where(features_df['golden_number'] > 0, 0.1, 0)
+        confidence += np.where(features_df['prestige_score'] > 70, 0.1, 0)
+
+        return [float(value) for value in np.minimum(confidence, 0.95)]
+
     def _estimate_confidence(self, features):
         """Оценка уверенности предсказания на основе признаков"""
         confidence = 0.7  # базовая уверенность
@@ -0,0 +1,164 @@
+import argparse
+import io
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from data_loader import DataLoader
+from price_predictor import NumberPricePredictor
+from trainer import db_config_from_env
+
+# Предложений в одной порции: одно предсказание и одна запись в БД
+REPRICE_CHUNK_ROWS = 50000
+
+STAGE_COLUMNS = ['offer_id', 'model_version', 'fair_price', 'price_low', 'price_high', 'confidence', 'offer_price']
+
+UPSERT_QUERY = f"""
+INSERT INTO offer_fair_prices ({', '.join(STAGE_COLUMNS)})
+SELECT {', '.join(STAGE_COLUMNS)} FROM offer_fair_prices_stage
+ON CONFLICT (offer_id) DO UPDATE SET
+    model_version = EXCLUDED.model_version,
+    fair_price    = EXCLUDED.fair_price,
+    price_low     = EXCLUDED.price_low,
+    price_high    = EXCLUDED.price_high,
+    confidence    = EXCLUDED.confidence,
+    offer_price   = EXCLUDED.offer_price,
+    updated_at    = CURRENT_TIMESTAMP
+"""
+
+# Предложения, снятые с продажи с прошлого запуска, - их цена больше не нужна
+DELETE_INACTIVE_QUERY = """
+DELETE FROM offer_fair_prices fp
+USING offers o
+WHERE fp.offer_id = o.id
+AND o.status <> 'active'
+"""
+
+
+class FairPriceJob:
+    """Пересчет справедливой цены активных предложений в offer_fair_prices.
+
+    Предложения читаются серверным курсором по возрастанию updated_at, с
+    отметки прошлого запуска (файл state_path). Каждая порция оценивается
+    одним predict_batch, копируется через COPY во временную таблицу и
+    переносится одним upsert; после коммита порции сдвигается отметка.
+    Смена версии модели сбрасывает отметку - пересчитываются все предложения.
+    """
+
+    def __init__(self, predictor: NumberPricePredictor, db_config: Optional[Dict[str, Any]] = None,
+                 state_path: str = 'reprice_state.json', chunk_size: int = REPRICE_CHUNK_ROWS):
+        self.predictor = predictor
+        self.db_config = db_config or db_config_from_env()
+        self.state_path = state_path
+        self.chunk_size = chunk_size
+
+    def run(self) -> Dict[str, Any]:
+        if self.predictor.model is None:
+            self.predictor.load_model()
+        version = self.predictor.model_version
+        state = self._read_state()
+        since = state['watermark'] if state.get('model_version') == version else None
+
+        started = time.perf_counter()
+        scored = invalid = removed = 0
+        loader = DataLoader(self.db_config)
+        # Запись - отдельным соединением: серверный курсор чтения живет между коммитами порций
+        writer = DataLoader(self.db_config)
+        writer.connect()
+        conn = writer.conn
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "CREATE TEMP TABLE offer_fair_prices_stage "
+                    "(LIKE offer_fair_prices INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+                )
+                if since is None:
+                    cursor.execute(DELETE_INACTIVE_QUERY)
+                else:
+                    cursor.execute(DELETE_INACTIVE_QUERY + "AND o.updated_at >= %(since)s", {'since': since})
+                removed = cursor.rowcount
+            conn.commit()
+
+            for chunk in loader.iter_reprice_chunks(version, since=since, chunk_size=self.chunk_size):
+                stage = self._score_chunk(chunk, version)
+                self._upsert(conn, stage)
+                scored += len(stage)
+                invalid += len(chunk) - len(stage)
+
+                state = {'model_version': version, 'watermark': pd.Timestamp(chunk['updated_at'].max()).isoformat()}
+                self._write_state(state)
+                elapsed = time.perf_counter() - started
+                print(f"💾 Переоценено {scored} предложений ({scored / elapsed:.0f}/с)")
+        finally:
+            conn.close()
+
+        elapsed = time.perf_counter() - started
+        result = {
+            'model_version': version,
+            'since': since,
+            'scored': scored,
+            'invalid': invalid,
+            'removed': removed,
+            'elapsed_sec': round(elapsed, 3),
+            'offers_per_sec': round(scored / elapsed, 1) if elapsed > 0 else None,
+        }
+        print(f"✅ Справедливые цены: {scored} предложений за {elapsed:.1f} с, "
+              f"некорректных номеров: {invalid}, снято с продажи: {removed}")
+        return result
+
+    def _score_chunk(self, chunk: pd.DataFrame, version: str) -> pd.DataFrame:
+        """Строки для offer_fair_prices; предложения с некорректным номером пропускаются"""
+        results = self.predictor.predict_batch(chunk['number'].tolist())
+        scored = [i for i, result in enumerate(results) if 'error' not in result]
+
+        return pd.DataFrame({
+            'offer_id': chunk['offer_id'].to_numpy()[scored],
+            'model_version': version,
+            'fair_price': [results[i]['predicted_price'] for i in scored],
+            'price_low': [results[i]['price_range']['low'] for i in scored],
+            'price_high': [results[i]['price_range']['high'] for i in scored],
+            'confidence': [results[i]['confidence'] for i in scored],
+            'offer_price': chunk['price'].to_numpy()[scored],
+        })
+
+    @staticmethod
+    def _upsert(conn, stage: pd.DataFrame) -> None:
+        """COPY порции во временную таблицу и upsert в offer_fair_prices одной транзакцией"""
+        buffer = io.StringIO()
+        stage.to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+        with conn.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY offer_fair_prices_stage ({', '.join(STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            cursor.execute(UPSERT_QUERY)
+        conn.commit()
+
+    def _read_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_state(self, state: Dict[str, Any]) -> None:
+        tmp_path = f'{self.state_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пересчет справедливой цены активных предложений")
+    parser.add_argument('--model-path', default='models/price_catboost_model.cbm')
+    parser.add_argument('--state-path', default='reprice_state.json')
+    parser.add_argument('--chunk-size', type=int, default=REPRICE_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    job = FairPriceJob(NumberPricePredictor(model_path=args.model_path),
+                       state_path=args.state_path, chunk_size=args.chunk_size)
+    job.run()
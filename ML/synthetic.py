@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+# Буквы, допустимые в российских номерах
+LETTERS = 'АВЕКМНОРСТУХ'
+
+# Коды регионов, встречающиеся в выгрузках (двух- и трехзначные)
+REGION_CODES = (
+    [f'{code:02d}' for code in range(1, 100)]
+    + ['102', '116', '123', '125', '134', '152', '154', '159', '161', '163', '164',
+       '174', '177', '178', '186', '190', '196', '197', '198', '199', '277', '299',
+       '702', '716', '750', '761', '763', '777', '790', '797', '799', '977']
+)
+
+# Заведомо некорректные строки для проверки валидации
+INVALID_NUMBERS = ['', 'А12ВВ77', 'Я123ВВ77', 'А123ВВ7777', 'a123bb77', 'А123ВВ77\n', 'А١٢٣ВВ77']
+
+
+def generate_plates(n: int, seed: int = 42, invalid_share: float = 0.0) -> list:
+    """Генерация синтетических номеров формата А123ВС77 / А123ВС777"""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list(LETTERS), dtype=object)
+    regions = np.array(REGION_CODES, dtype=object)
+
+    first = letters[rng.integers(0, len(LETTERS), n)]
+    second = letters[rng.integers(0, len(LETTERS), n)]
+    third = letters[rng.integers(0, len(LETTERS), n)]
+    digits = rng.integers(0, 1000, n)
+    region = regions[rng.integers(0, len(regions), n)]
+
+    plates = [f'{a}{d:03d}{b}{c}{r}' for a, d, b, c, r in zip(first, digits, second, third, region)]
+
+    n_invalid = int(n * invalid_share)
+    if n_invalid:
+        positions = rng.choice(n, n_invalid, replace=False)
+        for i, pos in enumerate(positions):
+            plates[pos] = INVALID_NUMBERS[i % len(INVALID_NUMBERS)]
+
+    return plates
+
+
+def generate_listings(n: int, seed: int = 42, invalid_share: float = 0.0) -> pd.DataFrame:
+    """Синтетические объявления: номер, цена и дата публикации"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'number': generate_plates(n, seed=seed, invalid_share=invalid_share),
+        'price': np.round(rng.lognormal(mean=11.5, sigma=1.0, size=n), -2),
+        'posted_at': pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365 * 24, n), unit='h'),
+    })
+
+
+def train_synthetic_model(n: int = 5000, seed: int = 42, model_path: str = 'models/price_catboost_model.cbm',
+                          thread_count: int = -1, progress=None):
+    """Небольшая модель на синтетике: цена растет с престижностью номера"""
+    from feature_extractor import FeatureEngineer
+    from price_predictor import NumberPricePredictor
+
+    rng = np.random.default_rng(seed)
+    data = FeatureEngineer().prepare_dataframe(generate_listings(n, seed=seed))
+    data['price'] = np.round(20000 * np.exp(data['prestige_score'] / 25.0) * rng.lognormal(0, 0.3, len(data)), -2)
+    data['log_price'] = np.log1p(data['price'])
+
+    predictor = NumberPricePredictor(model_path=model_path)
+    predictor.train(data, random_state=seed, thread_count=thread_count, progress=progress)
+    return predictor
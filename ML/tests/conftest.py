@@ -0,0 +1,46 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+
+# Модули сервиса лежат плоско в ML/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def synthetic_predictor(tmp_path_factory):
+    """Небольшая модель на синтетике (synthetic.train_synthetic_model), загруженная из реестра"""
+    from price_predictor import NumberPricePredictor
+    from synthetic import train_synthetic_model
+
+    root = tmp_path_factory.mktemp('model')
+    cwd = os.getcwd()
+    # CatBoost пишет catboost_info в текущий каталог
+    os.chdir(root)
+    try:
+        model_path = str(root / 'models' / 'price_catboost_model.cbm')
+        with contextlib.redirect_stdout(io.StringIO()):
+            train_synthetic_model(n=3000, model_path=model_path, thread_count=1)
+            predictor = NumberPricePredictor(model_path=model_path)
+            predictor.load_model()
+    finally:
+        os.chdir(cwd)
+    return predictor
+
+
+@pytest.fixture
+def client(synthetic_predictor, tmp_path, monkeypatch):
+    """TestClient сервиса с моделью synthetic_predictor и без моделей сегментов"""
+    from fastapi.testclient import TestClient
+
+    import main
+    from model_router import ModelRouter
+
+    monkeypatch.setattr(main, 'predictor', synthetic_predictor)
+    monkeypatch.setattr(main, 'router', ModelRouter(str(tmp_path / 'segments')))
+    main.prediction_cache.clear()
+    main.plate_searches.clear()
+    # Без with: lifespan (init_predictor) не запускается, модель уже подставлена
+    return TestClient(main.app)
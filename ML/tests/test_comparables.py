@@ -0,0 +1,98 @@
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+from comparables import BUCKET_COLUMNS, ComparablesIndex, series_pattern
+from feature_extractor import FeatureEngineer
+from synthetic import generate_listings
+
+
+@pytest.fixture(scope='module')
+def engineer():
+    return FeatureEngineer()
+
+
+@pytest.fixture(scope='module')
+def listings(engineer):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return engineer.prepare_dataframe(generate_listings(3000, seed=3))
+
+
+@pytest.fixture(scope='module')
+def index(listings, engineer):
+    return ComparablesIndex.build(listings, engineer, {'digits': 5.0, 'region': 2.0})
+
+
+def brute_force(index, listings, features, k):
+    """Ближайшие по всей выборке внутри корзины, которую выбрал query"""
+    result = index.query(features, k)
+    in_bucket = np.ones(len(listings), dtype=bool)
+    for col, value in result['bucket'].items():
+        if col == 'series_pattern':
+            values = series_pattern(listings['letter1_num'].to_numpy(), listings['letter2_num'].to_numpy(),
+                                    listings['letter3_num'].to_numpy())
+        else:
+            values = listings[col].astype(str).to_numpy()
+        in_bucket &= values == value
+
+    point = np.array([features[col] for col in index.columns], dtype=np.float64) * index.scale
+    vectors = listings[index.columns].to_numpy(dtype=np.float64)[in_bucket] * index.scale
+    distances = np.sqrt(((vectors - point) ** 2).sum(axis=1))
+    return result, int(in_bucket.sum()), np.sort(distances)[:k]
+
+
+@pytest.mark.parametrize('number', ['А001АА77', 'В123ВС199', 'Е777КХ78', 'М555ОР50'])
+def test_query_matches_brute_force(index, listings, engineer, number):
+    result, bucket_size, expected = brute_force(index, listings, engineer.extract_features(number), k=10)
+    assert result['bucket_size'] == bucket_size
+    distances = [item['distance'] for item in result['comparables']]
+    np.testing.assert_allclose(distances, expected, atol=1e-3)
+    assert result['median_price'] == np.median([item['price'] for item in result['comparables']])
+
+
+def test_small_bucket_widens_key(index, engineer):
+    features = engineer.extract_features('А001АА77')
+    narrow = index.query(features, k=1)
+    wide = index.query(features, k=narrow['bucket_size'] + 1)
+    assert len(wide['bucket']) < len(narrow['bucket'])
+    assert wide['bucket_size'] > narrow['bucket_size']
+    assert len(wide['comparables']) == narrow['bucket_size'] + 1
+
+    everything = index.query(features, k=len(index) + 5)
+    assert everything['bucket'] == {}
+    assert len(everything['comparables']) == len(index)
+
+
+def test_buckets_are_contiguous_and_cover_all_rows(index):
+    bounds = [(start, end) for *_, start, end in index.buckets]
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(index)
+    assert all(end == start for (_, end), (start, _) in zip(bounds, bounds[1:]))
+    assert len({tuple(bucket[:len(BUCKET_COLUMNS)]) for bucket in index.buckets}) == len(index.buckets)
+
+
+def test_compact_dataframe_restores_numbers(listings, engineer):
+    compact = engineer.compact_dataframe(listings)
+    full_index = ComparablesIndex.build(listings, engineer)
+    compact_index = ComparablesIndex.build(compact, engineer)
+    assert sorted(compact_index.numbers) == sorted(full_index.numbers)
+
+
+def test_save_load_roundtrip(index, engineer, tmp_path):
+    index.save(str(tmp_path))
+    loaded = ComparablesIndex.load(str(tmp_path))
+    features = engineer.extract_features('В123ВС199')
+    assert loaded.query(features, 7) == index.query(features, 7)
+
+
+def test_endpoint(client):
+    response = client.get('/api/comparables', params={'number': 'a001aa77', 'k': 5})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['number'] == 'А001АА77'
+    assert len(body['comparables']) == 5
+    assert body['segment'] is None
+
+    assert client.get('/api/comparables', params={'number': 'плохой'}).status_code == 400
+    assert client.get('/api/comparables', params={'number': 'А001АА77', 'k': 0}).status_code == 422
@@ -0,0 +1,73 @@
+import contextlib
+import io
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_loader import DEDUP_QUERY, DataLoader
+from feature_extractor import FeatureEngineer
+from price_predictor import NumberPricePredictor
+
+# Объявления: (номер, цена, день публикации от 2025-01-01)
+LISTINGS = [
+    ('А001АА77', 100000, 0),
+    ('a001aa 77', 120000, 10),   # тот же номер латиницей, через 10 дней - повтор
+    ('А001АА77', 200000, 35),    # 25 дней после прошлой публикации - все еще повтор
+    ('А001АА77', 90000, 100),    # через 65 дней - новое объявление
+    ('В123ВС199', 50000, 5),
+]
+
+
+def base_query():
+    rows = ', '.join(f"('{number}', {price}::numeric, '2025-01-01'::timestamptz + {day} * INTERVAL '1 day')"
+                     for number, price, day in LISTINGS)
+    return f"SELECT * FROM (VALUES {rows}) v(number, price, posted_at)"
+
+
+@pytest.mark.skipif(not os.getenv('DATABASE_HOST'), reason='нужен Postgres (DATABASE_HOST)')
+def test_dedup_query_collapses_relistings():
+    import psycopg2
+
+    from trainer import db_config_from_env
+
+    config = db_config_from_env()
+    conn = psycopg2.connect(host=config['host'], database=config['database'], user=config['user'],
+                            password=config['password'], port=config['port'])
+    try:
+        df = pd.read_sql_query(DEDUP_QUERY.format(base=base_query()), conn, params={'dedup_days': 30})
+    finally:
+        conn.close()
+
+    df = df.sort_values(['number', 'posted_at']).reset_index(drop=True)
+    assert df['number'].tolist() == ['А001АА77', 'А001АА77', 'В123ВС199']
+    assert df['price'].tolist() == [120000, 90000, 50000]
+    # Дата схлопнутого объявления - последняя публикация (дни 35, 100 и 5)
+    assert (df['posted_at'] - df['posted_at'].min()).dt.days.tolist() == [30, 95, 0]
+    np.testing.assert_allclose(df['weight'], [1 + math.log(3), 1, 1])
+
+
+def test_training_query_wraps_base_with_dedup():
+    query, params = DataLoader({})._training_query(days_back=30, dedup_days=7)
+    assert query.lstrip().startswith('WITH base AS (')
+    assert 'FROM car_numbers' in query
+    assert params == {'days_back': 30, 'dedup_days': 7}
+    assert DataLoader._training_columns(7) == ['number', 'price', 'posted_at', 'weight']
+
+    query, params = DataLoader({})._training_query(days_back=30)
+    assert 'weight' not in query
+    assert DataLoader._training_columns() == ['number', 'price', 'posted_at']
+
+
+def test_weights_reach_catboost_pool():
+    df = pd.DataFrame({'number': ['А001АА77', 'плохой', 'В123ВС199'], 'price': [100000.0, 1.0, 50000.0],
+                       'weight': [1 + math.log(3), 1.0, 1.0]})
+    engineer = FeatureEngineer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        features = engineer.prepare_dataframe(df, compact=True)
+        assert features['weight'].tolist() == [1 + math.log(3), 1.0]
+        model_df, _, pool = NumberPricePredictor().prepare_features(features)
+    np.testing.assert_allclose(pool.get_weight(), [1 + math.log(3), 1.0])
+    assert 'weight' not in model_df.columns
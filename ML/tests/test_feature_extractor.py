@@ -0,0 +1,62 @@
+import contextlib
+import io
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_extractor import FeatureEngineer
+from synthetic import generate_listings, generate_plates
+
+
+@pytest.fixture(scope='module')
+def engineer():
+    return FeatureEngineer()
+
+
+def prepare(engineer, df, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return engineer.prepare_dataframe(df, **kwargs)
+
+
+def test_columnar_prepare_dataframe_matches_rowwise(engineer):
+    df = generate_listings(3000, seed=11, invalid_share=0.02)
+    pd.testing.assert_frame_equal(prepare(engineer, df, columnar=False), prepare(engineer, df, columnar=True),
+                                  check_exact=True)
+
+
+def test_batch_matches_extract_features_for_unusual_input(engineer):
+    # Не строки, нестрогие цифры (арабско-индийские), хвостовой перевод строки, мусор
+    numbers = ['А001АА77', None, 12345, 'А١٢٣ВС77', 'В123ВС199\n', 'плохой', '', 'Е777КХ78']
+    batch = engineer.extract_features_batch(np.array(numbers, dtype=object))
+    rows = batch.pop('_row').tolist()
+
+    expected = [(i, engineer.extract_features(number)) for i, number in enumerate(numbers)
+                if isinstance(number, str)]
+    expected = [(i, features) for i, features in expected if features is not None]
+    assert rows == [i for i, _ in expected]
+    for (_, features), (_, row) in zip(expected, batch.iterrows()):
+        assert {col: row[col] for col in features} == features
+
+
+def test_empty_input(engineer):
+    assert prepare(engineer, pd.DataFrame({'number': [], 'price': []})).empty
+    assert engineer.extract_features_batch([]).empty
+
+
+def test_component_tables_match_direct_extraction(engineer):
+    for plate in generate_plates(3000, seed=5, invalid_share=0.02):
+        expected = {}
+        if not engineer._validate_and_parse(plate, expected):
+            assert engineer.extract_features(plate) is None, plate
+            continue
+        engineer._extract_features_direct(expected)
+        assert list(engineer.extract_features(plate).items()) == list(expected.items()), plate
+
+
+def test_component_tables_are_rebuilt_after_pickling(engineer):
+    engineer._get_component_tables()
+    restored = pickle.loads(pickle.dumps(engineer))
+    assert '_component_tables' not in restored.__dict__
+    assert restored.extract_features('М777ММ197') == engineer.extract_features('М777ММ197')
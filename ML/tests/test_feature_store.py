@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from feature_extractor import HISTORY_DEFAULTS, HISTORY_FEATURES, FeatureEngineer
+from feature_store import FeatureStore
+
+
+def offers(ids, numbers, prices, updated_at, number_ids=None):
+    return pd.DataFrame({
+        'offer_id': ids,
+        'number_id': number_ids if number_ids is not None else ids,
+        'number': numbers,
+        'price': np.asarray(prices, dtype=np.float64),
+        'posted_at': pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=10),
+        'updated_at': pd.to_datetime(updated_at, utc=True),
+    })
+
+
+@pytest.fixture(scope='module')
+def engineer():
+    return FeatureEngineer()
+
+
+def test_update_writes_segment_and_watermark(tmp_path, engineer):
+    store = FeatureStore(str(tmp_path), engineer)
+    assert store.watermark is None
+
+    added = store.update([offers(['1', '2'], ['А001АА77', 'В123ВС199'], [150000, 20000],
+                                 ['2025-01-01', '2025-01-02'])])
+    assert added == 2
+    assert store.watermark == pd.Timestamp('2025-01-02', tz='UTC').to_pydatetime()
+
+    df = store.load()
+    assert sorted(df['price']) == [20000, 150000]
+
+
+def test_newer_row_replaces_offer(tmp_path, engineer):
+    store = FeatureStore(str(tmp_path), engineer)
+    store.update([offers(['1', '2'], ['А001АА77', 'В123ВС199'], [150000, 20000], ['2025-01-01', '2025-01-01'])])
+    store.update([offers(['1'], ['А001АА77'], [90000], ['2025-01-03'])])
+
+    df = store.load()
+    assert len(df) == 2
+    assert sorted(df['price']) == [20000, 90000]
+
+
+def test_invalid_numbers_are_skipped_but_move_watermark(tmp_path, engineer):
+    store = FeatureStore(str(tmp_path), engineer)
+    assert store.update([offers(['1'], ['плохой'], [50000], ['2025-02-01'])]) == 0
+    assert store.load().empty
+    assert store.watermark == pd.Timestamp('2025-02-01', tz='UTC').to_pydatetime()
+
+
+def test_compact_merges_segments_without_changing_data(tmp_path, engineer):
+    store = FeatureStore(str(tmp_path), engineer)
+    store.update([offers(['1', '2'], ['А001АА77', 'В123ВС199'], [150000, 20000], ['2025-01-01', '2025-01-01'])])
+    store.update([offers(['2', '3'], ['В123ВС199', 'Е777КХ78'], [25000, 300000], ['2025-01-02', '2025-01-02'])])
+    before = store.load(compact=True).sort_values('price').reset_index(drop=True)
+
+    store.compact()
+    assert len(store.manifest['segments']) == 1
+    after = FeatureStore(str(tmp_path), engineer).load(compact=True).sort_values('price').reset_index(drop=True)
+    pd.testing.assert_frame_equal(before, after)
+    assert after['price'].tolist() == [25000, 150000, 300000]
+
+
+def test_history_is_joined_by_number_on_load(tmp_path, engineer):
+    store = FeatureStore(str(tmp_path), engineer)
+    store.update([offers(['1', '2', '3'], ['А001АА77', 'В123ВС199', 'Е777КХ78'], [150000, 20000, 300000],
+                         ['2025-01-01'] * 3, number_ids=['10', '20', '30'])])
+    assert not set(HISTORY_FEATURES) & set(store.manifest['columns'])
+
+    history = pd.DataFrame({'number_id': ['10', '30'], 'history_listings': [2, 5], 'history_price_drops': [1, 3],
+                            'history_price_change': [-10, -40], 'history_days_on_market': [7, 90]})
+    df = store.load(compact=True, history=history).sort_values('price').reset_index(drop=True)
+    assert df['history_listings'].tolist() == [HISTORY_DEFAULTS['history_listings'], 2, 5]
+    assert df['history_days_on_market'].tolist() == [HISTORY_DEFAULTS['history_days_on_market'], 7, 90]
+
+    # Агрегаты не хранятся в сегментах: новое чтение видит свежую историю без update
+    history['history_listings'] = [4, 6]
+    assert sorted(store.load(compact=True, history=history)['history_listings']) == [1, 4, 6]
+
+
+def test_update_compacts_over_max_segments(tmp_path, engineer):
+    store = FeatureStore(str(tmp_path), engineer, max_segments=2)
+    for day in range(1, 4):
+        store.update([offers([str(day)], ['А001АА77'], [100000 + day], [f'2025-01-0{day}'])])
+    assert len(store.manifest['segments']) == 1
+    assert len(store.load()) == 3
+
+
+def test_load_filters_price_and_age(tmp_path, engineer):
+    store = FeatureStore(str(tmp_path), engineer)
+    chunk = offers(['1', '2', '3'], ['А001АА77', 'В123ВС199', 'Е777КХ78'], [500, 50000, 60000],
+                   ['2025-01-01'] * 3)
+    chunk.loc[2, 'posted_at'] = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=400)
+    store.update([chunk])
+
+    assert store.load(days_back=365)['price'].tolist() == [50000]
+
+
+def test_retain_drops_offers_missing_from_source(tmp_path, engineer):
+    store = FeatureStore(str(tmp_path), engineer)
+    store.update([offers(['1', '2'], ['А001АА77', 'В123ВС199'], [150000, 20000], ['2025-01-01'] * 2)])
+    store.update([offers(['3'], ['Е777КХ78'], [300000], ['2025-01-02'])])
+
+    assert store.retain(['1', '2', '3', '4']) == 0
+    assert len(store.manifest['segments']) == 2
+
+    assert store.retain(['1', '3']) == 1
+    assert sorted(store.load()['price']) == [150000, 300000]
+    assert sorted(FeatureStore(str(tmp_path), engineer).load()['price']) == [150000, 300000]
+
+    assert store.retain([]) == 2
+    assert store.load().empty
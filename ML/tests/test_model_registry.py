@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from model_registry import ModelRegistry
+
+
+def publish(registry, payload='model'):
+    staging = registry.stage()
+    with open(os.path.join(staging, 'model.bin'), 'w') as f:
+        f.write(payload)
+    return registry.publish(staging)
+
+
+def test_publish_makes_version_current(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    assert registry.current is None
+
+    version = publish(registry)
+    assert registry.current == version
+    assert os.path.exists(registry.path(version, 'model.bin'))
+    assert [item['version'] for item in registry.versions()] == [version]
+
+
+def test_rollback_target_does_not_change_registry(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    first = publish(registry, 'first')
+    second = publish(registry, 'second')
+
+    assert registry.rollback_target() == first
+    assert registry.current == second
+
+
+def test_rollback_switches_to_previous_version(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    first = publish(registry, 'first')
+    publish(registry, 'second')
+
+    assert registry.rollback() == first
+    assert registry.current == first
+    with pytest.raises(ValueError):
+        registry.rollback_target()
+
+
+def test_rollback_without_history_fails(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    publish(registry)
+    with pytest.raises(ValueError):
+        registry.rollback()
+
+
+def test_rollback_to_version_outside_history_fails(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    publish(registry, 'first')
+    second = publish(registry, 'second')
+    with pytest.raises(ValueError):
+        registry.rollback(second)
+
+
+def test_prune_keeps_recent_and_rollback_versions(tmp_path):
+    registry = ModelRegistry(str(tmp_path), keep_versions=2)
+    versions = [publish(registry, str(i)) for i in range(4)]
+
+    remaining = {item['version'] for item in registry.versions()}
+    assert remaining == set(versions[-2:])
+    assert registry.rollback_target() == versions[-2]
+
+
+def test_activate_unknown_version_fails(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    with pytest.raises(ValueError):
+        registry.activate('missing')
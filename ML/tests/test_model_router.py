@@ -0,0 +1,123 @@
+import contextlib
+import io
+import shutil
+
+import pytest
+
+import model_router
+from model_router import ModelRouter
+
+
+@pytest.fixture
+def segments(synthetic_predictor, tmp_path):
+    """Каталог моделей сегментов: копии реестра synthetic_predictor для moscow, spb и other"""
+    root = tmp_path / 'segments'
+    for name in ['moscow', 'spb', 'other']:
+        shutil.copytree(synthetic_predictor.registry.root, root / name)
+    return str(root)
+
+
+def make_router(segments, synthetic_predictor, models_in_budget=None, **kwargs):
+    budget_mb = 1024
+    if models_in_budget is not None:
+        budget_mb = ModelRouter._model_size(synthetic_predictor) * models_in_budget / 1024 / 1024
+    return ModelRouter(segments, memory_budget_mb=budget_mb, **kwargs)
+
+
+def get(router, segment):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return router.get(segment)
+
+
+def test_segment_of_plate_and_type(segments, synthetic_predictor):
+    router = make_router(segments, synthetic_predictor)
+    assert router.segment_of('А001АА77') == 'moscow'
+    assert router.segment_of('А001АА78') == 'spb'
+    assert router.segment_of('плохой') is None
+    assert make_router(segments, synthetic_predictor, segment_key='type').segment_of('А001АА77', 'Moto') == 'moto'
+
+    with pytest.raises(ValueError):
+        ModelRouter(segments, segment_key='color')
+
+
+def test_models_load_lazily_and_fall_back_to_default(segments, synthetic_predictor):
+    router = make_router(segments, synthetic_predictor)
+    assert router.stats()['available'] == ['moscow', 'other', 'spb']
+    assert router.loads == 0
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        segment, model = router.resolve('moscow', synthetic_predictor)
+        assert router.resolve('million', synthetic_predictor) == (None, synthetic_predictor)
+        assert router.resolve(None, synthetic_predictor) == (None, synthetic_predictor)
+    assert segment == 'moscow'
+    assert model is not synthetic_predictor
+    assert get(router, 'moscow') is model
+    assert router.loads == 1
+
+
+def test_lru_eviction_over_memory_budget(segments, synthetic_predictor):
+    router = make_router(segments, synthetic_predictor, models_in_budget=2.5)
+    moscow = get(router, 'moscow')
+    get(router, 'spb')
+    # moscow использовалась позже spb - вытесняется spb
+    assert get(router, 'moscow') is moscow
+    get(router, 'other')
+
+    assert set(router.stats()['loaded']) == {'moscow', 'other'}
+    assert router.evictions == 1
+    assert router.stats()['memory_mb'] <= router.stats()['memory_budget_mb']
+
+    get(router, 'spb')
+    assert router.loads == 4
+    assert set(router.stats()['loaded']) == {'other', 'spb'}
+
+
+def test_model_over_budget_is_still_kept(segments, synthetic_predictor):
+    router = make_router(segments, synthetic_predictor, models_in_budget=0.5)
+    get(router, 'moscow')
+    model = get(router, 'spb')
+    assert router.loaded_models() == [model]
+    assert router.evictions == 1
+
+
+def test_invalidate_drops_model_and_bumps_generation(segments, synthetic_predictor):
+    router = make_router(segments, synthetic_predictor)
+    model = get(router, 'moscow')
+    router.invalidate('moscow')
+    assert router.generation == 1
+    assert router.loaded_models() == []
+    assert get(router, 'moscow') is not model
+
+
+def test_invalidate_during_load_reloads_model(segments, synthetic_predictor, monkeypatch):
+    router = make_router(segments, synthetic_predictor)
+    original = model_router.NumberPricePredictor.load_model
+    loaded = []
+
+    def load_model(self, *args, **kwargs):
+        loaded.append(self)
+        if len(loaded) == 1:
+            # Переобучение сегмента завершилось, пока модель читалась с диска
+            router.invalidate('moscow')
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(model_router.NumberPricePredictor, 'load_model', load_model)
+    model = get(router, 'moscow')
+    assert len(loaded) == 2
+    assert model is loaded[1]
+    assert router.loaded_models() == [model]
+    assert router.loads == 1
+
+
+def test_predict_batch_routes_by_segment(segments, synthetic_predictor):
+    shutil.rmtree(f'{segments}/spb')
+    shutil.rmtree(f'{segments}/other')
+    router = make_router(segments, synthetic_predictor)
+    numbers = ['а001аа77', 'В123ВС199', 'Е777КХ78', 'плохой']
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = router.predict_batch(numbers, synthetic_predictor)
+
+    assert [item.get('segment') for item in results] == ['moscow', 'moscow', None, None]
+    assert results[0]['number'] == 'А001АА77'
+    assert 'error' in results[3]
+    assert results[2]['predicted_price'] == synthetic_predictor.predict_single('Е777КХ78')['predicted_price']
@@ -0,0 +1,48 @@
+import main
+
+
+def test_batch_matches_single_predictions(client, synthetic_predictor):
+    numbers = ['А001АА77', 'В123ВС199', 'Е777КХ78']
+    response = client.post('/api/predict/batch', json={'numbers': numbers})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['count'] == 3
+    assert body['errors'] == 0
+    for number, item in zip(numbers, body['results']):
+        expected = synthetic_predictor.predict_single(number)
+        assert item['number'] == number
+        assert item['predicted_price'] == expected['predicted_price']
+        assert item['price_range'] == expected['price_range']
+        assert item['segment'] is None
+
+
+def test_invalid_numbers_are_per_item_errors(client):
+    response = client.post('/api/predict/batch', json={'numbers': ['А001АА77', 'плохой', '', 'В123ВС199']})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['count'] == 4
+    assert body['errors'] == 2
+    # Порядок результатов - порядок запроса; у ошибки только номер и текст ошибки
+    assert [item['number'] for item in body['results']] == ['А001АА77', 'ПЛОХОЙ', '', 'В123ВС199']
+    assert set(body['results'][1]) == {'number', 'error'}
+    assert set(body['results'][2]) == {'number', 'error'}
+    assert 'predicted_price' in body['results'][3]
+
+
+def test_batch_normalizes_like_single_predict(client):
+    single = client.get('/api/predict', params={'number': 'a001aa 77'}).json()
+    batch = client.post('/api/predict/batch', json={'numbers': ['a001aa 77']}).json()
+    assert batch['errors'] == 0
+    assert batch['results'][0]['number'] == single['number'] == 'А001АА77'
+    assert batch['results'][0]['predicted_price'] == single['predicted_price']
+
+
+def test_batch_size_limits(client):
+    assert client.post('/api/predict/batch', json={'numbers': []}).status_code == 422
+    too_many = ['А001АА77'] * (main.MAX_BATCH_SIZE + 1)
+    assert client.post('/api/predict/batch', json={'numbers': too_many}).status_code == 422
+
+
+def test_batch_without_model(client, monkeypatch):
+    monkeypatch.setattr(main, 'predictor', None)
+    assert client.post('/api/predict/batch', json={'numbers': ['А001АА77']}).status_code == 503
@@ -0,0 +1,54 @@
+import prediction_cache
+from prediction_cache import PredictionCache
+
+
+def test_hit_and_miss():
+    cache = PredictionCache(max_size=10)
+    assert cache.get('А001АА77', 'v1') is None
+    cache.put('А001АА77', 'v1', {'price': 1})
+    assert cache.get('А001АА77', 'v1') == {'price': 1}
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_lru_eviction_keeps_recently_used():
+    cache = PredictionCache(max_size=2)
+    cache.put('a', 'v1', 1)
+    cache.put('b', 'v1', 2)
+    cache.get('a', 'v1')
+    cache.put('c', 'v1', 3)
+    assert cache.get('b', 'v1') is None
+    assert cache.get('a', 'v1') == 1
+    assert cache.get('c', 'v1') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_new_model_version_clears_cache():
+    cache = PredictionCache()
+    cache.put('a', 'v1', 1)
+    assert cache.get('a', 'v2') is None
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_put_from_old_model_version_is_ignored():
+    cache = PredictionCache()
+    cache.get('a', 'v2')
+    cache.put('a', 'v1', 1)
+    assert cache.get('a', 'v2') is None
+
+
+def test_ttl_expiration(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(prediction_cache.time, 'monotonic', lambda: now[0])
+    cache = PredictionCache(ttl=5)
+    cache.put('a', 'v1', 1)
+    now[0] += 4
+    assert cache.get('a', 'v1') == 1
+    now[0] += 2
+    assert cache.get('a', 'v1') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_zero_ttl_means_no_expiration():
+    assert PredictionCache(ttl=0).ttl is None
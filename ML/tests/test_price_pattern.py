@@ -0,0 +1,49 @@
+import json
+import re
+
+import pytest
+
+from plate_search import PlateSearch
+
+
+def stream(client, pattern, **params):
+    response = client.get('/api/predict/pattern', params={'pattern': pattern, **params})
+    lines = response.text.splitlines() if response.status_code == 200 else []
+    return response, [json.loads(line) for line in lines]
+
+
+def test_stream_prices_every_matching_plate(client, synthetic_predictor):
+    response, items = stream(client, 'А**7ММ77')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    assert response.headers['x-total-count'] == '100'
+    assert response.headers['x-segment'] == ''
+
+    numbers = [item['number'] for item in items]
+    assert len(set(numbers)) == 100
+    assert all(re.fullmatch(r'А\d\d7ММ77', number) for number in numbers)
+    for item in items[:10]:
+        expected = synthetic_predictor.predict_single(item['number'])
+        assert item['predicted_price'] == expected['predicted_price']
+        assert item['price_range'] == expected['price_range']
+
+
+def test_stream_limit_and_latin_pattern(client):
+    response, items = stream(client, 'a[0-3]00[am]a77', limit=5)
+    assert response.headers['x-total-count'] == '5'
+    assert len(items) == 5
+    assert all(re.fullmatch(r'А[0-3]00[АМ]А77', item['number']) for item in items)
+
+
+@pytest.mark.parametrize('pattern', ['А**7ММ', 'Б**7ММ77', 'А[9-0]07ММ77'])
+def test_invalid_pattern_is_rejected_before_streaming(client, pattern):
+    response, _ = stream(client, pattern)
+    assert response.status_code == 400
+
+
+def test_batches_are_lazy_and_cover_pattern(synthetic_predictor):
+    total, batches = PlateSearch(synthetic_predictor).price_pattern('А**7ММ7*', batch_size=64)
+    assert total == 1000
+    sizes = [len(batch) for batch in batches]
+    assert sizes[0] == 64
+    assert sum(sizes) == 1000
@@ -0,0 +1,91 @@
+import csv
+import io
+import os
+import re
+
+import pandas as pd
+import pytest
+
+from repricing import STAGE_COLUMNS, UPSERT_QUERY, FairPriceJob
+
+MIGRATION = os.path.join(os.path.dirname(__file__), '..', '..', 'data-service', 'migrations',
+                         '006_create_offer_fair_prices_table.up.sql')
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def copy_expert(self, sql, buffer):
+        self.conn.calls.append(('copy', sql, buffer.read()))
+
+    def execute(self, sql, params=None):
+        self.conn.calls.append(('execute', sql))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.calls = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.calls.append(('commit',))
+
+
+def test_upsert_inserts_stage_columns_and_updates_all_but_key():
+    insert = re.search(r'INSERT INTO offer_fair_prices \((.*?)\)\s*SELECT (.*?) FROM offer_fair_prices_stage',
+                       UPSERT_QUERY, re.S)
+    assert insert.group(1).split(', ') == STAGE_COLUMNS
+    assert insert.group(2).split(', ') == STAGE_COLUMNS
+    assert 'ON CONFLICT (offer_id) DO UPDATE SET' in UPSERT_QUERY
+
+    updates = dict(re.findall(r'^\s+(\w+)\s*=\s*(.+?),?$', UPSERT_QUERY.split('DO UPDATE SET')[1], re.M))
+    assert updates.pop('updated_at') == 'CURRENT_TIMESTAMP'
+    assert updates == {col: f'EXCLUDED.{col}' for col in STAGE_COLUMNS if col != 'offer_id'}
+
+
+@pytest.mark.skipif(not os.path.exists(MIGRATION), reason='нет миграций data-service')
+def test_stage_columns_exist_in_table():
+    with open(MIGRATION) as f:
+        table = f.read().split(');')[0]
+    columns = re.findall(r'^\s+(\w+) ', table, re.M)
+    assert set(STAGE_COLUMNS) <= set(columns)
+
+
+def test_upsert_copies_chunk_and_commits_once():
+    stage = pd.DataFrame({'offer_id': ['a', 'b'], 'model_version': 'v1', 'fair_price': [100, 200],
+                          'price_low': [80, 160], 'price_high': [120, 240], 'confidence': [0.85, 0.6],
+                          'offer_price': [90.0, 250.0]})[STAGE_COLUMNS]
+    conn = FakeConnection()
+    FairPriceJob._upsert(conn, stage)
+
+    (kind, copy_sql, data), execute, commit = conn.calls
+    assert copy_sql == f"COPY offer_fair_prices_stage ({', '.join(STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    assert list(csv.reader(io.StringIO(data))) == [
+        ['a', 'v1', '100', '80', '120', '0.85', '90.0'],
+        ['b', 'v1', '200', '160', '240', '0.6', '250.0'],
+    ]
+    assert execute == ('execute', UPSERT_QUERY)
+    assert commit == ('commit',)
+
+
+def test_score_chunk_skips_invalid_numbers(synthetic_predictor):
+    chunk = pd.DataFrame({'offer_id': ['a', 'b', 'c'], 'number': ['А001АА77', 'плохой', 'В123ВС199'],
+                          'price': [100000.0, 5000.0, 20000.0]})
+    job = FairPriceJob(synthetic_predictor, db_config={})
+    stage = job._score_chunk(chunk, 'v1')
+
+    assert list(stage.columns) == STAGE_COLUMNS
+    assert stage['offer_id'].tolist() == ['a', 'c']
+    assert stage['offer_price'].tolist() == [100000.0, 20000.0]
+    expected = synthetic_predictor.predict_single('В123ВС199')
+    assert stage.iloc[1]['fair_price'] == expected['predicted_price']
+    assert stage.iloc[1]['price_low'] == expected['price_range']['low']
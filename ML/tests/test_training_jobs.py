@@ -0,0 +1,106 @@
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from trainer import train_synthetic
+from training_jobs import JobProgress, TrainingCancelled, TrainingJobs
+
+
+def read_progress(path):
+    with open(f'{path}.json') as f:
+        return json.load(f)
+
+
+def test_progress_tracks_stages_and_rows(tmp_path):
+    path = str(tmp_path / 'job')
+    progress = JobProgress(path)
+    assert [len(chunk) for chunk in progress.track_chunks([[1, 2], [3]])] == [2, 1]
+    assert read_progress(path)['rows'] == 3
+    assert read_progress(path)['stage'] == 'features'
+
+    progress.fit_started(100)
+    assert read_progress(path)['iterations'] == 100
+    progress.set_metrics({'mae': 1.0})
+    state = progress.finish()
+    assert state['stage'] is None
+    assert set(state['stages']) == {'load', 'features', 'fit'}
+    assert read_progress(path)['metrics'] == {'mae': 1.0}
+
+
+def test_progress_without_path_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    progress = JobProgress()
+    list(progress.track_chunks([[1]]))
+    progress.finish()
+    assert not progress.cancelled
+    assert os.listdir(tmp_path) == []
+
+
+def test_cancel_stops_chunks_and_iterations(tmp_path):
+    path = str(tmp_path / 'job')
+    progress = JobProgress(path)
+    chunks = progress.track_chunks([[1], [2], [3]])
+    next(chunks)
+    assert progress.after_iteration(SimpleNamespace(iteration=1))
+
+    open(f'{path}.cancel', 'w').close()
+    assert not progress.after_iteration(SimpleNamespace(iteration=2))
+    with pytest.raises(TrainingCancelled):
+        next(chunks)
+
+
+def test_single_active_job(tmp_path):
+    jobs = TrainingJobs(str(tmp_path))
+    job_id = jobs.start({'days_back': 30})
+    assert jobs.active == job_id
+    assert jobs.start({'days_back': 30}) is None
+
+    JobProgress(jobs.progress_path(job_id)).stage('fit')
+    job = jobs.get(job_id)
+    assert job['status'] == 'running'
+    assert job['stage'] == 'fit'
+    assert job['params'] == {'days_back': 30}
+
+    jobs.finish(job_id, 'succeeded')
+    assert jobs.active is None
+    assert jobs.get(job_id)['status'] == 'succeeded'
+    assert jobs.get('missing') is None
+
+
+def test_cancel_only_running_jobs(tmp_path):
+    jobs = TrainingJobs(str(tmp_path))
+    job_id = jobs.start({})
+    assert jobs.cancel(job_id)
+    assert JobProgress(jobs.progress_path(job_id)).cancelled
+
+    jobs.finish(job_id, 'cancelled')
+    assert not jobs.cancel(job_id)
+    assert not jobs.cancel('missing')
+
+
+def test_old_jobs_are_forgotten(tmp_path):
+    jobs = TrainingJobs(str(tmp_path), keep_jobs=2)
+    job_ids = []
+    for _ in range(3):
+        job_ids.append(jobs.start({}))
+        JobProgress(jobs.progress_path(job_ids[-1])).finish()
+        jobs.finish(job_ids[-1], 'succeeded')
+
+    assert jobs.get(job_ids[0]) is None
+    assert not os.path.exists(f'{jobs.progress_path(job_ids[0])}.json')
+    assert jobs.get(job_ids[2]) is not None
+
+
+def test_cancelled_training_does_not_save_model(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path = str(tmp_path / 'job')
+    open(f'{path}.cancel', 'w').close()
+    model_path = str(tmp_path / 'models' / 'price_catboost_model.cbm')
+
+    result = train_synthetic(500, thread_count=1, model_path=model_path, progress_path=path)
+    assert result['success'] is False
+    assert result['cancelled'] is True
+    assert not os.path.exists(tmp_path / 'models' / 'registry.json')
+    assert read_progress(path)['stage'] is None
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from plate_search import PlateSearch
+from synthetic import generate_plates
+from tree_engine import ObliviousTreeEngine
+
+
+@pytest.fixture(scope='module')
+def engine(synthetic_predictor):
+    return ObliviousTreeEngine.from_catboost(synthetic_predictor.model, synthetic_predictor.categories)
+
+
+@pytest.fixture(scope='module')
+def rows(synthetic_predictor):
+    features_df = synthetic_predictor.feature_engineer.extract_features_batch(generate_plates(2000, seed=7))
+    return synthetic_predictor._encode_features(features_df).to_numpy(np.int64)
+
+
+def test_predict_matches_catboost(synthetic_predictor, engine, rows):
+    np.testing.assert_allclose(engine.predict(rows), synthetic_predictor.model.predict(rows), rtol=0, atol=1e-6)
+
+
+def test_predict_single_row(synthetic_predictor, engine, rows):
+    assert engine.predict(rows[0]).shape == (1,)
+    assert engine.predict(rows[0])[0] == pytest.approx(synthetic_predictor.model.predict(rows[:1])[0], abs=1e-6)
+
+
+def test_upper_bound_of_point_box_is_prediction(engine, rows):
+    np.testing.assert_allclose(engine.upper_bound(rows, rows), engine.predict(rows), rtol=0, atol=1e-9)
+
+
+def test_upper_bound_covers_sampled_boxes(engine, rows):
+    rng = np.random.default_rng(0)
+    numeric = np.setdiff1d(np.arange(rows.shape[1]), engine.cat_positions)
+    for row in rows[:50]:
+        # Коробка: числовые признаки строки с разбросом, категории фиксированы
+        lower, upper = row.copy(), row.copy()
+        lower[numeric] -= rng.integers(0, 20, len(numeric))
+        upper[numeric] += rng.integers(0, 20, len(numeric))
+        samples = rng.integers(lower, upper + 1, size=(500, len(row)))
+        bound = engine.upper_bound(lower, upper)[0]
+        assert engine.predict(samples).max() <= bound + 1e-9
+        assert engine.predict(np.vstack([lower, upper])).max() <= bound + 1e-9
+
+
+def test_upper_bound_rejects_open_categories(engine, rows):
+    if not len(engine.cat_positions):
+        pytest.skip("в модели нет категориальных признаков")
+    upper = rows[:1].copy()
+    upper[0, engine.cat_positions[0]] += 1
+    with pytest.raises(ValueError):
+        engine.upper_bound(rows[:1], upper)
+
+
+def test_plate_search_matches_brute_force(synthetic_predictor):
+    search = PlateSearch(synthetic_predictor)
+    result = search.search('77', 'А??', '??7', top_n=5, time_budget=30)
+    assert result['exhaustive']
+
+    # Полный перебор тех же номеров через predict_batch
+    letters = 'АВЕКМНОРСТУХ'
+    plates = [f'А{d:02d}7{b}{c}77' for d in range(100) for b in letters for c in letters]
+    prices = sorted((r['predicted_price'] for r in synthetic_predictor.predict_batch(plates)), reverse=True)
+    assert [r['predicted_price'] for r in result['results']] == prices[:5]
@@ -0,0 +1,154 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from training_jobs import JobProgress, TrainingCancelled
+
+# Бюджет процесса обучения: потоки CatBoost (по умолчанию одно ядро оставляем сервису)
+# и nice, чтобы планировщик отдавал приоритет обработке запросов
+TRAIN_THREAD_COUNT = int(os.getenv('TRAIN_THREAD_COUNT', str(max(1, (os.cpu_count() or 2) - 1))))
+TRAIN_NICE = int(os.getenv('TRAIN_NICE', '10'))
+
+
+def db_config_from_env() -> Dict[str, Any]:
+    """Конфигурация БД из переменных окружения"""
+    return {
+        'host': os.getenv('DATABASE_HOST', 'postgres'),
+        'database': os.getenv('DATABASE_NAME', 'postgres'),
+        'user': os.getenv('DATABASE_USER', 'postgres'),
+        'password': os.getenv('DATABASE_PASSWORD', 'postgres1'),
+        'port': os.getenv('DATABASE_PORT', '5432')
+    }
+
+
+def train_model(days_back: int, incremental: bool = False, db_config: Optional[Dict[str, Any]] = None,
+                chunk_size: int = 50000, feature_store_path: str = 'feature_store',
+                thread_count: int = -1, model_path: str = 'models/price_catboost_model.cbm',
+                progress_path: Optional[str] = None, dedup_days: Optional[int] = None,
+                segment: Optional[str] = None) -> Dict[str, Any]:
+    """Обучение целиком: загрузка, признаки, CatBoost, сохранение модели на диск.
+
+    Выполняется в процессе обучения (TrainerProcess); в сервис возвращается
+    только результат - версия готовой модели в реестре. Прогресс и отмена -
+    через файлы progress_path (training_jobs.JobProgress). dedup_days -
+    схлопывать повторные объявления при полной загрузке (DataLoader).
+    segment - обучить модель одной группы регионов (model_router.ModelRouter)
+    только на ее объявлениях.
+    """
+    # Модули обучения (БД, хранилище признаков, sklearn) импортируются только
+    # в процессе обучения - сервис импортирует trainer ради TrainerProcess
+    from data_loader import DataLoader
+    from feature_extractor import FeatureEngineer
+    from feature_store import FeatureStore
+    from price_predictor import NumberPricePredictor
+
+    progress = JobProgress(progress_path)
+    try:
+        progress.stage('load')
+        loader = DataLoader(db_config or db_config_from_env())
+        feature_engineer = FeatureEngineer()
+        if incremental:
+            # Признаки считаем только для предложений, измененных после прошлой выгрузки
+            store = FeatureStore(feature_store_path, feature_engineer)
+            # Агрегаты истории цен пересчитываются только по номерам с новыми записями
+            loader.refresh_price_history_stats()
+            store.update(progress.track_chunks(
+                loader.iter_offer_chunks(since=store.watermark, chunk_size=chunk_size)
+            ))
+            # Удаленные предложения выгрузка по updated_at не находит - сверяем полный список id
+            store.retain(loader.load_offer_ids())
+            # История цен - свежая на момент обучения, а не на момент выгрузки предложения
+            processed_data = store.load(days_back=days_back, compact=True,
+                                        history=loader.load_price_history_features())
+        else:
+            # Загрузка данных порциями и подготовка признаков на лету
+            chunks = loader.iter_chunks(chunk_size=chunk_size, days_back=days_back, dedup_days=dedup_days)
+            processed_data = feature_engineer.prepare_dataframe_stream(progress.track_chunks(chunks), compact=True)
+        loader.close()
+
+        if segment is not None:
+            processed_data = processed_data[processed_data['region_group'] == segment].reset_index(drop=True)
+            print(f"Сегмент {segment}: {len(processed_data)} строк")
+            if processed_data.empty:
+                raise ValueError(f"Нет данных для сегмента {segment}")
+
+        # 3. Обучение модели
+        print("\nШаг 3: Обучение модели...")
+        predictor = NumberPricePredictor(model_path=model_path)
+        predictor.train(processed_data, thread_count=thread_count, progress=progress)
+
+        print("✅ Обучение завершено")
+        return {"success": True, "message": "Модель обучена", "model_path": model_path,
+                "model_version": predictor.model_version, "rows": len(processed_data)}
+
+    except TrainingCancelled as e:
+        print(f"⚠️ {e}")
+        return {"success": False, "cancelled": True, "error": str(e)}
+    except Exception as e:
+        print(f"❌ Ошибка обучения: {e}")
+        return {"success": False, "error": str(e)}
+    finally:
+        progress.finish()
+
+
+def train_synthetic(n: int, seed: int = 42, thread_count: int = -1,
+                    model_path: str = 'models/price_catboost_model.cbm',
+                    progress_path: Optional[str] = None) -> Dict[str, Any]:
+    """Обучение на n синтетических объявлениях (synthetic.train_synthetic_model) вместо БД.
+
+    Результат - как у train_model: сервис подменяет модель так же. Нужно
+    нагрузочному тесту (loadtest.py --retrain), чтобы переобучение под
+    нагрузкой шло без Postgres.
+    """
+    from synthetic import train_synthetic_model
+
+    progress = JobProgress(progress_path)
+    try:
+        progress.stage('load')
+        progress.add_rows(n)
+        predictor = train_synthetic_model(n=n, seed=seed, model_path=model_path,
+                                          thread_count=thread_count, progress=progress)
+        print("✅ Обучение на синтетике завершено")
+        return {"success": True, "message": "Модель обучена", "model_path": model_path,
+                "model_version": predictor.model_version, "rows": n}
+
+    except TrainingCancelled as e:
+        print(f"⚠️ {e}")
+        return {"success": False, "cancelled": True, "error": str(e)}
+    except Exception as e:
+        print(f"❌ Ошибка обучения: {e}")
+        return {"success": False, "error": str(e)}
+    finally:
+        progress.finish()
+
+
+class TrainerProcess:
+    """Отдельный процесс для обучения.
+
+    На каждое обучение запускается свежий процесс (spawn): CatBoost и цикл
+    признаков не делят GIL и ядра с обработкой запросов, а память под
+    обучающие данные возвращается системе, когда процесс завершается.
+    """
+
+    def __init__(self, thread_count: int = TRAIN_THREAD_COUNT, nice: int = TRAIN_NICE):
+        self.thread_count = thread_count
+        self.nice = nice
+
+    def executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_trainer,
+            initargs=(self.nice,),
+        )
+
+    def submit(self, executor: ProcessPoolExecutor, fn, *args, **kwargs):
+        """Запустить fn в процессе обучения с его бюджетом потоков"""
+        kwargs.setdefault('thread_count', self.thread_count)
+        return executor.submit(fn, *args, **kwargs)
+
+
+def _init_trainer(nice: int) -> None:
+    if nice:
+        os.nice(nice)
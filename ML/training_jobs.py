@@ -0,0 +1,172 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+
+class TrainingCancelled(Exception):
+    """Обучение остановлено по запросу отмены"""
+
+
+class JobProgress:
+    """Прогресс задачи обучения: этапы load, features, fit, evaluate, save.
+
+    Пишется процессом обучения в <path>.json (атомарно, не чаще раза в
+    interval секунд для итераций CatBoost), сервис читает этот файл.
+    Отмена - файл <path>.cancel, его наличие проверяется между порциями
+    данных, на каждой итерации CatBoost и перед сохранением модели.
+    С path=None ничего не пишется (обучение вне сервиса).
+    """
+
+    def __init__(self, path: Optional[str] = None, interval: float = 1.0):
+        self.path = path
+        self.interval = interval
+        self.state = {'stage': None, 'stages': {}, 'rows': 0,
+                      'iteration': None, 'iterations': None, 'metrics': None}
+        self._stage_started = None
+        self._written_at = 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self.path is not None and os.path.exists(f'{self.path}.cancel')
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise TrainingCancelled("Обучение отменено")
+
+    def stage(self, name: str) -> None:
+        """Перейти к этапу; время прошлого этапа добавляется к его длительности"""
+        now = time.perf_counter()
+        self._close_stage(now)
+        self.state['stage'] = name
+        self._stage_started = now
+        self._write()
+
+    def add_rows(self, rows: int) -> None:
+        self.state['rows'] += rows
+
+    def track_chunks(self, chunks: Iterable[Any]) -> Iterator[Any]:
+        """Порции данных: ожидание очередной порции - этап load, ее обработка - features"""
+        iterator = iter(chunks)
+        while True:
+            self.check()
+            self.stage('load')
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                # Дальше - сборка признаков из порций
+                self.stage('features')
+                return
+            self.add_rows(len(chunk))
+            self.stage('features')
+            yield chunk
+
+    def fit_started(self, iterations: int) -> None:
+        self.state['iterations'] = iterations
+        self.stage('fit')
+
+    def after_iteration(self, info) -> bool:
+        """Callback CatBoost: номер итерации и остановка обучения при отмене"""
+        self.state['iteration'] = info.iteration
+        if time.perf_counter() - self._written_at >= self.interval:
+            self._write()
+        return not self.cancelled
+
+    def set_metrics(self, metrics: Dict[str, float]) -> None:
+        self.state['metrics'] = metrics
+        self._write()
+
+    def finish(self) -> Dict[str, Any]:
+        self._close_stage(time.perf_counter())
+        self.state['stage'] = None
+        self._write()
+        return self.state
+
+    def _close_stage(self, now: float) -> None:
+        name = self.state['stage']
+        if name is not None:
+            stages = self.state['stages']
+            stages[name] = round(stages.get(name, 0.0) + now - self._stage_started, 3)
+
+    def _write(self) -> None:
+        self._written_at = time.perf_counter()
+        if self.path is None:
+            return
+        tmp_path = f'{self.path}.json.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, f'{self.path}.json')
+
+
+class TrainingJobs:
+    """Задачи обучения сервиса: не больше одной активной, статус по id"""
+
+    def __init__(self, path: str = 'training_jobs', keep_jobs: int = 50):
+        self.path = path
+        self.keep_jobs = keep_jobs
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._active: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> Optional[str]:
+        return self._active
+
+    def start(self, params: Dict[str, Any]) -> Optional[str]:
+        """Зарегистрировать новую задачу; None, если обучение уже идет"""
+        with self._lock:
+            if self._active is not None:
+                return None
+            job_id = uuid.uuid4().hex[:12]
+            self._jobs[job_id] = {'id': job_id, 'status': 'running', 'params': params,
+                                  'created_at': time.time(), 'finished_at': None, 'error': None}
+            self._active = job_id
+
+            # Старые завершенные задачи забываем
+            for old_id in list(self._jobs)[:-self.keep_jobs]:
+                self._forget(old_id)
+
+        os.makedirs(self.path, exist_ok=True)
+        return job_id
+
+    def progress_path(self, job_id: str) -> str:
+        """Базовый путь файлов прогресса и отмены (для JobProgress)"""
+        return os.path.join(self.path, job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        try:
+            with open(f'{self.progress_path(job_id)}.json') as f:
+                progress = json.load(f)
+        except (FileNotFoundError, ValueError):
+            progress = {}
+        return {**job, **progress}
+
+    def cancel(self, job_id: str) -> bool:
+        """Запросить отмену; False, если задача уже завершена"""
+        job = self._jobs.get(job_id)
+        if job is None or job['status'] != 'running':
+            return False
+        open(f'{self.progress_path(job_id)}.cancel', 'w').close()
+        return True
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(status=status, error=error, finished_at=time.time())
+            if self._active == job_id:
+                self._active = None
+
+    def _forget(self, job_id: str) -> None:
+        if job_id == self._active:
+            return
+        del self._jobs[job_id]
+        for suffix in ('.json', '.cancel'):
+            try:
+                os.remove(f'{self.progress_path(job_id)}{suffix}')
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,248 @@
+import itertools
+import json
+import os
+import tempfile
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# Строк за один проход predict / коробок за один проход upper_bound
+CHUNK_ROWS = 1024
+BOUND_CHUNK_BOXES = 64
+
+
+class ObliviousTreeEngine:
+    """Предсказание симметричных деревьев CatBoost на numpy.
+
+    Модель выгружается в массивы: числовые условия - пары (признак, порог),
+    для каждого дерева - индексы его условий по уровням, значения листьев.
+    Пачка строк считается целиком: матрица битов условий -> индекс листа
+    каждого дерева (биты, сдвинутые на уровень) -> сумма значений листьев.
+
+    Категориальные условия CatBoost (CTR) считаются по хэшам строк категорий;
+    вместо повторения хэшей таблицы условий снимаются с самой модели
+    (calc_leaf_indexes) на всех сочетаниях кодов категорий и битов числовых
+    порогов, входящих в CTR, - домены категорий малы, таблицы крошечные.
+    """
+
+    def __init__(self, feature_index: np.ndarray, borders: np.ndarray, cat_positions: np.ndarray,
+                 cat_strides: np.ndarray, ctr_tables: np.ndarray, ctr_offsets: np.ndarray,
+                 ctr_sizes: np.ndarray, ctr_float_splits: np.ndarray, tree_splits: np.ndarray,
+                 leaf_values: np.ndarray, scale: float, bias: float):
+        self.feature_index = feature_index
+        self.borders = borders
+        self.cat_positions = cat_positions
+        self.cat_strides = cat_strides
+        self.ctr_tables = ctr_tables
+        self.ctr_offsets = ctr_offsets
+        self.ctr_sizes = ctr_sizes
+        self.ctr_float_splits = ctr_float_splits
+        self.tree_splits = tree_splits
+        self.leaf_values = leaf_values
+        self.scale = scale
+        self.bias = bias
+
+        # Индексы условий по уровням / по битам ключа CTR - отдельными непрерывными массивами
+        self._levels = [np.ascontiguousarray(tree_splits[:, d]) for d in range(tree_splits.shape[1])]
+        self._ctr_levels = [np.ascontiguousarray(ctr_float_splits[:, j]) for j in range(ctr_float_splits.shape[1])]
+        self._leaf_offsets = (np.arange(len(tree_splits), dtype=np.intp) << tree_splits.shape[1])[:, None]
+        self._flat_leaves = leaf_values.ravel()
+
+    @classmethod
+    def from_catboost(cls, model, categories: Dict[str, List[str]]) -> 'ObliviousTreeEngine':
+        """Выгрузка обученного CatBoostRegressor.
+
+        categories - классы категориальных признаков: строка модели содержит
+        их коды 0..K-1, как в NumberPricePredictor._encode_row.
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'model.json')
+            model.save_model(path, format='json')
+            with open(path) as f:
+                dump = json.load(f)
+
+        features_info = dump['features_info']
+        float_features = features_info.get('float_features', [])
+        float_positions = [f['flat_feature_index'] for f in float_features]
+        cat_features = features_info.get('categorical_features', [])
+        cat_positions = np.array([f['flat_feature_index'] for f in cat_features], dtype=np.int64)
+        cardinalities = [max(len(categories.get(f['feature_id'], [])), 1) for f in cat_features]
+        ctrs = features_info.get('ctrs', [])
+
+        # split_index - сквозной номер среди порогов: сначала числовые, затем CTR по порядку ctrs
+        n_float_borders = sum(len(f.get('borders') or []) for f in float_features)
+        ctr_by_split = [c for c, ctr in enumerate(ctrs) for _ in ctr['borders']]
+
+        float_splits: Dict[tuple, int] = {}
+
+        def float_split(feature: int, border: float) -> int:
+            key = (float_positions[feature], np.float32(border))
+            return float_splits.setdefault(key, len(float_splits))
+
+        trees = dump['oblivious_trees']
+        depth = max(len(tree['splits']) for tree in trees)
+        levels = []        # по деревьям: ('float', номер) или ('ctr', номер)
+        ctr_splits = []    # (номер CTR в ctrs, дерево, уровень)
+        for t, tree in enumerate(trees):
+            kinds = []
+            for d, split in enumerate(tree['splits']):
+                if split['split_type'] == 'FloatFeature':
+                    kinds.append(('float', float_split(split['float_feature_index'], split['border'])))
+                elif split['split_type'] == 'OnlineCtr':
+                    kinds.append(('ctr', len(ctr_splits)))
+                    ctr_splits.append((ctr_by_split[split['split_index'] - n_float_borders], t, d))
+                else:
+                    raise ValueError(f"Условие {split['split_type']} не поддерживается")
+            levels.append(kinds)
+
+        # Числовые пороги внутри CTR - такие же условия, их биты входят в ключ таблицы
+        ctr_elements = []
+        for ctr in ctrs:
+            elements = [e for e in ctr['elements'] if e['combination_element'] == 'float_feature']
+            ctr_elements.append([(e['float_feature_index'], e['border']) for e in elements])
+        ctr_float_ids = [[float_split(f, b) for f, b in elements] for elements in ctr_elements]
+
+        # Таблицы CTR-условий: ключ = сочетание кодов категорий * 2^m + биты m числовых порогов
+        combos = np.array(list(itertools.product(*[range(k) for k in cardinalities])), dtype=np.int64)
+        width = max([len(ids) for ids in ctr_float_ids] + [1])
+        n_float = len(float_splits)
+        never = n_float + len(ctr_splits)
+        ctr_sizes = np.array([len(combos) << len(ctr_float_ids[c]) for c, _, _ in ctr_splits], dtype=np.int64)
+        ctr_offsets = np.concatenate([[0], np.cumsum(ctr_sizes)[:-1]]).astype(np.int64)
+        ctr_tables = np.zeros(int(ctr_sizes.sum()), dtype=np.uint8)
+        ctr_float_splits = np.full((len(ctr_splits), width), never, dtype=np.int64)
+
+        for c in sorted({c for c, _, _ in ctr_splits}):
+            leaves = np.asarray(model.calc_leaf_indexes(
+                _probe_pool(combos, cat_positions, model.feature_names_, float_positions, ctr_elements[c])
+            ), dtype=np.int64)
+            for i, (split_ctr, t, d) in enumerate(ctr_splits):
+                if split_ctr == c:
+                    ctr_tables[ctr_offsets[i]:ctr_offsets[i] + ctr_sizes[i]] = (leaves[:, t] >> d) & 1
+                    ctr_float_splits[i, :len(ctr_float_ids[c])] = ctr_float_ids[c]
+
+        # Индексы условий по уровням: числовые, затем CTR, последний столбец - всегда 0
+        tree_splits = np.full((len(trees), depth), never, dtype=np.int64)
+        for t, kinds in enumerate(levels):
+            for d, (kind, index) in enumerate(kinds):
+                tree_splits[t, d] = index if kind == 'float' else n_float + index
+
+        # У дерева меньшей глубины старшие биты всегда 0 - листья лежат в начале строки
+        leaf_values = np.zeros((len(trees), 1 << depth))
+        for t, tree in enumerate(trees):
+            leaf_values[t, :len(tree['leaf_values'])] = tree['leaf_values']
+
+        keys = sorted(float_splits, key=float_splits.get)
+        scale, biases = dump['scale_and_bias']
+        strides = np.cumprod([1] + cardinalities[::-1])[:-1][::-1].astype(np.int64)
+        return cls(
+            feature_index=np.array([k[0] for k in keys], dtype=np.int64),
+            borders=np.array([k[1] for k in keys], dtype=np.float32),
+            cat_positions=cat_positions,
+            cat_strides=strides,
+            ctr_tables=ctr_tables,
+            ctr_offsets=ctr_offsets,
+            ctr_sizes=ctr_sizes // len(combos),
+            ctr_float_splits=ctr_float_splits,
+            tree_splits=tree_splits,
+            leaf_values=leaf_values,
+            scale=float(scale),
+            bias=float(biases[0]) if biases else 0.0,
+        )
+
+    def predict(self, rows: np.ndarray) -> np.ndarray:
+        """Предсказания для строк (n, признаки) в порядке признаков модели"""
+        rows = np.atleast_2d(rows)
+        if len(rows) > CHUNK_ROWS:
+            # Промежуточные массивы (условия x строки, деревья x строки) должны помещаться в кэш
+            return np.concatenate([self._predict_chunk(rows[i:i + CHUNK_ROWS])
+                                   for i in range(0, len(rows), CHUNK_ROWS)])
+        return self._predict_chunk(rows)
+
+    def _predict_chunk(self, rows: np.ndarray) -> np.ndarray:
+        n_float = len(self.borders)
+        n_ctr = len(self.ctr_offsets)
+
+        # Биты условий (условие x строка); последняя строка - заглушка «всегда 0» для коротких деревьев
+        bits = np.zeros((n_float + n_ctr + 1, len(rows)), dtype=np.uint8)
+        np.greater(rows[:, self.feature_index].T.astype(np.float32), self.borders[:, None],
+                   out=bits[:n_float].view(bool))
+        if n_ctr:
+            combo = self.cat_strides @ rows[:, self.cat_positions].T
+            keys = combo * self.ctr_sizes[:, None] + self.ctr_offsets[:, None]
+            for j, splits in enumerate(self._ctr_levels):
+                keys += bits[splits] << j
+            bits[n_float:n_float + n_ctr] = self.ctr_tables[keys]
+
+        # Индекс листа: бит условия уровня d сдвигается на d
+        leaf_index = bits[self._levels[0]].astype(np.intp)
+        for d, splits in enumerate(self._levels[1:], 1):
+            leaf_index |= bits[splits] << d
+        leaf_index += self._leaf_offsets
+        return self.scale * self._flat_leaves[leaf_index].sum(axis=0) + self.bias
+
+
+    def upper_bound(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        """Верхняя оценка предсказания для строк из коробки признаков [lower, upper].
+
+        Для каждой коробки (строки lower/upper) условие, которое коробка не решает
+        однозначно, считается и истинным, и ложным; дерево дает максимум по всем
+        достижимым листьям. Категориальные признаки внутри коробки фиксированы.
+        """
+        lower, upper = np.atleast_2d(lower), np.atleast_2d(upper)
+        if not np.array_equal(lower[:, self.cat_positions], upper[:, self.cat_positions]):
+            raise ValueError("Категориальные признаки в коробке должны быть фиксированы")
+        # Листья x деревья x коробки - по BOUND_CHUNK_BOXES коробок за проход
+        return np.concatenate([self._upper_bound_chunk(lower[i:i + BOUND_CHUNK_BOXES], upper[i:i + BOUND_CHUNK_BOXES])
+                               for i in range(0, len(lower), BOUND_CHUNK_BOXES)])
+
+    def _upper_bound_chunk(self, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+        n_float = len(self.borders)
+        n_ctr = len(self.ctr_offsets)
+        # Может ли условие быть истинным / ложным (условие x коробка)
+        can_one = np.zeros((n_float + n_ctr + 1, len(lower)), dtype=bool)
+        can_zero = np.ones_like(can_one)
+        can_one[:n_float] = upper[:, self.feature_index].T.astype(np.float32) > self.borders[:, None]
+        can_zero[:n_float] = lower[:, self.feature_index].T.astype(np.float32) <= self.borders[:, None]
+        if n_ctr:
+            combo = self.cat_strides @ lower[:, self.cat_positions].T
+            base = combo * self.ctr_sizes[:, None] + self.ctr_offsets[:, None]
+            ctr_one = np.zeros((n_ctr, len(lower)), dtype=bool)
+            ctr_zero = np.zeros_like(ctr_one)
+            for pattern in range(1 << len(self._ctr_levels)):
+                # Сочетание битов порогов CTR, совместимое с коробкой
+                possible = np.ones_like(ctr_one)
+                for j, splits in enumerate(self._ctr_levels):
+                    possible &= can_one[splits] if (pattern >> j) & 1 else can_zero[splits]
+                value = self.ctr_tables[np.minimum(base + pattern, len(self.ctr_tables) - 1)]
+                ctr_one |= possible & (value == 1)
+                ctr_zero |= possible & (value == 0)
+            can_one[n_float:n_float + n_ctr] = ctr_one
+            can_zero[n_float:n_float + n_ctr] = ctr_zero
+
+        # Достижимые листья (лист x дерево x коробка): уровень d добавляет бит d индекса листа
+        reachable = np.ones((1, len(self.tree_splits), len(lower)), dtype=bool)
+        for splits in self._levels:
+            reachable = np.concatenate([reachable & can_zero[splits], reachable & can_one[splits]])
+        leaves = self.scale * self.leaf_values.T[:, :, None]
+        return np.where(reachable, leaves, -np.inf).max(axis=0).sum(axis=0) + self.bias
+
+def _probe_pool(combos: np.ndarray, cat_positions: np.ndarray, feature_names: List[str],
+                float_positions: Sequence[int], float_elements: Sequence[tuple]):
+    """Строки для снятия таблицы CTR: все сочетания категорий x биты порогов CTR"""
+    from catboost import Pool
+    import pandas as pd
+
+    m = len(float_elements)
+    patterns = np.arange(1 << m)
+    values = np.zeros((len(combos) << m, len(feature_names)), dtype=np.float32)
+    for j, (feature, border) in enumerate(float_elements):
+        # Бит 1 - значение строго больше порога, бит 0 - равно порогу
+        border = np.float32(border)
+        above = np.nextafter(border, np.float32(np.inf))
+        values[:, float_positions[feature]] = np.tile(np.where((patterns >> j) & 1, above, border), len(combos))
+
+    frame = pd.DataFrame(values, columns=feature_names)
+    for i, position in enumerate(cat_positions):
+        frame[feature_names[position]] = np.repeat(combos[:, i], 1 << m)
+    return Pool(frame, cat_features=list(cat_positions))
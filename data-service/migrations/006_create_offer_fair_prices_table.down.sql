@@ -0,0 +1,2 @@
+DROP TABLE IF EXISTS offer_fair_prices;
+DROP INDEX IF EXISTS idx_offers_updated_at;
@@ -0,0 +1,21 @@
+CREATE TABLE IF NOT EXISTS offer_fair_prices (
+    offer_id UUID PRIMARY KEY REFERENCES offers(id),
+    model_version VARCHAR(64) NOT NULL,
+    fair_price DECIMAL(12,2) NOT NULL,
+    price_low DECIMAL(12,2) NOT NULL,
+    price_high DECIMAL(12,2) NOT NULL,
+    confidence REAL NOT NULL,
+    offer_price DECIMAL(12,2),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_offers_updated_at ON offers (updated_at);
+
+comment on column offer_fair_prices.offer_id is 'Идентификатор оффера';
+comment on column offer_fair_prices.model_version is 'Версия модели, посчитавшей цену';
+comment on column offer_fair_prices.fair_price is 'Справедливая цена по модели';
+comment on column offer_fair_prices.price_low is 'Нижняя граница диапазона цены';
+comment on column offer_fair_prices.price_high is 'Верхняя граница диапазона цены';
+comment on column offer_fair_prices.confidence is 'Уверенность модели';
+comment on column offer_fair_prices.offer_price is 'Цена оффера на момент оценки';
@@ -0,0 +1,2 @@
+DROP TABLE IF EXISTS number_price_stats;
+DROP INDEX IF EXISTS idx_price_history_created_at;
@@ -0,0 +1,23 @@
+CREATE TABLE IF NOT EXISTS number_price_stats (
+    number_id UUID PRIMARY KEY REFERENCES numbers(id),
+    listing_count INT NOT NULL,
+    price_drops INT NOT NULL,
+    first_price DECIMAL(12,2),
+    last_price DECIMAL(12,2),
+    first_seen_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_change_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_number_price_stats_last_change_at ON number_price_stats (last_change_at);
+
+CREATE INDEX IF NOT EXISTS idx_price_history_created_at ON price_history (created_at);
+
+comment on column number_price_stats.number_id is 'Идентификатор номера';
+comment on column number_price_stats.listing_count is 'Число предложений номера в истории цен';
+comment on column number_price_stats.price_drops is 'Число снижений цены';
+comment on column number_price_stats.first_price is 'Первая цена номера в истории';
+comment on column number_price_stats.last_price is 'Последняя цена номера в истории';
+comment on column number_price_stats.first_seen_at is 'Первая запись истории цен';
+comment on column number_price_stats.last_change_at is 'Последняя запись истории цен (отметка инкрементального пересчета)';